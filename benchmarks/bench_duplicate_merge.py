@@ -0,0 +1,89 @@
+"""Benchmark: row-wise vs column-wise merging of duplicate columns.
+
+Compares the old per-row apply() implementation of the "Merge duplicate
+columns" strategy with mergecsvfiles_pipeline.merge_duplicate_columns on
+frames with 2-5 duplicate columns (text mixed with numbers, and numbers
+only), and checks that both produce the same values.
+
+Usage:
+    python benchmarks/bench_duplicate_merge.py [rows]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mergecsvfiles_pipeline import merge_duplicate_columns  # noqa: E402
+
+
+def merge_row_values(row):
+    """The original row-wise implementation."""
+    vals = [str(v) for v in row if pd.notna(v)]
+    # unique preserving order
+    seen = []
+    out = []
+    for v in vals:
+        if v not in seen:
+            seen.append(v)
+            out.append(v)
+    return ' | '.join(out) if out else pd.NA
+
+
+def rowwise(df, name):
+    positions = [i for i, c in enumerate(df.columns) if c == name]
+    dup_cols = [df.columns[i] for i in positions]
+    # As the original selected them: by label, so every duplicate shares one row dtype
+    values = df[dup_cols].apply(merge_row_values, axis=1)
+    # The original then dropped every column called `name`; keep the first instead
+    keep = [i for i in range(df.shape[1]) if i not in positions[1:]]
+    result = df.iloc[:, keep].copy()
+    result.isetitem(keep.index(positions[0]), values.to_numpy(dtype=object))
+    return result
+
+
+def make_frame(rows, dup_count, rng, numeric=False):
+    data = []
+    for i in range(dup_count):
+        # Overlapping small value sets so rows mix repeats, distinct values and nulls
+        col = pd.Series(rng.choice(['north', 'south', 'east', 'west', None], rows), dtype=object)
+        if numeric and not i % 2:
+            # Int columns next to float ones: 1 and 1.0 must merge as one value
+            col = pd.Series(rng.integers(0, 5, rows))
+        elif i % 2:
+            col = pd.Series(rng.integers(0, 5, rows).astype(float))
+            col[rng.random(rows) < 0.2] = np.nan
+        data.append(col)
+    data.append(pd.Series(np.arange(rows)))
+    df = pd.concat(data, axis=1)
+    df.columns = ['region'] * dup_count + ['id']
+    return df
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = np.random.default_rng(42)
+    print(f"Merging duplicate columns, {rows:,} rows")
+    print(f"{'columns':>8} {'dup cols':>8} {'row-wise (s)':>14} {'column-wise (s)':>16} {'speedup':>9}")
+    for numeric in (False, True):
+        kind = 'numbers' if numeric else 'mixed'
+        for dup_count in range(2, 6):
+            df = make_frame(rows, dup_count, rng, numeric)
+            expected, slow = timed(rowwise, df, 'region')
+            actual, fast = timed(merge_duplicate_columns, df, 'region')
+            same = expected.iloc[:, 0].fillna('<NA>').equals(actual.iloc[:, 0].fillna('<NA>'))
+            if not same:
+                raise SystemExit(f"Mismatch with {dup_count} duplicate {kind} columns")
+            print(f"{kind:>8} {dup_count:>8} {slow:>14.3f} {fast:>16.3f} {slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
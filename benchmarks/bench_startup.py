@@ -0,0 +1,127 @@
+"""Benchmark: cold-start time of the GUI entry points.
+
+Every run starts a fresh interpreter, so nothing is shared between runs
+except the operating system's file cache. Two things are measured:
+
+* import time per top-level package (python -X importtime), for the module
+  an entry point imports first;
+* time to first window: from launching the process until the app's main
+  window has been built and drawn once (root.update()), plus the heavy data
+  modules (pandas, numpy, chardet, pyarrow) that were already loaded by then.
+
+The window part needs a display; without one it is skipped and only import
+times are reported. The exit status is 1 when a heavy module is loaded before
+the first window or the median time to first window exceeds --max-seconds,
+so the script can guard against startup regressions.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--max-seconds S]
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = {
+    'mergecsvfiles_advanced': 'AdvancedCSVMergerApp',
+    'mergecsvfiles_gui': 'CSVMergerApp',
+}
+HEAVY_MODULES = ['pandas', 'numpy', 'chardet', 'pyarrow']
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+# Runs in the child process; builds the window the way the entry point's main() does
+_WINDOW_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import tkinter as tk
+import {module} as app_module
+imported = time.perf_counter()
+if getattr(app_module, 'USE_TTB', False) and app_module.tb is not None:
+    root = app_module.tb.Window(themename='flatly')
+else:
+    root = tk.Tk()
+app = app_module.{app_class}(root)
+root.update()
+shown = time.time()
+print(json.dumps({{
+    'import': imported - started,
+    'build': time.perf_counter() - imported,
+    'shown_at': shown,
+    'heavy': [m for m in {heavy!r} if m in sys.modules],
+}}))
+root.destroy()
+"""
+
+
+def import_times(module):
+    """{top-level package: self import time in seconds} for importing `module`."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    totals = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            totals[match.group(4).split('.')[0]] += int(match.group(1)) / 1e6
+    return totals
+
+
+def first_window(module, app_class):
+    """Timings of one launch, or None when no window can be opened."""
+    script = _WINDOW_SCRIPT.format(root=str(ROOT), module=module, app_class=app_class, heavy=HEAVY_MODULES)
+    launched = time.time()
+    proc = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        if 'TclError' in proc.stderr:
+            return None  # no display
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['window'] = result.pop('shown_at') - launched
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help='launches per entry point (default 5)')
+    parser.add_argument('--top', type=int, default=15, help='packages to list per entry point (default 15)')
+    parser.add_argument('--max-seconds', type=float, help='fail when the median time to first window is higher')
+    args = parser.parse_args()
+
+    failed = False
+    for module, app_class in ENTRY_POINTS.items():
+        print(f'\n{module}')
+        runs = [import_times(module) for _ in range(args.runs)]
+        packages = {name for run in runs for name in run}
+        median = {name: statistics.median(run.get(name, 0.0) for run in runs) for name in packages}
+        print(f'  import {module}: {sum(median.values()) * 1000:8.1f} ms (median of {args.runs})')
+        for name, seconds in sorted(median.items(), key=lambda item: -item[1])[:args.top]:
+            print(f'    {name:<28} {seconds * 1000:8.1f} ms')
+
+        launches = [first_window(module, app_class) for _ in range(args.runs)]
+        if any(launch is None for launch in launches):
+            print('  first window: skipped (no display)')
+            continue
+        for key, label in (('import', 'import'), ('build', 'build window'), ('window', 'launch to first window')):
+            values = [launch[key] for launch in launches]
+            print(f'  {label:<24} median {statistics.median(values) * 1000:8.1f} ms, '
+                  f'min {min(values) * 1000:8.1f} ms')
+        heavy = sorted({name for launch in launches for name in launch['heavy']})
+        print(f"  loaded before first window: {', '.join(heavy) if heavy else 'no heavy modules'}")
+        window = statistics.median(launch['window'] for launch in launches)
+        if heavy or (args.max_seconds is not None and window > args.max_seconds):
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
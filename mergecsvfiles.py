@@ -2,8 +2,11 @@ import os
 import pandas as pd
 from pathlib import Path
 
+from mergecsvfiles_engine import MergeConfig, MergeError, run_merge
+from mergecsvfiles_sort import kway_merge_sorted, order_disjoint_runs, scan_sorted_run
 
-def merge_csv_files(directory_path, output_filename='merged_data.csv'):
+
+def merge_csv_files(directory_path, output_filename='merged_data.csv', chunksize=None):
     """
     Merges multiple CSV files from a directory into a single CSV file.
     
@@ -13,6 +16,9 @@ def merge_csv_files(directory_path, output_filename='merged_data.csv'):
         Path to the directory containing CSV files
     output_filename : str
         Name of the output merged CSV file (default: 'merged_data.csv')
+    chunksize : int, optional
+        When set, stream every file in chunks of this many rows straight to the
+        output instead of loading everything into memory (default: None)
     
     Returns:
     --------
@@ -40,79 +46,22 @@ def merge_csv_files(directory_path, output_filename='merged_data.csv'):
         for file in csv_files:
             print(f"  - {file.name}")
         
-        # Read all CSV files
-        dataframes = []
-        date_columns = set()
-        
-        for csv_file in csv_files:
-            try:
-                df = pd.read_csv(csv_file)
-                
-                # Detect potential date columns
-                for col in df.columns:
-                    if 'date' in col.lower() or 'time' in col.lower():
-                        date_columns.add(col)
-                
-                dataframes.append(df)
-                print(f"✓ Loaded: {csv_file.name} ({len(df)} rows, {len(df.columns)} columns)")
-            except Exception as e:
-                print(f"✗ Error reading {csv_file.name}: {e}")
-                continue
+        if chunksize:
+            return stream_csv_files(csv_files, dir_path / output_filename, chunksize)
         
-        if not dataframes:
-            print("No CSV files could be loaded successfully.")
+        # The in-memory merge is the shared engine: concatenate, then sort by the first date column
+        config = MergeConfig(files=csv_files, output_dir=str(dir_path), output_filename=output_filename,
+                             sort_option='date', load_workers=1)
+        try:
+            result = run_merge(config, log=lambda text: print(f"  {text}", end=''))
+        except MergeError as e:
+            print(f"Error: {e}")
             return False
         
-        # Rename duplicate columns
-        all_columns = {}
-        for df in dataframes:
-            for col in df.columns:
-                if col not in all_columns:
-                    all_columns[col] = 1
-                else:
-                    all_columns[col] += 1
-        
-        # Create a mapping for duplicate columns
-        duplicate_cols = {col: count for col, count in all_columns.items() if count > 1}
-        
-        # Rename duplicate columns in each dataframe
-        for i, df in enumerate(dataframes):
-            col_counter = {}
-            for col in df.columns:
-                if col in duplicate_cols:
-                    if col not in col_counter:
-                        col_counter[col] = 0
-                    else:
-                        col_counter[col] += 1
-                    
-                    # Only rename from the second occurrence onwards
-                    if col_counter[col] > 0:
-                        new_col_name = f"{col}_{i}"
-                        df.rename(columns={col: new_col_name}, inplace=True)
-        
-        # Merge all dataframes
-        print("\nMerging data...")
-        merged_df = pd.concat(dataframes, ignore_index=True, sort=False)
-        
-        # Sort by date columns if detected
-        if date_columns:
-            for date_col in list(date_columns)[:1]:  # Use the first date column found
-                if date_col in merged_df.columns:
-                    try:
-                        merged_df[date_col] = pd.to_datetime(merged_df[date_col])
-                        merged_df = merged_df.sort_values(by=date_col).reset_index(drop=True)
-                        print(f"✓ Sorted by date column: {date_col}")
-                    except Exception as e:
-                        print(f"⚠ Could not sort by {date_col}: {e}")
-        
-        # Save merged file
-        output_path = dir_path / output_filename
-        merged_df.to_csv(output_path, index=False)
-        
-        print(f"\n✓ Successfully merged {len(csv_files)} CSV files")
-        print(f"✓ Output file: {output_path}")
-        print(f"  - Total rows: {len(merged_df)}")
-        print(f"  - Total columns: {len(merged_df.columns)}")
+        print(f"\n✓ Successfully merged {len(result.files_loaded)} CSV files")
+        print(f"✓ Output file: {result.output_path}")
+        print(f"  - Total rows: {result.rows}")
+        print(f"  - Total columns: {result.columns}")
         
         return True
     
@@ -121,6 +70,164 @@ def merge_csv_files(directory_path, output_filename='merged_data.csv'):
         return False
 
 
+def build_header_schema(csv_files):
+    """
+    Reads only the header row of each CSV file and computes the merged schema.
+    
+    Parameters:
+    -----------
+    csv_files : list of Path
+        CSV files to inspect
+    
+    Returns:
+    --------
+    tuple
+        (readable files, merged column order) where the column order matches
+        what pd.concat(..., sort=False) would produce for the same inputs
+    """
+    readable = []
+    schema = []
+    seen = set()
+    
+    for csv_file in csv_files:
+        try:
+            columns = list(pd.read_csv(csv_file, nrows=0).columns)
+        except Exception as e:
+            print(f"✗ Error reading {csv_file.name}: {e}")
+            continue
+        
+        readable.append(csv_file)
+        for col in columns:
+            if col not in seen:
+                seen.add(col)
+                schema.append(col)
+    
+    return readable, schema
+
+
+def read_date_chunks(csv_file, date_col, chunksize, usecols=None):
+    """Yields chunks of a CSV file with date_col parsed as datetimes."""
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize, usecols=usecols):
+        chunk[date_col] = pd.to_datetime(chunk[date_col])
+        yield chunk
+
+
+def presorted_file_order(csv_files, date_col, chunksize):
+    """
+    Checks whether every file is already sorted by date_col.
+    
+    Only the date column is read, chunk by chunk.
+    
+    Returns:
+    --------
+    list, str or None
+        File indexes in output order when the files' date ranges do not
+        overlap, 'interleaved' when they overlap (k-way merge needed), or
+        None when some file is not in date order
+    """
+    bounds = []
+    for csv_file in csv_files:
+        try:
+            is_sorted, first, last = scan_sorted_run(
+                read_date_chunks(csv_file, date_col, chunksize, usecols=[date_col]), [date_col], [True])
+        except Exception:
+            return None
+        if not is_sorted:
+            return None
+        bounds.append((first, last))
+    
+    order = order_disjoint_runs(bounds)
+    return order if order is not None else 'interleaved'
+
+
+def stream_csv_files(csv_files, output_path, chunksize=100_000):
+    """
+    Merges CSV files chunk by chunk, appending each chunk to the output file.
+    
+    Peak memory depends on chunksize rather than on the total size of the
+    inputs. Every chunk is aligned to a header schema computed up front, so
+    files with differing columns still produce a consistent output.
+    
+    Parameters:
+    -----------
+    csv_files : list of Path
+        CSV files to merge, in output order
+    output_path : Path
+        Destination CSV file
+    chunksize : int
+        Number of rows to read per chunk (default: 100000)
+    
+    Returns:
+    --------
+    bool
+        True if successful, False otherwise
+    """
+    # Never read back the file being written (it may live in the input folder)
+    output_path = Path(output_path)
+    csv_files = [f for f in csv_files if f.resolve() != output_path.resolve()]
+    readable, schema = build_header_schema(csv_files)
+    
+    if not readable:
+        print("No CSV files could be loaded successfully.")
+        return False
+    
+    date_columns = [col for col in schema if 'date' in col.lower() or 'time' in col.lower()]
+    date_col = date_columns[0] if date_columns else None
+    order = None
+    if date_col:
+        order = presorted_file_order(readable, date_col, chunksize)
+        if order is None:
+            print(f"⚠ Streaming mode keeps file order; not sorting by {date_col} (inputs are not each in date order)")
+    
+    print(f"\nStreaming data in chunks of {chunksize:,} rows...")
+    
+    # Write the header once, then append every aligned chunk
+    pd.DataFrame(columns=schema).to_csv(output_path, index=False)
+    total_rows = 0
+    
+    if order == 'interleaved':
+        # Heap-based k-way merge: one chunk per file in memory, no global sort
+        sources = [read_date_chunks(f, date_col, chunksize) for f in readable]
+        for block in kway_merge_sorted(sources, [date_col], [True], columns=schema, block_rows=chunksize):
+            block.to_csv(output_path, mode='a', header=False, index=False)
+            total_rows += len(block)
+        print(f"✓ Sorted by date column: {date_col} (k-way merge of {len(readable)} sorted files)")
+        readable_in_order = []
+    elif order is not None:
+        # Date ranges do not overlap: writing whole files in date order is enough
+        readable_in_order = [readable[i] for i in order]
+        print(f"✓ Sorted by date column: {date_col} (files written in date order)")
+    else:
+        readable_in_order = readable
+    
+    for csv_file in readable_in_order:
+        file_rows = 0
+        # Where this file's rows start, so a file that fails part way can be taken out again
+        start = os.path.getsize(output_path)
+        try:
+            if order:
+                chunks = read_date_chunks(csv_file, date_col, chunksize)
+            else:
+                chunks = pd.read_csv(csv_file, chunksize=chunksize)
+            for chunk in chunks:
+                chunk = chunk.reindex(columns=schema)
+                chunk.to_csv(output_path, mode='a', header=False, index=False)
+                file_rows += len(chunk)
+            print(f"✓ Streamed: {csv_file.name} ({file_rows} rows)")
+        except Exception as e:
+            os.truncate(output_path, start)
+            print(f"✗ Error reading {csv_file.name} after {file_rows} rows, its rows were left out: {e}")
+            continue
+        total_rows += file_rows
+    
+    print(f"\n✓ Successfully merged {len(readable)} CSV files")
+    print(f"✓ Output file: {output_path}")
+    print(f"  - Total rows: {total_rows}")
+    print(f"  - Total columns: {len(schema)}")
+    
+    return True
+
+
 def main():
     """Main function to run the script"""
     import sys
@@ -129,10 +236,22 @@ def main():
     print("CSV FILE MERGER")
     print("=" * 60)
     
+    # Optional --chunksize N switches to constant-memory streaming mode
+    args = sys.argv[1:]
+    chunksize = None
+    if '--chunksize' in args:
+        idx = args.index('--chunksize')
+        try:
+            chunksize = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print("Error: --chunksize expects a number of rows.")
+            return
+        del args[idx:idx + 2]
+    
     # Get directory path from command-line arguments or user input
-    if len(sys.argv) > 1:
-        directory_path = sys.argv[1]
-        output_filename = sys.argv[2] if len(sys.argv) > 2 else 'merged_data.csv'
+    if args:
+        directory_path = args[0]
+        output_filename = args[1] if len(args) > 1 else 'merged_data.csv'
     else:
         # Get user input
         directory_path = input("\nEnter the directory path containing CSV files: ").strip()
@@ -142,7 +261,7 @@ def main():
             output_filename = 'merged_data.csv'
     
     # Run merge operation
-    success = merge_csv_files(directory_path, output_filename)
+    success = merge_csv_files(directory_path, output_filename, chunksize=chunksize)
     
     if success:
         print("\n✓ Merge completed successfully!")
@@ -9,13 +9,19 @@ except Exception:
     TBStyle = None
     USE_TTB = False
 from pathlib import Path
-import pandas as pd
 import threading
 import json
 from datetime import datetime
-import chardet
+import multiprocessing
 import os
-import subprocess
+
+# Only the light option lists are imported up front. The data helpers pull in
+# pandas (about a second on a cold start), so they are imported where they are
+# first used and the window appears before they are loaded.
+from mergecsvfiles_options import (
+    ASOF_DIRECTIONS, DEFAULT_BATCH_MEMORY_BUDGET_MB, DEFAULT_BATCH_WORKERS, DEFAULT_PARQUET_CODEC, JOIN_TYPES,
+    PARQUET_CODECS,
+)
 
 
 class Tooltip:
@@ -90,23 +96,41 @@ class AdvancedCSVMergerApp:
         self.sort_option = tk.StringVar(value='date')
         self.sort_column = tk.StringVar(value='')
         self.sort_order = tk.StringVar(value='ascending')
+        self.extra_sort_keys = tk.StringVar(value='')
         self.export_format = tk.StringVar(value='csv')
         self.duplicate_strategy = tk.StringVar(value='keep_all')
         self.remove_duplicate_rows = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=False)
         self.duplicate_row_keep = tk.StringVar(value='first')
+        self.duplicate_key_columns = tk.StringVar(value='')
         self.missing_data_strategy = tk.StringVar(value='keep')
         self.merge_type = tk.StringVar(value='concatenate')
         self.join_column_left = tk.StringVar(value='')
         self.join_column_right = tk.StringVar(value='')
+        self.join_type = tk.StringVar(value='outer')
+        self.asof_column = tk.StringVar(value='')
+        self.asof_by = tk.StringVar(value='')
+        self.asof_direction = tk.StringVar(value='backward')
+        self.asof_tolerance = tk.StringVar(value='')
+        self.preview_exact_count = tk.BooleanVar(value=False)
         
         self.selected_columns = {}  # {file_path: [selected_columns]}
         self.column_mapping = {}  # {original_name: new_name}
-        self.filters = []  # [{column, operator, value}]
+        self.filters = []  # [{column, operator, value} | {expression}]
         self.validation_rules = []  # [{column, rule_type, params}]
-        self.recent_files = self.load_recent_files()
-        self.batch_configs = self.load_batch_configs()
+        self.column_options = []  # columns of the first selected file
+        self._recent_files = None  # read on first use, see the properties below
+        self._batch_configs = None
         self.output_dir = tk.StringVar(value=str(Path.cwd()))
         self.settings = self.load_settings()
+        # 0 = one loader process per CPU core
+        self.load_workers = tk.IntVar(value=self.settings.get('load_workers', 0))
+        self.parquet_compression = tk.StringVar(value=self.settings.get('parquet_compression', DEFAULT_PARQUET_CODEC))
+        self.batch_workers = tk.IntVar(value=self.settings.get('batch_workers', DEFAULT_BATCH_WORKERS))
+        self.batch_memory_budget_mb = tk.IntVar(value=self.settings.get('batch_memory_budget_mb', DEFAULT_BATCH_MEMORY_BUDGET_MB))
+        self.batch_force = tk.BooleanVar(value=False)
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
 
         self.create_widgets()
         try:
@@ -115,6 +139,33 @@ class AdvancedCSVMergerApp:
         except Exception:
             pass
     
+    @property
+    def recent_files(self):
+        if self._recent_files is None:
+            self._recent_files = self.load_recent_files()
+        return self._recent_files
+
+    @property
+    def batch_configs(self):
+        if self._batch_configs is None:
+            self._batch_configs = self.load_batch_configs()
+        return self._batch_configs
+
+    def open_catalog(self):
+        """Open the file catalog on first use and make scan_schema() use it"""
+        with self._catalog_lock:
+            if self._catalog is None:
+                from mergecsvfiles_catalog import CATALOG_FILE, FileCatalog
+                from mergecsvfiles_io import use_catalog
+                # File facts (encoding, header, row counts, ...) survive restarts until a file changes
+                try:
+                    self._catalog = FileCatalog(Path(__file__).parent / CATALOG_FILE,
+                                                verify_content=self.settings.get('catalog_verify_content', False))
+                except Exception:
+                    self._catalog = False
+                use_catalog(self._catalog or None)
+            return self._catalog or None
+
     def load_recent_files(self):
         """Load recent merge operations"""
         config_file = Path(__file__).parent / 'recent_merges.json'
@@ -206,15 +257,17 @@ class AdvancedCSVMergerApp:
         self.content_area = ttk.Frame(self.main_container)
         self.content_area.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        # Create Views
+        # Create Views; the Advanced Editor and Batch views are built the first time they are shown
         self.views = {}
         self.views["quick"] = ttk.Frame(self.content_area, padding=20)
         self.views["adv"] = ttk.Frame(self.content_area, padding=20)
         self.views["batch"] = ttk.Frame(self.content_area, padding=20)
+        self.view_builders = {
+            "adv": self.create_advanced_editor_view,
+            "batch": self.create_batch_processing_view,
+        }
         
         self.create_quick_merge_view(self.views["quick"])
-        self.create_advanced_editor_view(self.views["adv"])
-        self.create_batch_processing_view(self.views["batch"])
         
         # Default View
         self.show_view("quick")
@@ -225,6 +278,9 @@ class AdvancedCSVMergerApp:
         status_bar.pack(fill=tk.X, side=tk.BOTTOM)
 
     def show_view(self, view_name):
+        builder = self.view_builders.pop(view_name, None)
+        if builder is not None:
+            builder(self.views[view_name])
         for view in self.views.values():
             view.pack_forget()
         self.views[view_name].pack(fill=tk.BOTH, expand=True)
@@ -312,12 +368,23 @@ class AdvancedCSVMergerApp:
         
         ttk.Label(config_frame, text="Format:").pack(anchor=tk.W)
         format_frame = ttk.Frame(config_frame)
-        format_frame.pack(fill=tk.X, pady=(2, 10))
+        format_frame.pack(fill=tk.X, pady=(2, 2))
         ttk.Radiobutton(format_frame, text="CSV", variable=self.export_format, value='csv').pack(side=tk.LEFT, padx=(0, 5))
         ttk.Radiobutton(format_frame, text="Excel", variable=self.export_format, value='excel').pack(side=tk.LEFT, padx=(0, 5))
         ttk.Radiobutton(format_frame, text="JSON", variable=self.export_format, value='json').pack(side=tk.LEFT)
+        columnar_frame = ttk.Frame(config_frame)
+        columnar_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Radiobutton(columnar_frame, text="NDJSON", variable=self.export_format, value='ndjson').pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Radiobutton(columnar_frame, text="Parquet", variable=self.export_format, value='parquet').pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Radiobutton(columnar_frame, text="Feather", variable=self.export_format, value='feather').pack(side=tk.LEFT, padx=(0, 5))
+        codec_box = ttk.Combobox(columnar_frame, textvariable=self.parquet_compression, values=PARQUET_CODECS, width=7, state='readonly')
+        codec_box.pack(side=tk.LEFT)
+        Tooltip(codec_box, "Parquet compression codec")
         
         ttk.Checkbutton(config_frame, text="Remove duplicate rows", variable=self.remove_duplicate_rows).pack(anchor=tk.W, pady=5)
+        incremental_check = ttk.Checkbutton(config_frame, text="Append only new rows", variable=self.incremental)
+        incremental_check.pack(anchor=tk.W)
+        Tooltip(incremental_check, "Only read rows added to the files since the last merge and append them (CSV/NDJSON, sort: none)")
         
         # Merge Progress and Button
         self.progress_var = tk.DoubleVar()
@@ -332,6 +399,7 @@ class AdvancedCSVMergerApp:
         preview_toolbar = ttk.Frame(preview_container)
         preview_toolbar.pack(fill=tk.X, pady=(0, 5))
         ttk.Button(preview_toolbar, text="👁️ Refresh Preview", command=self.generate_preview).pack(side=tk.LEFT)
+        ttk.Checkbutton(preview_toolbar, text="Exact row count (reads all data)", variable=self.preview_exact_count).pack(side=tk.LEFT, padx=10)
         
         p_scroll = ttk.Scrollbar(preview_container)
         p_scroll.pack(side=tk.RIGHT, fill=tk.Y)
@@ -421,8 +489,30 @@ class AdvancedCSVMergerApp:
         ttk.Combobox(self.join_frame, textvariable=self.join_column_left, width=20, state='readonly').grid(row=0, column=1, padx=5)
         ttk.Label(self.join_frame, text="Join Column Right:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
         ttk.Combobox(self.join_frame, textvariable=self.join_column_right, width=20, state='readonly').grid(row=1, column=1, padx=5, pady=(5, 0))
+        ttk.Label(self.join_frame, text="Join Type:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Combobox(self.join_frame, textvariable=self.join_type, values=JOIN_TYPES, width=20, state='readonly').grid(row=2, column=1, padx=5, pady=(5, 0))
         if self.merge_type.get() != 'join':
             self.join_frame.pack_forget()
+
+        self.asof_radio = ttk.Radiobutton(merge_frame, text="As-of join on time (nearest earlier/later row)", variable=self.merge_type, value='asof', command=self.on_merge_type_change)
+        self.asof_radio.pack(anchor=tk.W)
+        self.asof_frame = ttk.Frame(merge_frame, padding="10")
+        self.asof_frame.pack(fill=tk.X, pady=(5, 10))
+        ttk.Label(self.asof_frame, text="Time Column:").grid(row=0, column=0, sticky=tk.W)
+        self.asof_column_combo = ttk.Combobox(self.asof_frame, textvariable=self.asof_column, width=20)
+        self.asof_column_combo.grid(row=0, column=1, padx=5)
+        ttk.Label(self.asof_frame, text="Match Within Column:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        self.asof_by_combo = ttk.Combobox(self.asof_frame, textvariable=self.asof_by, width=20)
+        self.asof_by_combo.grid(row=1, column=1, padx=5, pady=(5, 0))
+        Tooltip(self.asof_by_combo, "Optional: only match rows with the same value here (e.g. sensor or ticker)")
+        ttk.Label(self.asof_frame, text="Direction:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Combobox(self.asof_frame, textvariable=self.asof_direction, values=ASOF_DIRECTIONS, width=20, state='readonly').grid(row=2, column=1, padx=5, pady=(5, 0))
+        ttk.Label(self.asof_frame, text="Tolerance:").grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        tolerance_entry = ttk.Entry(self.asof_frame, textvariable=self.asof_tolerance, width=22)
+        tolerance_entry.grid(row=3, column=1, padx=5, pady=(5, 0))
+        Tooltip(tolerance_entry, "Largest allowed gap, e.g. 5s, 2min, 1h (or a number for numeric keys); blank = no limit")
+        if self.merge_type.get() != 'asof':
+            self.asof_frame.pack_forget()
             
         # Sorting
         ttk.Label(merge_frame, text="Sorting:", font=("Segoe UI", 9, "bold")).pack(anchor=tk.W, pady=(10,2))
@@ -439,10 +529,29 @@ class AdvancedCSVMergerApp:
         self.sort_column_combo.pack(side=tk.LEFT, padx=(5, 15))
         ttk.Radiobutton(sort_config_frame, text="Asc", variable=self.sort_order, value='ascending').pack(side=tk.LEFT, padx=(0,5))
         ttk.Radiobutton(sort_config_frame, text="Desc", variable=self.sort_order, value='descending').pack(side=tk.LEFT)
+        then_by_frame = ttk.Frame(merge_frame)
+        then_by_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(then_by_frame, text="Then by:").pack(side=tk.LEFT)
+        then_by_entry = ttk.Entry(then_by_frame, textvariable=self.extra_sort_keys, width=40)
+        then_by_entry.pack(side=tk.LEFT, padx=(5, 0))
+        Tooltip(then_by_entry, "Extra sort keys, e.g.: region, amount:desc")
         
         # Duplicate row keep (extra setting)
         ttk.Label(merge_frame, text="If removing dup rows, keep:").pack(anchor=tk.W, pady=(5,2))
         ttk.Combobox(merge_frame, textvariable=self.duplicate_row_keep, values=['first', 'last'], width=10, state='readonly').pack(anchor=tk.W)
+        ttk.Label(merge_frame, text="Compare rows on columns (blank = all):").pack(anchor=tk.W, pady=(5,2))
+        ttk.Entry(merge_frame, textvariable=self.duplicate_key_columns, width=40).pack(anchor=tk.W)
+
+        # Parallel loading
+        ttk.Label(merge_frame, text="Parallel loading workers (0 = one per CPU):").pack(anchor=tk.W, pady=(10,2))
+        ttk.Spinbox(merge_frame, textvariable=self.load_workers, from_=0, to=256, width=10).pack(anchor=tk.W)
+
+        # Settings may have changed before the view was first shown
+        self.apply_column_options()
+        if self.filters:
+            self.update_filters_display()
+        if self.validation_rules:
+            self.update_validation_display()
 
     def create_batch_processing_view(self, parent):
         ttk.Label(parent, text="Batch Processing", font=("Segoe UI", 24, "bold")).pack(anchor=tk.W, pady=(0, 20))
@@ -459,10 +568,34 @@ class AdvancedCSVMergerApp:
         
         self.batch_text = tk.Text(batch_frame, height=5, state='disabled', bg='#f5f5f5')
         self.batch_text.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
-        btn_run_batch = ttk.Button(batch_frame, text="🚀 Run Selected Batch", command=self.run_batch_merge)
+        run_fr = ttk.Frame(batch_frame)
+        run_fr.pack(fill=tk.X, pady=(10, 0))
+        btn_run_batch = ttk.Button(run_fr, text="🚀 Run Selected Batch", command=self.run_batch_merge)
         if USE_TTB:
             btn_run_batch.configure(style='success.TButton')
-        btn_run_batch.pack(pady=(10,0), anchor=tk.W)
+        btn_run_batch.pack(side=tk.LEFT)
+        ttk.Label(run_fr, text="Parallel jobs:").pack(side=tk.LEFT, padx=(15, 2))
+        ttk.Spinbox(run_fr, textvariable=self.batch_workers, from_=1, to=64, width=5).pack(side=tk.LEFT)
+        ttk.Label(run_fr, text="Memory budget (MB):").pack(side=tk.LEFT, padx=(15, 2))
+        budget_box = ttk.Spinbox(run_fr, textvariable=self.batch_memory_budget_mb, from_=256, to=1048576, increment=256, width=8)
+        budget_box.pack(side=tk.LEFT)
+        Tooltip(budget_box, "Jobs wait to start while the running jobs' estimated memory would exceed this")
+        force_check = ttk.Checkbutton(run_fr, text="Rebuild all", variable=self.batch_force)
+        force_check.pack(side=tk.LEFT, padx=(15, 0))
+        Tooltip(force_check, "Also re-run jobs whose inputs and settings are unchanged since their output was built")
+
+        jobs_frame = ttk.LabelFrame(parent, text="Batch Jobs", padding="10")
+        jobs_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 20))
+        jobs_scroll = ttk.Scrollbar(jobs_frame)
+        jobs_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.batch_jobs_tree = ttk.Treeview(jobs_frame, columns=('job', 'output', 'status', 'time', 'rows'),
+                                            show='headings', height=6, yscrollcommand=jobs_scroll.set)
+        for col, text, width in (('job', '#', 40), ('output', 'Output', 260), ('status', 'Status', 90),
+                                 ('time', 'Duration', 90), ('rows', 'Rows', 110)):
+            self.batch_jobs_tree.heading(col, text=text)
+            self.batch_jobs_tree.column(col, width=width, anchor=tk.W if col == 'output' else tk.E)
+        self.batch_jobs_tree.pack(fill=tk.BOTH, expand=True)
+        jobs_scroll.config(command=self.batch_jobs_tree.yview)
         
         recent_frame = ttk.LabelFrame(parent, text="Recent Merge History", padding="10")
         recent_frame.pack(fill=tk.BOTH, expand=True)
@@ -477,19 +610,48 @@ class AdvancedCSVMergerApp:
         self.update_batch_display()
 
     def update_status(self, text):
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, lambda: self.update_status(text))
+            return
         try:
             self.status_var.set(text)
         except Exception:
             pass
 
+    def start_export_progress(self):
+        """Switch the merge progress bar to a determinate bar for the export."""
+        if not hasattr(self, 'progressbar'):
+            return
+        def switch():
+            self.progressbar.stop()
+            self.progressbar.configure(mode='determinate', maximum=100)
+            self.progress_var.set(0)
+        self.root.after(0, switch)
+
+    def update_export_progress(self, rows, total_rows, bytes_written):
+        percent = 100.0 * rows / total_rows if total_rows else 100.0
+        status = f'Writing output: {rows:,}/{total_rows:,} rows'
+        if bytes_written:
+            status += f', {bytes_written / (1024 * 1024):,.1f} MB'
+        def update():
+            if hasattr(self, 'progress_var'):
+                self.progress_var.set(percent)
+            self.update_status(status)
+        self.root.after(0, update)
+
     def on_merge_type_change(self):
         """Show/hide join configuration based on merge type"""
         if self.merge_type.get() == 'join':
             if hasattr(self, 'join_frame') and self.join_frame.winfo_exists():
-                self.join_frame.pack(fill=tk.X, pady=(5, 10))
+                self.join_frame.pack(fill=tk.X, pady=(5, 10), before=self.asof_radio)
         else:
             if hasattr(self, 'join_frame') and self.join_frame.winfo_exists():
                 self.join_frame.pack_forget()
+        if hasattr(self, 'asof_frame') and self.asof_frame.winfo_exists():
+            if self.merge_type.get() == 'asof':
+                self.asof_frame.pack(fill=tk.X, pady=(5, 10), after=self.asof_radio)
+            else:
+                self.asof_frame.pack_forget()
 
     def add_csv_files(self):
         """Add individual CSV files"""
@@ -607,6 +769,7 @@ class AdvancedCSVMergerApp:
             if os.name == 'nt':
                 os.startfile(str(full))
             else:
+                import subprocess
                 subprocess.run(['open' if os.name == 'darwin' else 'xdg-open', str(full)])
         except Exception as e:
             messagebox.showerror('Error', f'Could not open file: {e}')
@@ -616,6 +779,7 @@ class AdvancedCSVMergerApp:
             if os.name == 'nt':
                 os.startfile(folder)
             else:
+                import subprocess
                 subprocess.run(['open' if os.name == 'darwin' else 'xdg-open', folder])
         except Exception as e:
             messagebox.showerror('Error', f'Could not open folder: {e}')
@@ -638,15 +802,17 @@ class AdvancedCSVMergerApp:
         if not self.selected_files:
             messagebox.showwarning("Warning", "Select files first")
             return
+        from mergecsvfiles_io import scan_schema
+        self.open_catalog()
         
         encoding_info = "Detected Encodings:\n" + "="*50 + "\n"
         for file in self.selected_files:
             try:
-                with open(file, 'rb') as f:
-                    result = chardet.detect(f.read())
-                    encoding = result.get('encoding', 'Unknown')
-                    confidence = result.get('confidence', 0)
-                    encoding_info += f"{file.name}: {encoding} (confidence: {confidence:.1%})\n"
+                result = scan_schema(file)
+                encoding = result.get('encoding') or 'Unknown'
+                confidence = result.get('confidence') or 0
+                delimiter = {'\t': 'tab'}.get(result.get('delimiter'), result.get('delimiter') or ',')
+                encoding_info += f"{file.name}: {encoding} (confidence: {confidence:.1%}, delimiter: {delimiter})\n"
             except Exception as e:
                 encoding_info += f"{file.name}: Error - {e}\n"
         
@@ -666,15 +832,28 @@ class AdvancedCSVMergerApp:
             messagebox.showwarning("Warning", "Select files first")
             return
         
-        # Try to load all unique columns
-        all_columns = set()
-        for file in self.selected_files:
-            try:
-                df = pd.read_csv(file)
-                all_columns.update(df.columns)
-            except:
-                pass
-        
+        # Scan headers off the Tk thread, then build the dialog back on it
+        files = list(self.selected_files)
+        self.update_status('Scanning columns...')
+
+        def worker():
+            from mergecsvfiles_io import scan_schema
+            self.open_catalog()
+            all_columns = set()
+            for file in files:
+                try:
+                    all_columns.update(scan_schema(file)['columns'])
+                except Exception:
+                    pass
+            self.root.after(0, lambda: self.show_column_selector_dialog(all_columns))
+
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+
+    def show_column_selector_dialog(self, all_columns):
+        """Show the column selection dialog for the scanned columns"""
+        self.update_status('Ready')
         if not all_columns:
             messagebox.showerror("Error", "Could not read columns from files")
             return
@@ -695,7 +874,7 @@ class AdvancedCSVMergerApp:
         listbox.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=listbox.yview)
         
-        for col in sorted(all_columns):
+        for col in sorted(all_columns, key=str):
             listbox.insert(tk.END, col)
         
         def save_columns():
@@ -759,9 +938,10 @@ class AdvancedCSVMergerApp:
     
     def add_filter(self):
         """Add data filter"""
+        from mergecsvfiles_filters import FILTER_OPERATORS, FilterError, compile_filters
         filter_window = tk.Toplevel(self.root)
         filter_window.title("Add Filter")
-        filter_window.geometry("500x300")
+        filter_window.geometry("500x420")
         
         ttk.Label(filter_window, text="Add filtering rule:", font=("Segoe UI", 10)).pack(anchor=tk.W, padx=10, pady=10)
         
@@ -771,18 +951,32 @@ class AdvancedCSVMergerApp:
         
         ttk.Label(filter_window, text="Operator:").pack(anchor=tk.W, padx=10, pady=(10, 0))
         operator_var = tk.StringVar(value='==')
-        ttk.Combobox(filter_window, textvariable=operator_var, values=['==', '!=', '>', '<', '>=', '<=', 'contains'], width=20, state='readonly').pack(anchor=tk.W, padx=10)
+        ttk.Combobox(filter_window, textvariable=operator_var, values=FILTER_OPERATORS, width=20, state='readonly').pack(anchor=tk.W, padx=10)
         
-        ttk.Label(filter_window, text="Value:").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        ttk.Label(filter_window, text="Value (comma-separated for 'in' / 'between'):").pack(anchor=tk.W, padx=10, pady=(10, 0))
         value_var = tk.StringVar()
         ttk.Entry(filter_window, textvariable=value_var, width=40).pack(anchor=tk.W, padx=10)
         
+        ttk.Label(filter_window, text="Or an expression (overrides the fields above):").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        expression_var = tk.StringVar()
+        expression_entry = ttk.Entry(filter_window, textvariable=expression_var, width=60)
+        expression_entry.pack(anchor=tk.W, padx=10)
+        Tooltip(expression_entry, "e.g.: region in ('north', 'south') and (amount >= 10 or not status is_null)")
+        
         def add_filter_rule():
-            rule = {
-                'column': column_var.get(),
-                'operator': operator_var.get(),
-                'value': value_var.get()
-            }
+            if expression_var.get().strip():
+                rule = {'expression': expression_var.get().strip()}
+            else:
+                rule = {
+                    'column': column_var.get(),
+                    'operator': operator_var.get(),
+                    'value': value_var.get()
+                }
+            try:
+                compile_filters([rule])
+            except FilterError as e:
+                messagebox.showerror("Invalid Filter", str(e), parent=filter_window)
+                return
             self.filters.append(rule)
             self.update_filters_display()
             filter_window.destroy()
@@ -791,10 +985,13 @@ class AdvancedCSVMergerApp:
     
     def update_filters_display(self):
         """Update filter display"""
+        if not hasattr(self, 'filters_text'):
+            return
+        from mergecsvfiles_filters import describe_filter
         self.filters_text.config(state='normal')
         self.filters_text.delete('1.0', tk.END)
         for i, f in enumerate(self.filters, 1):
-            self.filters_text.insert(tk.END, f"{i}. {f['column']} {f['operator']} {f['value']}\n")
+            self.filters_text.insert(tk.END, f"{i}. {describe_filter(f)}\n")
         self.filters_text.config(state='disabled')
     
     def clear_filters(self):
@@ -832,6 +1029,8 @@ class AdvancedCSVMergerApp:
     
     def update_validation_display(self):
         """Update validation display"""
+        if not hasattr(self, 'validation_text'):
+            return
         self.validation_text.config(state='normal')
         self.validation_text.delete('1.0', tk.END)
         for i, r in enumerate(self.validation_rules, 1):
@@ -841,14 +1040,39 @@ class AdvancedCSVMergerApp:
     def update_column_options(self):
         """Update column options for sorting"""
         if not self.selected_files:
-            self.sort_column_combo['values'] = []
+            self.column_options = []
+            self.apply_column_options()
             return
         
-        try:
-            df = pd.read_csv(self.selected_files[0])
-            self.sort_column_combo['values'] = list(df.columns)
-        except:
-            pass
+        first = self.selected_files[0]
+
+        def worker():
+            from mergecsvfiles_io import scan_schema
+            self.open_catalog()
+            try:
+                columns = scan_schema(first)['columns']
+            except Exception:
+                return
+
+            def apply():
+                # Ignore results for a file list that changed while scanning
+                if self.selected_files and self.selected_files[0] == first:
+                    self.column_options = columns
+                    self.apply_column_options()
+
+            self.root.after(0, apply)
+
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+
+    def apply_column_options(self):
+        """Offer the scanned columns in the Advanced Editor's pickers, once it is built"""
+        if hasattr(self, 'sort_column_combo'):
+            self.sort_column_combo['values'] = self.column_options
+        if hasattr(self, 'asof_column_combo'):
+            self.asof_column_combo['values'] = self.column_options
+            self.asof_by_combo['values'] = [''] + list(self.column_options)
 
     def browse_output_dir(self):
         """Open dialog to choose output folder"""
@@ -937,38 +1161,79 @@ class AdvancedCSVMergerApp:
         ttk.Button(btn_frame, text='Cancel', command=win.destroy).pack(side=tk.LEFT, padx=8)
     
     def run_batch_merge(self):
-        """Run batch merge with saved configs"""
+        """Run the saved configs as parallel, isolated jobs"""
         if not self.batch_configs:
             messagebox.showwarning('Warning', 'No batch configurations to run')
             return
+        from mergecsvfiles_batch import plan_jobs, run_batch
+
+        # Each job starts from the current settings and overrides what its config saved;
+        # the UI state itself is left alone
+        base = self.merge_config([]).to_dict()
+        del base['files']
+        jobs = plan_jobs(self.batch_configs, base)
+        self.show_batch_jobs(jobs)
+        try:
+            workers = max(1, int(self.batch_workers.get()))
+            budget_mb = max(1, int(self.batch_memory_budget_mb.get()))
+        except Exception:
+            workers, budget_mb = DEFAULT_BATCH_WORKERS, DEFAULT_BATCH_MEMORY_BUDGET_MB
+        force = bool(self.batch_force.get())
+        verify_content = self.settings.get('batch_verify_content', False)
+        finished = []
+
+        def on_update(job):
+            if job.status in ('done', 'failed', 'skipped'):
+                finished.append(job)
+                self.update_status(f'Batch: {len(finished)}/{len(jobs)} jobs finished')
+            self.root.after(0, lambda: self.update_batch_job(job))
 
         def worker():
-            total = len(self.batch_configs)
-            for idx, cfg in enumerate(self.batch_configs, 1):
-                try:
-                    self.update_status(f'Running batch {idx}/{total}...')
-                    files = [Path(p) for p in cfg.get('files', [])]
-                    # Apply config to UI state for the run
-                    self.output_filename.set(cfg.get('output', self.output_filename.get()))
-                    self.sort_option.set(cfg.get('sort_option', self.sort_option.get()))
-                    self.sort_column.set(cfg.get('sort_column', self.sort_column.get()))
-                    self.export_format.set(cfg.get('export_format', self.export_format.get()))
-                    self.filters = cfg.get('filters', self.filters)
-                    self.column_mapping = cfg.get('column_mapping', self.column_mapping)
-                    # perform merge (synchronous) for this config
-                    self.perform_merge_and_export(files)
-                except Exception as e:
-                    self.log_to_app(f'Batch job {idx} failed: {e}\n')
-                    continue
-            self.update_status('Ready')
-            messagebox.showinfo('Batch Complete', 'Batch processing finished')
+            self.open_catalog()
+            self.update_status(f'Running {len(jobs)} batch jobs...')
+            run_batch(jobs, workers=workers, memory_budget_mb=budget_mb, load_workers=base['load_workers'],
+                      log=self.log_to_app, on_update=on_update, force=force, verify_content=verify_content)
+            for job in jobs:
+                if job.status == 'done':
+                    self.recent_files.insert(0, {'timestamp': datetime.now().isoformat(),
+                                                 'output_path': str(job.output_path), 'rows': job.rows,
+                                                 'fingerprint': job.fingerprint})
+            self.save_recent_files()
+            counts = {status: sum(job.status == status for job in jobs) for status in ('done', 'skipped', 'failed')}
+
+            def finish():
+                self.update_recent_list()
+                self.update_status('Ready')
+                message = f"{counts['done']} jobs built, {counts['skipped']} up to date"
+                if counts['failed']:
+                    message += f", {counts['failed']} failed (see the log)"
+                messagebox.showinfo('Batch Complete', message)
+            self.root.after(0, finish)
 
         t = threading.Thread(target=worker)
         t.daemon = True
         t.start()
+
+    def show_batch_jobs(self, jobs):
+        """List a batch run's jobs in the Batch view"""
+        if not hasattr(self, 'batch_jobs_tree'):
+            return
+        self.batch_jobs_tree.delete(*self.batch_jobs_tree.get_children())
+        for job in jobs:
+            self.batch_jobs_tree.insert('', tk.END, iid=str(job.index), values=(job.index, job.name, job.status, '', ''))
+
+    def update_batch_job(self, job):
+        """Refresh one job's status, duration and row count"""
+        if not hasattr(self, 'batch_jobs_tree') or not self.batch_jobs_tree.exists(str(job.index)):
+            return
+        duration = f'{job.elapsed:.1f}s' if job.elapsed is not None else ''
+        rows = f'{job.rows:,}' if job.rows is not None else (job.error or '')
+        self.batch_jobs_tree.item(str(job.index), values=(job.index, job.name, job.status, duration, rows))
     
     def update_batch_display(self):
         """Update batch display"""
+        if not hasattr(self, 'batch_text'):
+            return
         self.batch_text.config(state='normal')
         self.batch_text.delete('1.0', tk.END)
         for i, cfg in enumerate(self.batch_configs, 1):
@@ -990,6 +1255,13 @@ class AdvancedCSVMergerApp:
 
     def save_settings(self):
         cfg_path = Path(__file__).parent / 'settings.json'
+        try:
+            self.settings['load_workers'] = int(self.load_workers.get())
+            self.settings['parquet_compression'] = self.parquet_compression.get()
+            self.settings['batch_workers'] = int(self.batch_workers.get())
+            self.settings['batch_memory_budget_mb'] = int(self.batch_memory_budget_mb.get())
+        except Exception:
+            pass
         try:
             with open(cfg_path, 'w', encoding='utf-8') as fh:
                 json.dump(self.settings, fh, indent=2)
@@ -1076,12 +1348,15 @@ class AdvancedCSVMergerApp:
             if os.name == 'nt':
                 os.startfile(path)
             else:
+                import subprocess
                 subprocess.run(['open' if os.name == 'darwin' else 'xdg-open', path])
         except Exception as e:
             messagebox.showerror('Error', f'Could not open folder: {e}')
     
     def update_recent_list(self):
         """Update recent files list"""
+        if not hasattr(self, 'recent_listbox'):
+            return
         self.recent_listbox.delete(0, tk.END)
         for item in self.recent_files:
             self.recent_listbox.insert(tk.END, f"{item['timestamp']}: {item['output_path']}")
@@ -1092,71 +1367,68 @@ class AdvancedCSVMergerApp:
             messagebox.showwarning("Warning", "Select files first")
             return
 
-        try:
-            self.preview_text.config(state='normal')
-            self.preview_text.delete('1.0', tk.END)
-            self.preview_text.insert('1.0', "Generating merged preview...\n")
-            self.preview_text.config(state='disabled')
-            self.root.update()
-
-            dfs = []
-            for f in self.selected_files:
-                try:
-                    with open(f, 'rb') as fh:
-                        raw = fh.read()
-                        enc = chardet.detect(raw).get('encoding') or 'utf-8'
-                    df = pd.read_csv(f, encoding=enc)
-                    df = self.apply_column_selection_and_mapping(df, f)
-                    df = self.apply_filters_to_df(df)
-                    df = self.handle_missing_data(df)
-                    dfs.append(df)
-                except Exception as e:
-                    # Log but continue
-                    self.log_to_app(f"Failed to read {f.name} for preview: {e}\n")
-                    continue
-
-            if not dfs:
-                messagebox.showerror("Error", "No data available for preview (all reads failed)")
-                return
+        self.preview_text.config(state='normal')
+        self.preview_text.delete('1.0', tk.END)
+        self.preview_text.insert('1.0', "Generating merged preview...\n")
+        self.preview_text.config(state='disabled')
 
-            # Create merged sample
-            merged = pd.concat(dfs, ignore_index=True, sort=False)
-
-            # Apply sorting if requested (preview mirrors final behavior)
-            if self.sort_option.get() == 'date':
-                # detect a date column
-                date_cols = [c for c in merged.columns if 'date' in c.lower() or 'time' in c.lower()]
-                if date_cols:
-                    try:
-                        merged[date_cols[0]] = pd.to_datetime(merged[date_cols[0]], errors='coerce')
-                        merged = merged.sort_values(by=date_cols[0]).reset_index(drop=True)
-                    except Exception:
-                        pass
-            elif self.sort_option.get() == 'custom' and self.sort_column.get() in merged.columns:
-                try:
-                    asc = self.sort_order.get() == 'ascending'
-                    merged = merged.sort_values(by=self.sort_column.get(), ascending=asc).reset_index(drop=True)
-                except Exception:
-                    pass
+        files = list(self.selected_files)
+        options = self.pipeline_options()
+        sort_option = self.sort_option.get()
+        sort_column = self.sort_column.get()
+        ascending = self.sort_order.get() == 'ascending'
+        exact = self.preview_exact_count.get()
 
-            # Show merged preview (first 20 rows)
-            self.preview_text.config(state='normal')
-            self.preview_text.delete('1.0', tk.END)
-            header = f"Merged Preview ({len(self.selected_files)} files) - first 20 rows\n"
-            header += "=" * 120 + "\n\n"
-            self.preview_text.insert(tk.END, header)
+        def on_error(f, e):
+            # Log but continue
+            message = f"Failed to read {f.name} for preview: {e}\n"
+            self.root.after(0, lambda: self.log_to_app(message))
+
+        def worker():
+            from mergecsvfiles_pipeline import build_preview
+            self.open_catalog()
             try:
-                self.preview_text.insert(tk.END, merged.head(20).to_string())
-            except Exception:
-                # Fallback: show columns and row count
-                self.preview_text.insert(tk.END, f"Columns: {list(merged.columns)}\nRows: {len(merged)}")
+                # Bounded reads per file; sorted previews stream whole files through a top-k
+                preview = build_preview(files, options, sort_option=sort_option, sort_column=sort_column,
+                                        ascending=ascending, exact=exact, on_error=on_error)
+            except Exception as e:
+                message = f"Could not generate preview: {e}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+                return
+            self.root.after(0, lambda: self.show_preview(preview, len(files)))
 
-            footer = f"\n\nTotal rows (merged): {len(merged):,}\nTotal columns: {len(merged.columns)}\n"
-            self.preview_text.insert(tk.END, footer)
-            self.preview_text.config(state='disabled')
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not generate preview: {e}")
+    def show_preview(self, preview, file_count):
+        """Render a preview built by build_preview"""
+        merged = preview['frame']
+        if not preview['total_columns']:
+            messagebox.showerror("Error", "No data available for preview (all reads failed)")
+            return
+
+        # Show merged preview (first 20 rows)
+        self.preview_text.config(state='normal')
+        self.preview_text.delete('1.0', tk.END)
+        header = f"Merged Preview ({file_count} files) - first {len(merged)} rows"
+        if preview['sort_column'] is not None:
+            header += f", sorted by {preview['sort_column']}"
+        header += "\n" + "=" * 120 + "\n\n"
+        self.preview_text.insert(tk.END, header)
+        try:
+            self.preview_text.insert(tk.END, merged.to_string())
+        except Exception:
+            # Fallback: show columns
+            self.preview_text.insert(tk.END, f"Columns: {list(merged.columns)}")
+
+        if preview['estimated']:
+            total = f"~{preview['total_rows']:,} (estimated from a sample of each file)"
+        else:
+            total = f"{preview['total_rows']:,}"
+        footer = f"\n\nTotal rows (merged): {total}\nTotal columns: {preview['total_columns']}\n"
+        self.preview_text.insert(tk.END, footer)
+        self.preview_text.config(state='disabled')
     
     def show_statistics(self):
         """Show data statistics"""
@@ -1173,22 +1445,28 @@ class AdvancedCSVMergerApp:
         
         stats = "DATA STATISTICS\n" + "="*80 + "\n\n"
         
+        from mergecsvfiles_catalog import profile_file
+        catalog = self.open_catalog()
         total_rows = 0
         for file in self.selected_files:
             try:
-                df = pd.read_csv(file)
-                total_rows += len(df)
+                # Streamed once per file version, then answered from the catalog
+                profile = profile_file(file, catalog)
+                columns = profile['columns']
+                total_rows += profile['row_count']
                 
                 stats += f"File: {file.name}\n"
-                stats += f"  Rows: {len(df)}\n"
-                stats += f"  Columns: {len(df.columns)}\n"
-                stats += f"  Column Names: {', '.join(df.columns)}\n"
+                stats += f"  Rows: {profile['row_count']}\n"
+                stats += f"  Columns: {len(columns)}\n"
+                stats += f"  Column Names: {', '.join(columns)}\n"
                 stats += f"  Data Types:\n"
-                for col, dtype in df.dtypes.items():
-                    stats += f"    {col}: {dtype}\n"
+                for col in columns:
+                    col_stats = profile['column_stats'].get(col, {})
+                    value_range = f"  [{col_stats['min']} .. {col_stats['max']}]" if 'min' in col_stats else ''
+                    stats += f"    {col}: {profile['dtypes'].get(col)}{value_range}\n"
                 stats += f"  Missing Values:\n"
-                for col in df.columns:
-                    missing = df[col].isna().sum()
+                for col in columns:
+                    missing = profile['column_stats'].get(col, {}).get('missing', 0)
                     if missing > 0:
                         stats += f"    {col}: {missing}\n"
                 stats += "\n"
@@ -1204,55 +1482,25 @@ class AdvancedCSVMergerApp:
     # Merge helpers
     # -----------------
     def apply_filters_to_df(self, df):
-        for f in self.filters:
-            try:
-                if f['operator'] == '==':
-                    df = df[df[f['column']] == f['value']]
-                elif f['operator'] == '!=':
-                    df = df[df[f['column']] != f['value']]
-                elif f['operator'] == '>':
-                    df = df[df[f['column']] > float(f['value'])]
-                elif f['operator'] == '<':
-                    df = df[df[f['column']] < float(f['value'])]
-                elif f['operator'] == '>=':
-                    df = df[df[f['column']] >= float(f['value'])]
-                elif f['operator'] == '<=':
-                    df = df[df[f['column']] <= float(f['value'])]
-                elif f['operator'] == 'contains':
-                    df = df[df[f['column']].astype(str).str.contains(f['value'], na=False)]
-            except Exception:
-                continue
-        return df
+        from mergecsvfiles_pipeline import apply_filters
+        return apply_filters(df, self.filters)
 
     def apply_column_selection_and_mapping(self, df, file_path):
-        # If selected_columns configured, use them (selection stored per-file)
-        sel = []
-        if self.selected_columns:
-            sel = self.selected_columns.get(str(file_path), [])
-        if sel:
-            cols = [c for c in sel if c in df.columns]
-            df = df.loc[:, cols]
-
-        # Apply mapping
-        if self.column_mapping:
-            rename_map = {k: v for k, v in self.column_mapping.items() if k in df.columns}
-            if rename_map:
-                df = df.rename(columns=rename_map)
-        return df
+        from mergecsvfiles_pipeline import apply_column_selection_and_mapping
+        return apply_column_selection_and_mapping(df, file_path, self.selected_columns, self.column_mapping)
 
     def handle_missing_data(self, df):
-        s = self.missing_data_strategy
-        if s == 'drop':
-            return df.dropna()
-        if s == 'zero':
-            return df.fillna(0)
-        if s == 'na':
-            return df.fillna('N/A')
-        if s == 'ffill':
-            return df.fillna(method='ffill')
-        if s == 'bfill':
-            return df.fillna(method='bfill')
-        return df
+        from mergecsvfiles_pipeline import handle_missing_data
+        return handle_missing_data(df, self.missing_data_strategy.get())
+
+    def pipeline_options(self):
+        """Snapshot the per-file pipeline settings as a picklable dict"""
+        return {
+            'selected_columns': dict(self.selected_columns),
+            'column_mapping': dict(self.column_mapping),
+            'filters': list(self.filters),
+            'missing_data_strategy': self.missing_data_strategy.get(),
+        }
 
     def start_merge(self):
         if not self.selected_files:
@@ -1264,190 +1512,84 @@ class AdvancedCSVMergerApp:
         thread.start()
         self.update_status('Merging...')
 
+    def merge_config(self, files):
+        """Snapshot the current settings as a MergeConfig for the merge engine"""
+        from mergecsvfiles_dedup import DEDUP_MEMORY_BUDGET_MB
+        from mergecsvfiles_engine import MergeConfig
+        from mergecsvfiles_join import JOIN_MEMORY_LIMIT_MB
+        from mergecsvfiles_sort import SORT_MEMORY_LIMIT_MB
+        try:
+            workers = int(self.load_workers.get())
+        except Exception:
+            workers = 0
+        return MergeConfig(
+            files=list(files),
+            output_dir=self.output_dir.get(),
+            output_filename=self.output_filename.get() or 'merged_data',
+            export_format=self.export_format.get(),
+            selected_columns=dict(self.selected_columns),
+            column_mapping=dict(self.column_mapping),
+            filters=list(self.filters),
+            missing_data_strategy=self.missing_data_strategy.get(),
+            merge_type=self.merge_type.get(),
+            join_column_left=self.join_column_left.get(),
+            join_column_right=self.join_column_right.get(),
+            join_type=self.join_type.get() or 'outer',
+            duplicate_strategy=self.duplicate_strategy.get(),
+            asof_column=self.asof_column.get(),
+            asof_by=self.asof_by.get(),
+            asof_tolerance=self.asof_tolerance.get(),
+            asof_direction=self.asof_direction.get() or 'backward',
+            remove_duplicate_rows=bool(self.remove_duplicate_rows.get()),
+            duplicate_row_keep=self.duplicate_row_keep.get() or 'first',
+            duplicate_key_columns=self.duplicate_key_columns.get(),
+            sort_option=self.sort_option.get(),
+            sort_column=self.sort_column.get(),
+            sort_order=self.sort_order.get(),
+            extra_sort_keys=self.extra_sort_keys.get(),
+            parquet_compression=self.parquet_compression.get(),
+            json_encoder=self.settings.get('json_encoder', 'pandas'),
+            incremental=bool(self.incremental.get()),
+            load_workers=workers,
+            max_in_flight=self.settings.get('max_in_flight', 0),
+            sort_memory_limit_mb=self.settings.get('sort_memory_limit_mb', SORT_MEMORY_LIMIT_MB),
+            dedup_memory_budget_mb=self.settings.get('dedup_memory_budget_mb', DEDUP_MEMORY_BUDGET_MB),
+            join_memory_limit_mb=self.settings.get('join_memory_limit_mb', JOIN_MEMORY_LIMIT_MB),
+        )
+
     def perform_merge_and_export(self, files):
+        from mergecsvfiles_engine import MergeError, run_merge
         if hasattr(self, 'progressbar'):
+            self.root.after(0, lambda: self.progressbar.configure(mode='indeterminate'))
             self.root.after(0, lambda: self.progressbar.pack(fill=tk.X, pady=5, before=self.merge_btn))
             self.root.after(0, self.progressbar.start)
             if hasattr(self, 'merge_btn'):
                 self.root.after(0, lambda: self.merge_btn.configure(state='disabled', text="Merging..."))
         self.log_to_app('=== Merge started ===\n')
-        try:
-            dfs = []
-            date_columns = set()
-            for i, f in enumerate(files, 1):
-                try:
-                    with open(f, 'rb') as fh:
-                        raw = fh.read()
-                        enc = chardet.detect(raw).get('encoding') or 'utf-8'
-                    df = pd.read_csv(f, encoding=enc)
-                    df = self.apply_column_selection_and_mapping(df, f)
-                    df = self.apply_filters_to_df(df)
-                    df = self.handle_missing_data(df)
-                    dfs.append(df)
-                    for col in df.columns:
-                        if 'date' in col.lower() or 'time' in col.lower():
-                            date_columns.add(col)
-                    self.log_to_app(f"{i}. Loaded {f.name}: rows={len(df)}, cols={len(df.columns)}\n")
-                except Exception as e:
-                    self.log_to_app(f"{i}. Failed to read {f.name}: {e}\n")
-                    continue
-
-            if not dfs:
-                self.log_to_app('No dataframes loaded, aborting merge.\n')
-                return
+        export_started = []
 
-            # Merge
-            if self.merge_type.get() == 'concatenate':
-                merged = pd.concat(dfs, ignore_index=True, sort=False)
-            else:
-                # simple join sequence using first file as base
-                merged = dfs[0]
-                left_col = self.join_column_left.get() or None
-                right_col = self.join_column_right.get() or None
-                for other in dfs[1:]:
-                    try:
-                        merged = merged.merge(other, left_on=left_col, right_on=right_col, how='outer')
-                    except Exception as e:
-                        self.log_to_app(f'Join failed between frames: {e}\n')
-
-                # Duplicate column strategies
-                try:
-                    dup_names = [name for name in merged.columns if list(merged.columns).count(name) > 1]
-                    if dup_names:
-                        strategy = self.duplicate_strategy.get()
-                        self.log_to_app(f'Duplicate columns detected: {set(dup_names)} (strategy={strategy})\n')
-                        if strategy == 'keep_all':
-                            # rename duplicates to keep all but make unique names by suffixing occurrence index
-                            counts = {}
-                            new_cols = []
-                            for col in merged.columns:
-                                cnt = counts.get(col, 0)
-                                if list(merged.columns).count(col) > 1:
-                                    new_name = f"{col}_{cnt}"
-                                    counts[col] = cnt + 1
-                                    new_cols.append(new_name)
-                                else:
-                                    new_cols.append(col)
-                            merged.columns = new_cols
-                        elif strategy in ('first', 'last'):
-                            to_drop = []
-                            cols = list(merged.columns)
-                            for name in set(dup_names):
-                                positions = [i for i, c in enumerate(cols) if c == name]
-                                if strategy == 'first':
-                                    keep_idx = positions[0]
-                                    drop_idxs = positions[1:]
-                                else:
-                                    keep_idx = positions[-1]
-                                    drop_idxs = positions[:-1]
-                                drop_cols = [cols[i] for i in drop_idxs]
-                                to_drop.extend(drop_cols)
-                            if to_drop:
-                                merged = merged.drop(columns=to_drop)
-                                self.log_to_app(f'Dropped duplicate columns: {to_drop}\n')
-                        elif strategy == 'merge':
-                            # For each duplicate name, concatenate non-null unique values per row (separated by ' | ')
-                            cols = list(merged.columns)
-                            for name in set(dup_names):
-                                positions = [i for i, c in enumerate(cols) if c == name]
-                                dup_cols = [cols[i] for i in positions]
-                                try:
-                                    def merge_row_values(row):
-                                        vals = [str(v) for v in row if pd.notna(v)]
-                                        # unique preserving order
-                                        seen = []
-                                        out = []
-                                        for v in vals:
-                                            if v not in seen:
-                                                seen.append(v)
-                                                out.append(v)
-                                        return ' | '.join(out) if out else pd.NA
-
-                                    merged[name] = merged[dup_cols].apply(merge_row_values, axis=1)
-                                    # drop other duplicate columns except the first occurrence
-                                    drop_cols = dup_cols[1:]
-                                    merged = merged.drop(columns=drop_cols)
-                                    self.log_to_app(f'Merged duplicate columns for: {name} -> kept {dup_cols[0]}\n')
-                                except Exception as e:
-                                    self.log_to_app(f'Failed to merge duplicate columns for {name}: {e}\n')
-                except Exception as e:
-                    self.log_to_app(f'Error handling duplicate columns: {e}\n')
-
-            # Duplicate rows removal if requested
-            if getattr(self, 'remove_duplicate_rows', None) and self.remove_duplicate_rows.get():
-                keep = getattr(self, 'duplicate_row_keep', None) and self.duplicate_row_keep.get() or 'first'
-                try:
-                    before = len(merged)
-                    merged = merged.drop_duplicates(keep=keep).reset_index(drop=True)
-                    after = len(merged)
-                    self.log_to_app(f'Removed duplicate rows: before={before}, after={after}\n')
-                except Exception as e:
-                    self.log_to_app(f'Could not remove duplicate rows: {e}\n')
-
-            # Sorting
-            if self.sort_option.get() == 'date' and date_columns:
-                date_col = list(date_columns)[0]
-                try:
-                    merged[date_col] = pd.to_datetime(merged[date_col], errors='coerce')
-                    merged = merged.sort_values(by=date_col).reset_index(drop=True)
-                    self.log_to_app(f'Sorted by detected date column: {date_col}\n')
-                except Exception as e:
-                    self.log_to_app(f'Could not sort by date column: {e}\n')
-            elif self.sort_option.get() == 'custom' and self.sort_column.get():
-                col = self.sort_column.get()
-                if col in merged.columns:
-                    asc = self.sort_order.get() == 'ascending'
-                    try:
-                        merged = merged.sort_values(by=col, ascending=asc).reset_index(drop=True)
-                        self.log_to_app(f'Sorted by column {col} ({"asc" if asc else "desc"})\n')
-                    except Exception as e:
-                        self.log_to_app(f'Could not sort by {col}: {e}\n')
-
-            # Export
-            out_fmt = self.export_format.get()
-            output_filename = self.output_filename.get() or 'merged_data'
-            # choose output dir: user-selected folder if provided, else first file's parent
-            out_dir = Path(self.output_dir.get()) if self.output_dir.get() else files[0].parent
-            if isinstance(out_dir, str):
-                out_dir = Path(out_dir)
-            if not out_dir.exists():
-                try:
-                    out_dir.mkdir(parents=True, exist_ok=True)
-                except Exception:
-                    out_dir = files[0].parent
-            if out_fmt == 'csv':
-                out_path = out_dir / (output_filename if output_filename.endswith('.csv') else output_filename + '.csv')
-                merged.to_csv(out_path, index=False)
-            elif out_fmt == 'tsv':
-                out_path = out_dir / (output_filename if output_filename.endswith('.tsv') else output_filename + '.tsv')
-                merged.to_csv(out_path, index=False, sep='\t')
-            elif out_fmt == 'excel':
-                out_path = out_dir / (output_filename if output_filename.endswith('.xlsx') else output_filename + '.xlsx')
-                merged.to_excel(out_path, index=False)
-            elif out_fmt == 'json':
-                out_path = out_dir / (output_filename if output_filename.endswith('.json') else output_filename + '.json')
-                merged.to_json(out_path, orient='records', date_format='iso')
-            else:
-                out_path = out_dir / (output_filename + '.csv')
-                merged.to_csv(out_path, index=False)
+        def progress(rows, total_rows, bytes_written):
+            if not export_started:
+                export_started.append(True)
+                self.start_export_progress()
+            self.update_export_progress(rows, total_rows, bytes_written)
 
-            self.log_to_app(f'Exported merged file to: {out_path}\n')
-            self.log_to_app(f'Total rows: {len(merged):,}, Total columns: {len(merged.columns)}\n')
+        try:
+            self.open_catalog()
+            result = run_merge(self.merge_config(files), log=self.log_to_app, progress=progress)
 
             # Save recent
             try:
-                self.recent_files.insert(0, {'timestamp': datetime.now().isoformat(), 'output_path': str(out_path), 'rows': len(merged)})
+                self.recent_files.insert(0, {'timestamp': datetime.now().isoformat(),
+                                             'output_path': str(result.output_path), 'rows': result.rows})
                 self.save_recent_files()
-                self.update_recent_list()
+                self.root.after(0, self.update_recent_list)
             except:
                 pass
 
+        except MergeError as e:
+            self.log_to_app(f'{e}\n')
         except Exception as e:
-            if hasattr(self, 'progressbar'):
-                self.root.after(0, self.progressbar.stop)
-                self.root.after(0, self.progressbar.pack_forget)
-                if hasattr(self, 'merge_btn'):
-                    self.root.after(0, lambda: self.merge_btn.configure(state='normal', text="▶ MERGE & EXPORT"))
             self.log_to_app(f'Error during merge: {e}\n')
         finally:
             if hasattr(self, 'progressbar'):
@@ -1463,6 +1605,10 @@ class AdvancedCSVMergerApp:
 
     def log_to_app(self, message):
         """Write log messages to preview_text and batch_text areas"""
+        # Merge and batch workers log from their own threads; Tk is only touched on its thread
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, lambda: self.log_to_app(message))
+            return
         try:
             # preview_text exists; append log there
             if hasattr(self, 'preview_text'):
@@ -1481,6 +1627,8 @@ class AdvancedCSVMergerApp:
 
 
 def main():
+    # Worker processes of a frozen (PyInstaller) build re-enter here on Windows
+    multiprocessing.freeze_support()
     # If ttkbootstrap is available, use tb.Window for a modern look
     if USE_TTB and tb is not None:
         root = tb.Window(themename='flatly')
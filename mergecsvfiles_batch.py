@@ -0,0 +1,420 @@
+"""Parallel runner for saved batch configurations.
+
+Every saved configuration becomes an isolated job: its own MergeConfig built
+from the entry on top of a common base, run through the merge engine. Jobs
+run on a pool of threads with a fixed concurrency. A job only starts while
+the estimated memory of all running jobs fits in a global budget. Each job's
+sort/dedup/join spill limits are capped at its share of that budget.
+
+Input files are parsed in one shared loader pool. Jobs that read the same file
+with the same per-file options (column selection, mapping, filters, missing
+data) get the same parsed frame, and it is dropped once the last of those jobs
+has finished. Files a semi-join pre-filters are still read by their own job,
+since the filter differs per job.
+
+Runs are incremental, like make: every job has a fingerprint (a hash of its
+normalized settings plus the path, size and mtime of each input, or a hash of
+each input's bytes with verify_content=True). A successful job stores it
+next to its output, in <output>.fingerprint. The next run skips a job whose
+output still carries the job's current fingerprint; force=True rebuilds it
+anyway.
+
+    jobs = plan_jobs(json.load(open('batch_configs.json')), base={'output_dir': 'out'})
+    run_batch(jobs, workers=4, memory_budget_mb=8192, on_update=print)
+
+or from a shell:
+
+    python -m mergecsvfiles_batch batch_configs.json --jobs 4 --memory-budget-mb 8192 [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+from mergecsvfiles_engine import MergeConfig, MergeError, expected_output_path, run_merge
+from mergecsvfiles_io import file_fingerprint
+from mergecsvfiles_options import DEFAULT_BATCH_MEMORY_BUDGET_MB, DEFAULT_BATCH_WORKERS
+from mergecsvfiles_pipeline import load_file, resolve_workers
+
+
+# A parsed CSV takes a few times its size on disk in memory
+INPUT_MEMORY_FACTOR = 3
+
+STAMP_SUFFIX = '.fingerprint'
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+@dataclass
+class BatchJob:
+    """One saved configuration and what happened when it ran."""
+    index: int
+    name: str
+    config: MergeConfig
+    status: str = 'queued'  # queued, running, done, failed or skipped (up to date)
+    started: float = None
+    elapsed: float = None
+    rows: int = None
+    output_path: Path = None
+    error: str = None
+    memory_mb: float = 0.0
+    fingerprint: str = None
+
+
+def job_config(entry, base=None):
+    """MergeConfig for a saved batch entry; settings it does not set come from `base`."""
+    data = dict(base or {})
+    data.update(entry)
+    if 'output' in entry:
+        data['output_filename'] = entry['output']
+    return MergeConfig.from_dict(data)
+
+
+def estimate_job_mb(config):
+    """Rough peak memory of a merge, from the size of its inputs."""
+    total = 0
+    for f in config.files:
+        try:
+            total += os.path.getsize(f)
+        except OSError:
+            pass
+    return total * INPUT_MEMORY_FACTOR / (1024 * 1024)
+
+
+def plan_jobs(entries, base=None):
+    """BatchJobs for saved batch entries, in order."""
+    jobs = []
+    for i, entry in enumerate(entries, 1):
+        config = job_config(entry, base)
+        jobs.append(BatchJob(index=i, name=config.output_filename or f'job {i}', config=config,
+                             memory_mb=estimate_job_mb(config)))
+    return jobs
+
+
+# -----------------
+# Up-to-date checks
+# -----------------
+def file_digest(path, block_size=HASH_BLOCK_BYTES):
+    """Hash of a file's full contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def job_fingerprint(config, verify_content=False):
+    """
+    Hash of the job's normalized settings and the current state of its inputs.
+
+    Inputs count by (path, size, mtime), or by a hash of their bytes with
+    verify_content=True. Raises OSError when an input cannot be read.
+    """
+    settings = config.output_settings()
+    inputs = []
+    for f in config.files:
+        resolved, size, mtime_ns = file_fingerprint(f)
+        inputs.append([resolved, file_digest(f)] if verify_content else [resolved, size, mtime_ns])
+    text = json.dumps({'settings': settings, 'inputs': inputs}, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def stamp_path(out_path):
+    out_path = Path(out_path)
+    return out_path.with_name(out_path.name + STAMP_SUFFIX)
+
+
+def read_stamp(out_path):
+    """The stamp stored with an output, or None when either is missing or the output changed."""
+    try:
+        with open(stamp_path(out_path), 'r', encoding='utf-8') as fh:
+            stamp = json.load(fh)
+        if os.path.getsize(out_path) != stamp.get('output_bytes'):
+            return None
+    except (OSError, ValueError):
+        return None
+    return stamp
+
+
+def write_stamp(out_path, fingerprint, rows):
+    """Record the fingerprint an output was built from."""
+    stamp = {'fingerprint': fingerprint, 'rows': rows, 'output_bytes': os.path.getsize(out_path),
+             'built': time.time()}
+    path = stamp_path(out_path)
+    # Named after the stamp file, so it never clashes with another sidecar's temp file
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(stamp, fh)
+    os.replace(tmp, path)
+
+
+def up_to_date(job):
+    """The output's stamp when it was built from the job's current fingerprint, else None."""
+    if job.fingerprint is None:
+        return None
+    stamp = read_stamp(expected_output_path(job.config))
+    return stamp if stamp is not None and stamp.get('fingerprint') == job.fingerprint else None
+
+
+def _load(file_path, options):
+    try:
+        return load_file(file_path, options), None
+    except Exception as e:
+        return None, str(e)
+
+
+class SharedLoads:
+    """
+    Parse each (file, per-file options) pair once for all jobs of a batch.
+
+    load_all() is what run_merge() calls; frames are handed out as shallow
+    copies so one job cannot rename or add columns in another job's frame.
+    expect()/release() count the jobs still to use a parse, so it is freed
+    after the last one.
+    """
+
+    def __init__(self, workers=1):
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self._futures = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path, options):
+        per_file = {
+            'selected_columns': (options.get('selected_columns') or {}).get(str(file_path)),
+            'column_mapping': options.get('column_mapping') or {},
+            'filters': options.get('filters') or [],
+            'missing_data_strategy': options.get('missing_data_strategy', 'keep'),
+        }
+        return str(Path(file_path).resolve()), json.dumps(per_file, sort_keys=True, default=str)
+
+    def expect(self, config):
+        """Count `config` as a future user of each of its inputs."""
+        options = config.pipeline_options()
+        with self._lock:
+            for f in config.files:
+                key = self.key(f, options)
+                self._users[key] = self._users.get(key, 0) + 1
+
+    def release(self, config):
+        """`config` is finished with its inputs; drop parses nobody else needs."""
+        options = config.pipeline_options()
+        with self._lock:
+            for f in config.files:
+                key = self.key(f, options)
+                self._users[key] = self._users.get(key, 0) - 1
+                if self._users[key] <= 0:
+                    del self._users[key]
+                    self._futures.pop(key, None)
+
+    def submit(self, file_path, options):
+        """Future of the (df, error) result for the file, started at most once."""
+        key = self.key(file_path, options)
+        with self._lock:
+            future = self._futures.get(key)
+            load_here = future is None and self.pool is None
+            if future is None:
+                future = self.pool.submit(_load, file_path, options) if self.pool else Future()
+                self._futures[key] = future
+        if load_here:
+            future.set_result(_load(file_path, options))
+        return future
+
+    def load_all(self, files, options, skip=()):
+        """{1-based index: (df, error)} for the files that are not in `skip` or semi-join filtered."""
+        semijoin = options.get('semijoin') or {}
+        futures = {i: self.submit(f, options) for i, f in enumerate(files, 1)
+                   if i not in skip and str(f) not in semijoin}
+        results = {}
+        for i, future in futures.items():
+            df, error = future.result()
+            results[i] = (df.copy(deep=False) if df is not None else None, error)
+        return results
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        self._futures.clear()
+
+
+def _limit_memory(config, share_mb):
+    """Cap the job's spill limits at its share of the batch budget."""
+    share_mb = max(1, int(share_mb))
+    config.sort_memory_limit_mb = min(config.sort_memory_limit_mb, share_mb)
+    config.dedup_memory_budget_mb = min(config.dedup_memory_budget_mb, share_mb)
+    config.join_memory_limit_mb = min(config.join_memory_limit_mb, share_mb)
+
+
+def _run_job(job, shared, log):
+    def job_log(text):
+        log(f'[{job.name}] {text}')
+
+    job.started = time.time()
+    try:
+        if job.fingerprint is not None:
+            # The old stamp no longer describes the output once it is rewritten
+            stamp_path(expected_output_path(job.config)).unlink(missing_ok=True)
+        result = run_merge(job.config, log=job_log, shared_loads=shared)
+        if job.fingerprint is not None:
+            write_stamp(result.output_path, job.fingerprint, result.rows)
+    except MergeError as e:
+        job.status, job.error = 'failed', str(e)
+    except Exception as e:
+        job.status, job.error = 'failed', f'Error during merge: {e}'
+    else:
+        job.status, job.rows, job.output_path = 'done', result.rows, result.output_path
+    job.elapsed = time.time() - job.started
+    if job.error:
+        job_log(f'{job.error}\n')
+    return job
+
+
+def run_batch(jobs, workers=DEFAULT_BATCH_WORKERS, memory_budget_mb=DEFAULT_BATCH_MEMORY_BUDGET_MB,
+              load_workers=0, log=None, on_update=None, force=False, verify_content=False):
+    """
+    Run BatchJobs with up to `workers` at a time and return them.
+
+    Jobs whose output is up to date are marked 'skipped' without running,
+    unless `force` is set; `verify_content` fingerprints inputs by their
+    bytes instead of size and mtime. The other jobs start in order. A job waits while the estimated memory of the running
+    jobs plus its own would exceed `memory_budget_mb`, unless nothing else is
+    running. Inputs are parsed by `load_workers` shared loader processes
+    (0 = one per CPU). `on_update(job)` is called whenever a job changes
+    status; it runs on a worker thread.
+    """
+    log = log or (lambda text: None)
+    on_update = on_update or (lambda job: None)
+    workers = max(1, workers or 1)
+    for job in jobs:
+        try:
+            job.fingerprint = job_fingerprint(job.config, verify_content) if job.config.files else None
+        except OSError:
+            job.fingerprint = None  # an input is missing; the merge itself reports it
+        stamp = None if force else up_to_date(job)
+        if stamp is not None:
+            job.status, job.rows = 'skipped', stamp.get('rows')
+            job.output_path = expected_output_path(job.config)
+            log(f'[{job.name}] Up to date, skipped\n')
+            on_update(job)
+    jobs_to_run = [job for job in jobs if job.status != 'skipped']
+
+    file_count = sum(len(job.config.files) for job in jobs_to_run)
+    shared = SharedLoads(resolve_workers(load_workers, file_count) if file_count else 1)
+    for job in jobs_to_run:
+        # Loading happens in the shared pool; jobs don't start loader pools of their own
+        job.config.load_workers = 1
+        _limit_memory(job.config, memory_budget_mb / workers)
+        shared.expect(job.config)
+
+    pending = deque(jobs_to_run)
+    running = {}
+    in_use = 0.0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                while pending and len(running) < workers:
+                    job = pending[0]
+                    reserve = min(job.memory_mb, memory_budget_mb)
+                    if running and in_use + reserve > memory_budget_mb:
+                        break
+                    pending.popleft()
+                    in_use += reserve
+                    job.status = 'running'
+                    on_update(job)
+                    running[pool.submit(_run_job, job, shared, log)] = (job, reserve)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, reserve = running.pop(future)
+                    in_use -= reserve
+                    shared.release(job.config)
+                    on_update(job)
+    finally:
+        shared.close()
+    return jobs
+
+
+def format_job(job):
+    """One status line for a job, as the command line prints it."""
+    line = f'{job.index:>3}. {job.name:<30} {job.status:<8}'
+    if job.elapsed is not None:
+        line += f' {job.elapsed:8.2f}s'
+    if job.rows is not None:
+        line += f' {job.rows:>12,} rows'
+    if job.error:
+        line += f'  {job.error}'
+    return line
+
+
+# -----------------
+# Command line
+# -----------------
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m mergecsvfiles_batch',
+        description='Run saved batch configurations in parallel without the GUI.')
+    parser.add_argument('configs', nargs='?', default=str(Path(__file__).parent / 'batch_configs.json'),
+                        help='JSON list of saved configurations (default: batch_configs.json)')
+    parser.add_argument('--base', metavar='PATH', help='JSON file with MergeConfig fields every job starts from')
+    parser.add_argument('-o', '--output-dir', help='output folder for jobs that do not set one')
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_BATCH_WORKERS, help='jobs run at once')
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_BATCH_MEMORY_BUDGET_MB,
+                        help='estimated memory all running jobs may use together')
+    parser.add_argument('--workers', dest='load_workers', type=int, default=0,
+                        help='shared loader processes (0 = one per CPU)')
+    parser.add_argument('--force', action='store_true', help='rebuild every job, even when its output is up to date')
+    parser.add_argument('--verify-content', action='store_true',
+                        help='compare inputs by a hash of their contents instead of size and mtime')
+    parser.add_argument('--catalog', metavar='PATH', help='file metadata catalog (SQLite) to read and update')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every job\'s merge log')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        with open(args.configs, 'r', encoding='utf-8') as fh:
+            entries = json.load(fh)
+        base = {}
+        if args.base:
+            with open(args.base, 'r', encoding='utf-8') as fh:
+                base = json.load(fh)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.output_dir:
+        base['output_dir'] = args.output_dir
+    if args.catalog:
+        from mergecsvfiles_catalog import FileCatalog
+        from mergecsvfiles_io import use_catalog
+        use_catalog(FileCatalog(args.catalog))
+
+    print_lock = threading.Lock()
+
+    def log(text):
+        with print_lock:
+            print(text, end='', flush=True)
+
+    def on_update(job):
+        if job.status != 'running':
+            log(format_job(job) + '\n')
+
+    started = time.perf_counter()
+    jobs = run_batch(plan_jobs(entries, base), workers=args.jobs, memory_budget_mb=args.memory_budget_mb,
+                     load_workers=args.load_workers, log=log if args.verbose else None, on_update=on_update,
+                     force=args.force, verify_content=args.verify_content)
+    counts = {status: sum(job.status == status for job in jobs) for status in ('done', 'skipped', 'failed')}
+    print(f"{counts['done']} built, {counts['skipped']} up to date, {counts['failed']} failed "
+          f"in {time.perf_counter() - started:.2f}s")
+    failed = counts['failed']
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
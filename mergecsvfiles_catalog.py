@@ -0,0 +1,196 @@
+"""Persistent metadata catalog for input files.
+
+Facts learned about a file (encoding, delimiter, header, dtypes, row count,
+per-column missing counts and min/max) are stored in a small SQLite database
+next to settings.json, keyed by the file's fingerprint (path, size, mtime and
+optionally a hash of its head and tail bytes). Any later lookup for an
+unchanged file is answered from the catalog; a changed file simply misses
+and is scanned again.
+
+Every call opens its own short-lived connection, so one FileCatalog can be
+shared by threads and inherited by worker processes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from mergecsvfiles_io import SAMPLE_SIZE, file_fingerprint, scan_schema
+
+
+CATALOG_FILE = 'catalog.sqlite'
+PROFILE_CHUNKSIZE = 200_000
+
+# JSON-encoded fields; the rest are plain SQLite values
+_JSON_FIELDS = ('columns', 'dtypes', 'column_stats')
+_FIELDS = ('encoding', 'confidence', 'delimiter', 'row_count') + _JSON_FIELDS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    encoding TEXT,
+    confidence REAL,
+    delimiter TEXT,
+    columns TEXT,
+    dtypes TEXT,
+    row_count INTEGER,
+    column_stats TEXT,
+    updated REAL
+)
+"""
+
+
+def content_hash(path, sample_size=SAMPLE_SIZE):
+    """Hash of a file's first and last `sample_size` bytes."""
+    digest = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fh:
+        digest.update(fh.read(sample_size))
+        if size > sample_size:
+            fh.seek(max(sample_size, size - sample_size))
+            digest.update(fh.read(sample_size))
+    return digest.hexdigest()
+
+
+class FileCatalog:
+    """
+    File facts stored in SQLite, valid only while the file is unchanged.
+
+    With verify_content=True a hash of the head and tail bytes is part of
+    the key as well, which catches rewrites that keep size and mtime.
+    """
+
+    def __init__(self, path, verify_content=False):
+        self.path = Path(path)
+        self.verify_content = verify_content
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _key(self, file_path):
+        resolved, size, mtime_ns = file_fingerprint(file_path)
+        digest = content_hash(file_path) if self.verify_content else None
+        return resolved, size, mtime_ns, digest
+
+    def lookup(self, file_path):
+        """Stored facts for the file's current contents, or None."""
+        try:
+            resolved, size, mtime_ns, digest = self._key(file_path)
+            with self._connect() as conn:
+                row = conn.execute('SELECT * FROM files WHERE path = ?', (resolved,)).fetchone()
+        except (OSError, sqlite3.Error):
+            return None
+        if row is None or row['size'] != size or row['mtime_ns'] != mtime_ns:
+            return None
+        if digest is not None and row['content_hash'] != digest:
+            return None
+        entry = {}
+        for field in _FIELDS:
+            value = row[field]
+            if value is not None:
+                entry[field] = json.loads(value) if field in _JSON_FIELDS else value
+        return entry
+
+    def store(self, file_path, **facts):
+        """
+        Record facts about the file. Facts already stored for the same
+        contents are kept unless overwritten; stale facts are dropped.
+        """
+        try:
+            entry = self.lookup(file_path) or {}
+            entry.update({k: v for k, v in facts.items() if k in _FIELDS and v is not None})
+            resolved, size, mtime_ns, digest = self._key(file_path)
+            values = [json.dumps(entry.get(f)) if f in _JSON_FIELDS and f in entry else entry.get(f)
+                      for f in _FIELDS]
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, {', '.join(_FIELDS)}, updated) "
+                    f"VALUES ({', '.join('?' * (len(_FIELDS) + 5))})",
+                    [resolved, size, mtime_ns, digest] + values + [time.time()])
+        except (OSError, sqlite3.Error):
+            # The catalog is only a cache; failing to write it is not an error
+            pass
+
+    def forget(self, file_path):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM files WHERE path = ?', (str(Path(file_path).resolve()),))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM files')
+
+
+def _column_stats(series):
+    stats = {'missing': int(series.isna().sum())}
+    values = series.dropna()
+    if not len(values):
+        return stats
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        low, high = values.min(), values.max()
+        stats['min'], stats['max'] = low.item(), high.item()
+    else:
+        text = values.astype(str)
+        stats['min'], stats['max'] = text.min(), text.max()
+    return stats
+
+
+def _combine_stats(old, new):
+    if old is None:
+        return new
+    stats = {'missing': old['missing'] + new['missing']}
+    if 'min' in old and 'min' in new:
+        if isinstance(old['min'], str) != isinstance(new['min'], str):
+            # A column that is numeric in one chunk and text in another
+            old = {k: str(v) for k, v in old.items() if k != 'missing'}
+            new = {k: str(v) for k, v in new.items() if k != 'missing'}
+        stats['min'], stats['max'] = min(old['min'], new['min']), max(old['max'], new['max'])
+    elif 'min' in old or 'min' in new:
+        source = old if 'min' in old else new
+        stats['min'], stats['max'] = source['min'], source['max']
+    return stats
+
+
+def _combine_dtype(old, new):
+    if old is None or old == new:
+        return new
+    numeric = ('int64', 'float64', 'bool')
+    return 'float64' if old in numeric and new in numeric else 'object'
+
+
+def profile_file(path, catalog=None, chunksize=PROFILE_CHUNKSIZE):
+    """
+    Full-file facts: row count, dtypes and per-column missing/min/max.
+
+    Answered from `catalog` when the file is unchanged; otherwise the file is
+    streamed in chunks (memory stays bounded) and the result is stored.
+    Returns the catalog entry: schema keys plus 'row_count', 'dtypes' and
+    'column_stats' ({column: {'missing', 'min', 'max'}}).
+    """
+    entry = catalog.lookup(path) if catalog is not None else None
+    if entry and 'row_count' in entry and 'column_stats' in entry:
+        return entry
+
+    schema = scan_schema(path)
+    rows = 0
+    dtypes = {}
+    stats = {}
+    for chunk in pd.read_csv(path, encoding=schema['encoding'], chunksize=chunksize):
+        rows += len(chunk)
+        for col in chunk.columns:
+            dtypes[col] = _combine_dtype(dtypes.get(col), str(chunk[col].dtype))
+            stats[col] = _combine_stats(stats.get(col), _column_stats(chunk[col]))
+    entry = dict(schema, row_count=rows, dtypes=dtypes or schema['dtypes'], column_stats=stats)
+    if catalog is not None:
+        catalog.store(path, **entry)
+    return entry
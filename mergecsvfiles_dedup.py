@@ -0,0 +1,117 @@
+"""Duplicate-row removal within a fixed memory budget.
+
+dedup_frames() hashes every row (or just the key columns) into N partitions
+spilled to temporary files. Duplicates always share a hash, so each partition
+can be deduplicated on its own; the survivors are then merged back in their
+original order. Memory use is set by the budget, not by the dataset size.
+"""
+import math
+import os
+import pickle
+import shutil
+import tempfile
+
+import pandas as pd
+
+from mergecsvfiles_sort import BLOCK_ROWS, estimate_frame_bytes, iter_chunks, merge_sorted_runs
+
+
+DEDUP_MEMORY_BUDGET_MB = 512
+DEFAULT_PARTITIONS = 64
+MAX_PARTITIONS = 1024
+# drop_duplicates needs roughly the partition plus its hash table and result
+_OVERHEAD = 3
+
+_ROW = '__csvmerger_row__'
+
+
+def parse_key_columns(text):
+    """Split "col1, col2" into a column list; empty means all columns."""
+    return [c.strip() for c in (text or '').split(',') if c.strip()]
+
+
+def partitions_for(total_bytes, memory_budget_mb=DEDUP_MEMORY_BUDGET_MB):
+    """Number of partitions that keeps one partition's dedup within the budget."""
+    if total_bytes is None:
+        return DEFAULT_PARTITIONS
+    budget = max(1, memory_budget_mb) * 1024 * 1024
+    return max(1, min(MAX_PARTITIONS, math.ceil(total_bytes * _OVERHEAD / budget)))
+
+
+def fits_in_memory(frames, memory_budget_mb=DEDUP_MEMORY_BUDGET_MB):
+    return partitions_for(estimate_frame_bytes(frames), memory_budget_mb) == 1
+
+
+def row_hashes(df, subset):
+    keys = df[subset] if subset else df
+    # Hash ints and floats alike so 1 and 1.0 (equal after concat) share a partition
+    keys = keys.apply(lambda s: s.astype('float64') if pd.api.types.is_numeric_dtype(s) else s)
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def dedup_frames(frames, subset=None, keep='first', memory_budget_mb=DEDUP_MEMORY_BUDGET_MB,
+                 total_bytes=None, tmp_dir=None):
+    """
+    Drop duplicate rows from an iterable of frames with bounded memory.
+
+    The frames must share one schema (e.g. chunks of one merged frame).
+    Matches pd.concat(frames).drop_duplicates(subset, keep) row for row,
+    including the order of the surviving rows. `keep` is 'first', 'last' or
+    False. `total_bytes` (when known) sizes the partition count against
+    `memory_budget_mb`. Yields frames; temporary files are removed when the
+    generator finishes or is closed.
+    """
+    subset = list(subset) if subset else None
+    count = partitions_for(total_bytes, memory_budget_mb)
+    work_dir = tempfile.mkdtemp(prefix='csvmerger_dedup_', dir=tmp_dir)
+    try:
+        # Pass 1: scatter rows (tagged with their global position) to partitions
+        handles = [open(os.path.join(work_dir, f'part_{i:04d}.pkl'), 'wb') for i in range(count)]
+        row = 0
+        columns = None
+        try:
+            for df in frames:
+                if columns is None:
+                    columns = list(df.columns)
+                if not len(df):
+                    continue
+                tagged = df.assign(**{_ROW: range(row, row + len(df))})
+                row += len(df)
+                parts = row_hashes(df, subset) % count
+                for p, part in tagged.groupby(parts, sort=False):
+                    pickle.dump(part, handles[p], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for fh in handles:
+                fh.close()
+
+        # Pass 2: dedup each partition; survivors stay in row order
+        runs = []
+        for i in range(count):
+            path = os.path.join(work_dir, f'part_{i:04d}.pkl')
+            blocks = []
+            with open(path, 'rb') as fh:
+                while True:
+                    try:
+                        blocks.append(pickle.load(fh))
+                    except EOFError:
+                        break
+            os.remove(path)
+            if not blocks:
+                continue
+            part = pd.concat(blocks, sort=False)
+            part = part.drop_duplicates(subset=subset or [c for c in part.columns if c != _ROW], keep=keep)
+            run_path = os.path.join(work_dir, f'run_{i:04d}.pkl')
+            with open(run_path, 'wb') as fh:
+                for block in iter_chunks(part.sort_values(_ROW), BLOCK_ROWS):
+                    pickle.dump(block, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            runs.append(run_path)
+
+        # Pass 3: merge partitions back into the original row order
+        emitted = False
+        for block in merge_sorted_runs(runs, [_ROW], [True]):
+            emitted = True
+            yield block.drop(columns=[_ROW])
+        if not emitted and columns is not None:
+            yield pd.DataFrame(columns=columns)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,745 @@
+"""Headless merge engine shared by the GUIs and the command line.
+
+run_merge() takes a MergeConfig and does the whole job: load every file
+through the per-file pipeline, concatenate or join them, resolve duplicate
+columns and rows, sort, and export. Nothing here imports Tkinter, so the
+engine runs on servers without a display:
+
+    result = run_merge(MergeConfig(files=['a.csv', 'b.csv'], export_format='parquet'))
+    print(result.output_path, result.rows)
+
+or from a shell:
+
+    python -m mergecsvfiles_engine a.csv b.csv --format parquet --sort custom --sort-column id
+
+Progress goes to the optional `log(text)` and `progress(rows, total_rows,
+bytes_written)` callbacks. A merge that cannot continue raises MergeError;
+problems the GUI has always tolerated (a file that fails to read, a sort
+that fails) are logged and skipped.
+
+Concatenations whose inputs are larger on disk than their memory limit are
+streamed instead of loaded (see stream_limit_mb()): each file is read in
+chunks straight into the partitioned dedup and the external sort, and the
+merged frame is never built.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+
+import pandas as pd
+
+from mergecsvfiles_dedup import DEDUP_MEMORY_BUDGET_MB, dedup_frames, fits_in_memory, parse_key_columns
+from mergecsvfiles_filters import FilterError, compile_filters
+from mergecsvfiles_io import scan_schema
+from mergecsvfiles_join import (
+    ASOF_DIRECTIONS, JOIN_MEMORY_LIMIT_MB, JOIN_TYPES, KeyFilter, asof_join, join_frames, plan_semijoin,
+)
+from mergecsvfiles_pipeline import (
+    is_date_column, iter_loaded_files, load_file, merge_duplicate_columns, output_columns, transform_frame,
+)
+from mergecsvfiles_plan import explain_plan, plan_scan, read_planned
+from mergecsvfiles_sort import (
+    BLOCK_ROWS, SORT_MEMORY_LIMIT_MB, external_sort, iter_chunks,
+    merge_presorted, needs_external_sort, parse_sort_keys,
+)
+from mergecsvfiles_writers import (
+    DEFAULT_PARQUET_CODEC, EXTENSIONS, JSON_ENCODERS, PARQUET_CODECS, WRITE_BATCH_ROWS, WRITERS,
+    arrow_column_types, output_path, write_batches,
+)
+
+
+MERGE_TYPES = ['concatenate', 'join', 'asof']
+SORT_OPTIONS = ['none', 'date', 'custom']
+DUPLICATE_STRATEGIES = ['keep_all', 'first', 'last', 'merge']
+MISSING_DATA_STRATEGIES = ['keep', 'drop', 'zero', 'na', 'ffill', 'bfill']
+# Settings that change how a merge runs but not what it writes
+RESOURCE_FIELDS = ('load_workers', 'max_in_flight', 'sort_memory_limit_mb',
+                   'dedup_memory_budget_mb', 'join_memory_limit_mb')
+
+
+class MergeError(Exception):
+    """The merge cannot continue; the message says why."""
+
+
+@dataclass
+class MergeConfig:
+    """Everything one merge needs. Field names match the settings of the advanced GUI."""
+    files: list = field(default_factory=list)
+    output_dir: str = ''  # '' = folder of the first file
+    output_filename: str = 'merged_data'
+    export_format: str = 'csv'
+
+    # Per-file pipeline
+    selected_columns: dict = field(default_factory=dict)  # {file_path: [columns]}
+    column_mapping: dict = field(default_factory=dict)  # {original_name: new_name}
+    filters: list = field(default_factory=list)  # [{column, operator, value} | {expression}]
+    missing_data_strategy: str = 'keep'
+
+    # Combining the files
+    merge_type: str = 'concatenate'
+    join_column_left: str = ''
+    join_column_right: str = ''
+    join_type: str = 'outer'
+    duplicate_strategy: str = 'keep_all'
+    semijoin: bool = True
+    asof_column: str = ''
+    asof_by: str = ''
+    asof_tolerance: str = ''
+    asof_direction: str = 'backward'
+
+    # Duplicate rows
+    remove_duplicate_rows: bool = False
+    duplicate_row_keep: str = 'first'
+    duplicate_key_columns: str = ''
+
+    # Sorting
+    sort_option: str = 'none'
+    sort_column: str = ''
+    sort_order: str = 'ascending'
+    extra_sort_keys: str = ''
+
+    # Output formats
+    parquet_compression: str = DEFAULT_PARQUET_CODEC
+    json_encoder: str = 'pandas'
+    incremental: bool = False  # append only rows added to the inputs since the last run
+
+    # Resources
+    load_workers: int = 0  # 0 = one loader process per CPU core
+    max_in_flight: int = 0
+    sort_memory_limit_mb: int = SORT_MEMORY_LIMIT_MB
+    dedup_memory_budget_mb: int = DEDUP_MEMORY_BUDGET_MB
+    join_memory_limit_mb: int = JOIN_MEMORY_LIMIT_MB
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a config from a dict such as a saved batch job; unknown keys are ignored."""
+        data = dict(data)
+        if 'output' in data and 'output_filename' not in data:
+            data['output_filename'] = data['output']
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names and v is not None})
+
+    def to_dict(self):
+        data = asdict(self)
+        data['files'] = [str(f) for f in self.files]
+        return data
+
+    def output_settings(self):
+        """The settings that decide what is written, without the inputs and resource limits."""
+        settings = self.to_dict()
+        for name in RESOURCE_FIELDS + ('files',):
+            settings.pop(name)
+        settings['output'] = str(expected_output_path(self).resolve())
+        return settings
+
+    def pipeline_options(self):
+        """The picklable options dict for mergecsvfiles_pipeline."""
+        return {
+            'selected_columns': dict(self.selected_columns),
+            'column_mapping': dict(self.column_mapping),
+            'filters': list(self.filters),
+            'missing_data_strategy': self.missing_data_strategy,
+        }
+
+
+@dataclass
+class MergeResult:
+    """What a merge produced, plus counts and per-phase timings in seconds."""
+    output_path: Path = None
+    rows: int = 0
+    columns: int = 0
+    rows_read: int = 0
+    files_loaded: list = field(default_factory=list)
+    files_failed: list = field(default_factory=list)  # [(path, error)]
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+    @property
+    def output_bytes(self):
+        try:
+            return os.path.getsize(self.output_path)
+        except (OSError, TypeError):
+            return 0
+
+
+def prepare_semijoin(config, files, options, log):
+    """
+    For inner/left joins, load the key source file first and add its key
+    filter to `options` so the other files drop non-matching rows while
+    they are read. Returns the preloaded {index: (df, error)} results.
+    """
+    if config.merge_type != 'join' or not config.semijoin or len(files) < 2:
+        return {}
+    try:
+        headers = [output_columns(f, options) for f in files]
+        sizes = [os.path.getsize(f) for f in files]
+    except Exception:
+        return {}
+    plan = plan_semijoin(headers, sizes, config.join_type or 'outer',
+                         config.join_column_left or None, config.join_column_right or None)
+    if plan is None:
+        return {}
+    source, keys = plan
+    try:
+        df = load_file(files[source], options)
+    except Exception as e:
+        return {source + 1: (None, str(e))}
+    key_filters = {}
+    semijoin = {}
+    for i, (source_keys, file_keys) in keys.items():
+        if tuple(source_keys) not in key_filters:
+            key_filters[tuple(source_keys)] = KeyFilter(df[source_keys])
+        semijoin[str(files[i])] = (file_keys, key_filters[tuple(source_keys)])
+    options['semijoin'] = semijoin
+    for source_keys, key_filter in key_filters.items():
+        log(f"Semi-join pre-filter: {key_filter.count:,} keys ({', '.join(source_keys)}) "
+            f"from {Path(files[source]).name} as a {key_filter.kind}; other files keep "
+            f"only matching rows while they are read\n")
+    return {source + 1: (df, None)}
+
+
+def resolve_duplicate_columns(merged, strategy, log):
+    """Apply the duplicate-column strategy to columns a join left with the same name."""
+    dup_names = [name for name in merged.columns if list(merged.columns).count(name) > 1]
+    if not dup_names:
+        return merged
+    log(f'Duplicate columns detected: {set(dup_names)} (strategy={strategy})\n')
+    if strategy == 'keep_all':
+        # rename duplicates to keep all but make unique names by suffixing occurrence index
+        counts = {}
+        new_cols = []
+        for col in merged.columns:
+            cnt = counts.get(col, 0)
+            if list(merged.columns).count(col) > 1:
+                new_cols.append(f"{col}_{cnt}")
+                counts[col] = cnt + 1
+            else:
+                new_cols.append(col)
+        merged.columns = new_cols
+    elif strategy in ('first', 'last'):
+        # Position-based, so every copy but the kept one goes
+        cols = list(merged.columns)
+        keep = [i for i, c in enumerate(cols) if c not in dup_names]
+        for name in dict.fromkeys(dup_names):
+            positions = [i for i, c in enumerate(cols) if c == name]
+            keep.append(positions[0] if strategy == 'first' else positions[-1])
+        merged = merged.iloc[:, sorted(keep)]
+        log(f'Dropped duplicate columns: {sorted(set(dup_names))}\n')
+    elif strategy == 'merge':
+        # For each duplicate name, concatenate non-null unique values per row (separated by ' | ')
+        for name in set(dup_names):
+            try:
+                merged = merge_duplicate_columns(merged, name)
+                log(f'Merged duplicate columns for: {name} -> kept {name}\n')
+            except Exception as e:
+                log(f'Failed to merge duplicate columns for {name}: {e}\n')
+    return merged
+
+
+def _remove_duplicate_rows(merged, config, log):
+    keep = config.duplicate_row_keep or 'first'
+    subset = [c for c in parse_key_columns(config.duplicate_key_columns) if c in merged.columns] or None
+    budget_mb = config.dedup_memory_budget_mb
+    before = len(merged)
+    if not fits_in_memory(merged, budget_mb):
+        # The merged frame is already loaded: partitioning it to disk and
+        # concatenating the partitions back would only add a second copy
+        log(f'Merged data exceeds the {budget_mb} MB dedup budget but is already in memory, '
+            f'deduplicating in place\n')
+    merged = merged.drop_duplicates(subset=subset, keep=keep).reset_index(drop=True)
+    log(f'Removed duplicate rows: before={before}, after={len(merged)}\n')
+    return merged
+
+
+def _sort_plan(merged, config, date_columns):
+    """Sort keys, directions, key converters and a log label for the configured sort."""
+    sort_keys, sort_ascending, converters, label = [], [], {}, ''
+    if config.sort_option == 'date' and date_columns:
+        date_col = date_columns[0]
+        sort_keys, sort_ascending = [date_col], [True]
+        converters[date_col] = lambda s: pd.to_datetime(s, errors='coerce')
+        label = f'detected date column: {date_col}'
+    elif config.sort_option == 'custom' and config.sort_column in merged.columns:
+        asc = config.sort_order == 'ascending'
+        sort_keys, sort_ascending = [config.sort_column], [asc]
+        label = f'column {config.sort_column} ({"asc" if asc else "desc"})'
+    if sort_keys:
+        for col, asc in parse_sort_keys(config.extra_sort_keys):
+            if col in merged.columns and col not in sort_keys:
+                sort_keys.append(col)
+                sort_ascending.append(asc)
+                label += f', then {col} ({"asc" if asc else "desc"})'
+    return sort_keys, sort_ascending, converters, label
+
+
+def _sort(merged, dfs, config, date_columns, log):
+    """Sort the merged frame; returns (merged, sorted_chunks or None)."""
+    sort_keys, sort_ascending, converters, label = _sort_plan(merged, config, date_columns)
+    if not sort_keys:
+        return merged, None
+    limit_mb = config.sort_memory_limit_mb
+    presorted = None
+    if config.merge_type == 'concatenate' and not config.remove_duplicate_rows:
+        try:
+            # Inputs that are each already in order only need a k-way merge
+            presorted = merge_presorted(dfs, sort_keys, sort_ascending, list(merged.columns), converters)
+        except Exception:
+            presorted = None
+    sorted_chunks = None
+    try:
+        if presorted is not None:
+            sorted_chunks = presorted
+            log('Inputs are already sorted, merging them without a full sort\n')
+        elif needs_external_sort(merged, limit_mb):
+            # Spill sorted runs to disk and k-way merge them while exporting
+            log(f'Merged data exceeds {limit_mb} MB, using external merge sort\n')
+            sorted_chunks = external_sort(iter_chunks(merged, BLOCK_ROWS), sort_keys, sort_ascending,
+                                          memory_limit_mb=limit_mb, converters=converters)
+        else:
+            for col, convert in converters.items():
+                merged[col] = convert(merged[col])
+            merged = merged.sort_values(by=sort_keys, ascending=sort_ascending).reset_index(drop=True)
+        log(f'Sorted by {label}\n')
+    except Exception as e:
+        sorted_chunks = None
+        log(f'Could not sort by {", ".join(sort_keys)}: {e}\n')
+    return merged, sorted_chunks
+
+
+def _output_dir(config, files):
+    out_dir = Path(config.output_dir) if config.output_dir else files[0].parent
+    if not out_dir.exists():
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+        except Exception:
+            out_dir = files[0].parent
+    return out_dir
+
+
+def expected_output_path(config):
+    """The file run_merge() will write for `config`."""
+    out_dir = Path(config.output_dir) if config.output_dir else Path(config.files[0]).parent
+    output_filename = config.output_filename or 'merged_data'
+    if config.export_format not in WRITERS:
+        return out_dir / (output_filename + '.csv')
+    return output_path(out_dir, output_filename, config.export_format)
+
+
+def _at_least_one(batches, empty):
+    """`batches`, or just `empty` when there are none, so writers still learn the columns."""
+    sent = False
+    for batch in batches:
+        sent = True
+        yield batch
+    if not sent:
+        yield empty
+
+
+def _write(batches, empty, out_fmt, config, files, progress, total, column_types=None):
+    """Write `batches` as `out_fmt`; returns (output path, rows). `total()` is the row count for progress."""
+    out_path = output_path(_output_dir(config, files), config.output_filename or 'merged_data', out_fmt)
+    writer_options = {}
+    if out_fmt in ('parquet', 'arrow', 'feather') and column_types:
+        writer_options['column_types'] = column_types
+    if out_fmt == 'parquet':
+        writer_options['compression'] = config.parquet_compression
+    elif out_fmt in ('json', 'ndjson'):
+        writer_options['encoder'] = config.json_encoder
+    # An empty result still gets a header (CSV, Excel) or a schema (Parquet, Arrow)
+    batches = _at_least_one(batches, empty)
+    rows = write_batches(out_fmt, out_path, batches,
+                         progress=(lambda rows, size: progress(rows, total(), size)) if progress else None,
+                         **writer_options)
+    return out_path, rows
+
+
+def _export(merged, sorted_chunks, config, files, progress):
+    out_fmt = config.export_format
+    if out_fmt not in WRITERS:
+        out_path = _output_dir(config, files) / ((config.output_filename or 'merged_data') + '.csv')
+        if sorted_chunks is not None:
+            merged = pd.concat(list(sorted_chunks), ignore_index=True, sort=False)
+        merged.to_csv(out_path, index=False)
+        return out_path
+    # Written batch by batch as the data comes out of the pipeline
+    batches = sorted_chunks if sorted_chunks is not None else iter_chunks(merged, WRITE_BATCH_ROWS)
+    # Columnar formats are typed from the whole result, not just the first batch
+    column_types = arrow_column_types(merged) if out_fmt in ('parquet', 'arrow', 'feather') else None
+    out_path, _ = _write(batches, merged.iloc[:0], out_fmt, config, files, progress, lambda: len(merged),
+                         column_types)
+    return out_path
+
+
+# -----------------
+# Streamed merges
+# -----------------
+def stream_limit_mb(config):
+    """
+    The memory limit above which a merge reads its inputs in chunks, or None.
+
+    Only concatenations that sort or remove duplicate rows stream: their
+    inputs go chunk by chunk into the partitioned dedup and the external
+    sort, and the merged frame is never built. ffill/bfill need whole files.
+    """
+    if config.merge_type != 'concatenate' or config.missing_data_strategy in ('ffill', 'bfill'):
+        return None
+    limits = []
+    if config.sort_option in ('date', 'custom'):
+        limits.append(config.sort_memory_limit_mb)
+    if config.remove_duplicate_rows:
+        limits.append(config.dedup_memory_budget_mb)
+    return min(limits) if limits else None
+
+
+def input_bytes(files):
+    """Total size of the inputs on disk; a lower bound for their size once parsed."""
+    total = 0
+    for f in files:
+        try:
+            total += os.path.getsize(f)
+        except OSError:
+            pass
+    return total
+
+
+def _align(df, columns, partial):
+    df = df.reindex(columns=columns)
+    # Like pd.concat, ints in a column that some files lack become floats
+    ints = {c: 'float64' for c in partial if pd.api.types.is_integer_dtype(df[c])}
+    return df.astype(ints) if ints else df
+
+
+def _stream_files(files, options, columns, partial, result, log):
+    """
+    Yield every input through the per-file pipeline in chunks, aligned to `columns`.
+
+    A file that cannot be read is logged and skipped as in a normal load. A
+    file that fails part way raises MergeError: its first chunks may already
+    have been spilled.
+    """
+    for i, f in enumerate(files, 1):
+        rows = 0
+        try:
+            plan = plan_scan(f, options)
+            for chunk in read_planned(f, plan, options, scan_schema(f)['encoding'], chunked=True):
+                chunk = transform_frame(chunk, f, options, filtered=plan['pushdown'])
+                rows += len(chunk)
+                result.rows_read += len(chunk)
+                yield _align(chunk, columns, partial)
+        except Exception as e:
+            if rows:
+                raise MergeError(f'{f.name} failed after {rows:,} rows: {e}')
+            log(f"{i}. Failed to read {f.name}: {e}\n")
+            result.files_failed.append((f, str(e)))
+            continue
+        result.files_loaded.append(f)
+        log(f"{i}. Streamed {f.name}: rows={rows}\n")
+
+
+def _run_streamed(config, files, options, result, log, progress, phase):
+    headers = []
+    for f in files:
+        try:
+            headers.append(output_columns(f, options))
+        except Exception:
+            pass  # reported when the file is read
+    columns = list(dict.fromkeys(c for cols in headers for c in cols))
+    partial = {c for c in columns if any(c not in cols for cols in headers)}
+    empty = pd.DataFrame(columns=columns)
+    frames = _stream_files(files, options, columns, partial, result, log)
+    if config.remove_duplicate_rows:
+        subset = [c for c in parse_key_columns(config.duplicate_key_columns) if c in columns] or None
+        frames = dedup_frames(frames, subset=subset, keep=config.duplicate_row_keep or 'first',
+                              memory_budget_mb=config.dedup_memory_budget_mb, total_bytes=input_bytes(files))
+    sort_keys, sort_ascending, converters, label = _sort_plan(empty, config, [c for c in columns if is_date_column(c)])
+    if sort_keys:
+        frames = external_sort(frames, sort_keys, sort_ascending, memory_limit_mb=config.sort_memory_limit_mb,
+                               converters=converters)
+    phase('load')
+
+    out_fmt = config.export_format if config.export_format in WRITERS else 'csv'
+    try:
+        result.output_path, result.rows = _write(frames, empty, out_fmt, config, files, progress,
+                                                 lambda: result.rows_read)
+    except MergeError:
+        raise
+    except Exception as e:
+        raise MergeError(f'Export failed: {e}')
+    if not result.files_loaded:
+        os.remove(result.output_path)
+        raise MergeError('No dataframes loaded, aborting merge.')
+    if config.remove_duplicate_rows:
+        log(f'Removed duplicate rows: before={result.rows_read}, after={result.rows}\n')
+    if sort_keys:
+        log(f'Sorted by {label} (external merge sort)\n')
+    result.columns = len(columns)
+    phase('export')
+    log(f'Exported merged file to: {result.output_path}\n')
+    log(f'Total rows: {result.rows:,}, Total columns: {result.columns}\n')
+    return result
+
+
+def run_merge(config, log=None, progress=None, shared_loads=None):
+    """
+    Run one merge as described by `config` and return a MergeResult.
+
+    `log(text)` receives the same messages the GUI log shows;
+    `progress(rows, total_rows, bytes_written)` is called while exporting.
+    `shared_loads` supplies already parsed files through load_all(): a
+    mergecsvfiles_batch.SharedLoads for files other merges of the same batch
+    parse as well, or a mergecsvfiles_incremental.SnapshotLoads.
+    Raises MergeError when the merge cannot produce an output.
+    """
+    log = log or (lambda text: None)
+    files = [Path(f) for f in config.files]
+    if not files:
+        raise MergeError('No input files given')
+    if config.incremental:
+        from mergecsvfiles_incremental import run_incremental
+        return run_incremental(config, log=log, progress=progress)
+    result = MergeResult()
+    clock = time.perf_counter()
+
+    def phase(name):
+        nonlocal clock
+        now = time.perf_counter()
+        result.timings[name] = result.timings.get(name, 0.0) + now - clock
+        clock = now
+
+    try:
+        compiled_filters = compile_filters(config.filters)
+        compiled_filters.skipped.clear()
+    except FilterError as e:
+        raise MergeError(f"Invalid filter: {e}")
+    options = config.pipeline_options()
+    try:
+        first = files[0]
+        log("Read plan: " + explain_plan(first, plan_scan(first, options),
+                                         len(scan_schema(first)['columns'])) + "\n")
+    except Exception:
+        pass
+
+    limit_mb = stream_limit_mb(config)
+    if limit_mb is not None and input_bytes(files) > limit_mb * 1024 * 1024:
+        log(f'Inputs exceed {limit_mb} MB, reading them in chunks\n')
+        result = _run_streamed(config, files, options, result, log, progress, phase)
+        for text, error in compiled_filters.skipped.items():
+            log(f"Filter skipped ({text}): {error}\n")
+        return result
+
+    # Load
+    dfs = []
+    date_columns = []
+    preloaded = prepare_semijoin(config, files, options, log)
+    if shared_loads is not None:
+        preloaded.update(shared_loads.load_all(files, options, skip=preloaded))
+    loaded = iter_loaded_files(files, options, workers=config.load_workers,
+                               max_in_flight=config.max_in_flight, preloaded=preloaded)
+    for i, f, df, error in loaded:
+        if error is not None:
+            log(f"{i}. Failed to read {f.name}: {error}\n")
+            result.files_failed.append((f, error))
+            continue
+        dfs.append(df)
+        result.files_loaded.append(f)
+        result.rows_read += len(df)
+        date_columns += [c for c in df.columns if is_date_column(c) and c not in date_columns]
+        log(f"{i}. Loaded {f.name}: rows={len(df)}, cols={len(df.columns)}\n")
+    # Rules that failed on a file are skipped there (worker processes keep their own record)
+    for text, error in compiled_filters.skipped.items():
+        log(f"Filter skipped ({text}): {error}\n")
+    if not dfs:
+        raise MergeError('No dataframes loaded, aborting merge.')
+    phase('load')
+
+    # Combine
+    if config.merge_type == 'asof':
+        on = config.asof_column or next(iter(date_columns), None)
+        if not on:
+            raise MergeError('As-of join needs a time column, aborting merge.')
+        try:
+            # Sorted inputs stream through merge_asof one window at a time
+            merged = asof_join(dfs, on, config.asof_by or None, config.asof_tolerance,
+                               config.asof_direction or 'backward', log=log)
+        except Exception as e:
+            raise MergeError(f'As-of join failed: {e}')
+    elif config.merge_type == 'join':
+        merged = dfs[0]
+        try:
+            # Order and strategy per step are chosen from per-file statistics
+            merged = join_frames(dfs, [f.name for f in result.files_loaded], config.join_column_left or None,
+                                 config.join_column_right or None, config.join_type or 'outer',
+                                 config.join_memory_limit_mb, log=log)
+        except Exception as e:
+            log(f'Join failed between frames: {e}\n')
+        try:
+            merged = resolve_duplicate_columns(merged, config.duplicate_strategy, log)
+        except Exception as e:
+            log(f'Error handling duplicate columns: {e}\n')
+    else:
+        merged = pd.concat(dfs, ignore_index=True, sort=False)
+    phase('merge')
+
+    if config.remove_duplicate_rows:
+        try:
+            merged = _remove_duplicate_rows(merged, config, log)
+        except Exception as e:
+            log(f'Could not remove duplicate rows: {e}\n')
+        phase('dedup')
+
+    merged, sorted_chunks = _sort(merged, dfs, config, date_columns, log)
+    phase('sort')
+
+    try:
+        result.output_path = _export(merged, sorted_chunks, config, files, progress)
+    except MergeError:
+        raise
+    except Exception as e:
+        raise MergeError(f'Export failed: {e}')
+    result.rows, result.columns = len(merged), len(merged.columns)
+    phase('export')
+    log(f'Exported merged file to: {result.output_path}\n')
+    log(f'Total rows: {result.rows:,}, Total columns: {result.columns}\n')
+    return result
+
+
+# -----------------
+# Command line
+# -----------------
+def _csv_files(paths):
+    """Expand directories to the CSV files they contain, keeping argument order."""
+    files = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob('*.csv')) if p.is_dir() else [p])
+    return files
+
+
+def _pairs(items, what):
+    pairs = {}
+    for item in items or []:
+        old, sep, new = item.partition('=')
+        if not sep or not old:
+            raise argparse.ArgumentTypeError(f"{what} must look like OLD=NEW, got {item!r}")
+        pairs[old] = new
+    return pairs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m mergecsvfiles_engine',
+        description='Merge CSV files without the GUI. Every option of the advanced GUI is available.')
+    parser.add_argument('inputs', nargs='*', help='CSV files, or folders whose *.csv files are merged')
+    parser.add_argument('--config', help='JSON file with MergeConfig fields (e.g. a saved batch job); '
+                                         'command-line options override it')
+    parser.add_argument('-o', '--output-dir', help='output folder (default: folder of the first file)')
+    parser.add_argument('-n', '--output-filename', help='output file name (extension added when missing)')
+    parser.add_argument('-f', '--format', dest='export_format', choices=list(EXTENSIONS))
+
+    group = parser.add_argument_group('per-file pipeline')
+    group.add_argument('--select', metavar='COLS', help='comma-separated columns to keep from every file')
+    group.add_argument('--rename', action='append', metavar='OLD=NEW', help='rename a column (repeatable)')
+    group.add_argument('--filter', action='append', metavar='EXPR',
+                       help="filter expression, e.g. \"amount > 10 and region in ('n', 's')\" (repeatable)")
+    group.add_argument('--missing', dest='missing_data_strategy', choices=MISSING_DATA_STRATEGIES)
+
+    group = parser.add_argument_group('combining files')
+    group.add_argument('--merge-type', choices=MERGE_TYPES)
+    group.add_argument('--join-on', dest='join_column_left', metavar='COL', help='join column (left side)')
+    group.add_argument('--join-right-on', dest='join_column_right', metavar='COL',
+                       help='join column of the other files when it differs')
+    group.add_argument('--join-type', choices=JOIN_TYPES)
+    group.add_argument('--duplicate-columns', dest='duplicate_strategy', choices=DUPLICATE_STRATEGIES)
+    group.add_argument('--no-semijoin', dest='semijoin', action='store_false', default=None,
+                       help='do not pre-filter join inputs on the base file keys')
+    group.add_argument('--asof-on', dest='asof_column', metavar='COL', help='time column of an as-of join')
+    group.add_argument('--asof-by', metavar='COL', help='only match rows with equal values in COL')
+    group.add_argument('--asof-tolerance', metavar='GAP', help='largest allowed gap, e.g. 5s or 2min')
+    group.add_argument('--asof-direction', choices=ASOF_DIRECTIONS)
+
+    group = parser.add_argument_group('duplicate rows')
+    group.add_argument('--remove-duplicate-rows', action='store_true', default=None)
+    group.add_argument('--keep', dest='duplicate_row_keep', choices=['first', 'last'])
+    group.add_argument('--dedup-keys', dest='duplicate_key_columns', metavar='COLS',
+                       help='comma-separated columns that identify a duplicate (default: all)')
+
+    group = parser.add_argument_group('sorting')
+    group.add_argument('--sort', dest='sort_option', choices=SORT_OPTIONS)
+    group.add_argument('--sort-column', metavar='COL')
+    group.add_argument('--descending', dest='sort_order', action='store_const', const='descending')
+    group.add_argument('--then-by', dest='extra_sort_keys', metavar='KEYS', help='e.g. "region, amount:desc"')
+
+    group = parser.add_argument_group('output and resources')
+    group.add_argument('--parquet-compression', choices=PARQUET_CODECS)
+    group.add_argument('--json-encoder', choices=JSON_ENCODERS)
+    group.add_argument('--incremental', action='store_true', default=None,
+                       help='append only the rows added to the inputs since the last run '
+                            '(csv/tsv/ndjson concatenations; see mergecsvfiles_incremental)')
+    group.add_argument('--workers', dest='load_workers', type=int, help='loader processes (0 = one per CPU)')
+    group.add_argument('--max-in-flight', type=int)
+    group.add_argument('--sort-memory-mb', dest='sort_memory_limit_mb', type=int)
+    group.add_argument('--dedup-memory-mb', dest='dedup_memory_budget_mb', type=int)
+    group.add_argument('--join-memory-mb', dest='join_memory_limit_mb', type=int)
+    group.add_argument('--catalog', metavar='PATH', help='file metadata catalog (SQLite) to read and update')
+    group.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+    return parser
+
+
+def config_from_args(args):
+    """MergeConfig from parsed command-line arguments (on top of --config, if given)."""
+    data = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+    config = MergeConfig.from_dict(data)
+    names = {f.name for f in fields(MergeConfig)}
+    for name, value in vars(args).items():
+        if name in names and value is not None:
+            setattr(config, name, value)
+    files = _csv_files(args.inputs)
+    if files:
+        config.files = files
+    if args.select:
+        columns = [c.strip() for c in args.select.split(',') if c.strip()]
+        config.selected_columns = {str(f): columns for f in config.files}
+    if args.rename:
+        config.column_mapping = dict(config.column_mapping, **_pairs(args.rename, '--rename'))
+    if args.filter:
+        config.filters = list(config.filters) + [{'expression': text} for text in args.filter]
+    return config
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        config = config_from_args(args)
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+    if not config.files:
+        parser.error('no input files')
+    if args.catalog:
+        from mergecsvfiles_catalog import FileCatalog
+        from mergecsvfiles_io import use_catalog
+        use_catalog(FileCatalog(args.catalog))
+
+    log = (lambda text: None) if args.quiet else (lambda text: print(text, end='', flush=True))
+    try:
+        result = run_merge(config, log=log)
+    except MergeError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    if not args.quiet:
+        timings = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in result.timings.items())
+        print(f'Done in {result.elapsed:.2f}s ({timings})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
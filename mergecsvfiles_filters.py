@@ -0,0 +1,465 @@
+"""Filter expressions for the merge pipeline.
+
+Filters are compiled once per merge into a single predicate that produces one
+boolean mask per chunk, so filtered data is copied once no matter how many
+rules there are. Two forms are accepted and AND-ed together:
+
+    {'column': 'amount', 'operator': '>=', 'value': '10'}      (rule dict)
+    {'expression': "region in ('north', 'south') and not status is_null"}
+
+Expression syntax:
+
+    expr      := term ('or' term)*
+    term      := factor ('and' factor)*
+    factor    := 'not' factor | '(' expr ')' | predicate
+    predicate := column op
+    op        := ('=='|'='|'!='|'>'|'<'|'>='|'<=') literal
+               | ['not'] 'in' '(' literal (',' literal)* ')'
+               | 'between' literal 'and' literal
+               | 'is_null' | 'not_null' | 'is' ['not'] 'null'
+               | 'contains' 'text'          (literal substring)
+               | 'matches' 'regex'          (regular expression)
+    literal   := number | 'text' | "text" | date 'YYYY-MM-DD[ HH:MM[:SS]]'
+    column    := name | `any name`
+
+Comparisons against a date literal parse the column as dates. A text column
+compared with a number is read as numbers, so '10' > 9 holds; cells that are
+not numbers count as missing values (they fail every comparison but !=), in
+every chunk alike.
+"""
+import json
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class FilterError(ValueError):
+    """Raised for filter expressions that cannot be parsed."""
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<quoted>`[^`]*`)
+      | (?P<op>==|!=|>=|<=|=|>|<|\(|\)|,)
+      | (?P<word>[A-Za-z_][\w.]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'not', 'in', 'between', 'is', 'null', 'is_null', 'not_null',
+             'contains', 'matches', 'date'}
+_COMPARISONS = {'==', '=', '!=', '>', '<', '>=', '<='}
+_ORDERINGS = {'>', '<', '>=', '<='}
+
+# Operators offered for {column, operator, value} rules
+FILTER_OPERATORS = ['==', '!=', '>', '<', '>=', '<=', 'contains', 'matches', 'in', 'not in',
+                    'between', 'is_null', 'not_null']
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise FilterError(f"Unexpected text at position {pos}: {text[pos:pos + 10]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'quoted':
+            kind, value = 'name', value[1:-1]
+        elif kind == 'number':
+            value = float(value) if any(c in value for c in '.eE') else int(value)
+        elif kind == 'word':
+            kind = 'kw' if value.lower() in _KEYWORDS else 'name'
+            value = value.lower() if kind == 'kw' else value
+        tokens.append((kind, value))
+    return tokens
+
+
+# -----------------
+# Literals & predicates
+# -----------------
+class _Date:
+    """A date literal; marks comparisons that need a date-parsed column."""
+    __slots__ = ('value',)
+
+    def __init__(self, text):
+        try:
+            self.value = pd.Timestamp(text)
+        except Exception as e:
+            raise FilterError(f"Invalid date literal {text!r}: {e}")
+
+
+def _coerce_literal(value):
+    """Try a string literal as a number once, at compile time."""
+    if isinstance(value, str):
+        try:
+            return value, float(value)
+        except ValueError:
+            return value, None
+    return value, value
+
+
+def _column(df, name, cache, as_date=False):
+    # Conversions are cached per chunk so a column is parsed at most once
+    key = (name, as_date)
+    if key not in cache:
+        series = df[name]
+        if as_date and not pd.api.types.is_datetime64_any_dtype(series):
+            series = pd.to_datetime(series, errors='coerce')
+        cache[key] = series
+    return cache[key]
+
+
+def _is_text(series):
+    return pd.api.types.is_string_dtype(series) or series.dtype == object
+
+
+def _numbers(df, name, cache):
+    """A text column parsed as numbers; cells that are not numbers become NaN."""
+    key = (name, 'number')
+    if key not in cache:
+        cache[key] = pd.to_numeric(df[name], errors='coerce')
+    return cache[key]
+
+
+def _as_numbers(df, name, series, cache, literals, ordered):
+    """
+    Read a text column as numbers when it is compared with numbers.
+
+    Ordering (<, between, ...) applies to any literal that reads as a number;
+    equality only to unquoted numbers, so 'id == "007"' still matches text.
+    """
+    if not _is_text(series):
+        return series
+    if ordered:
+        numeric = all(number is not None for _, number in literals)
+    else:
+        numeric = all(not isinstance(raw, (str, _Date)) for raw, _ in literals)
+    return _numbers(df, name, cache) if numeric else series
+
+
+def _operand(series, literal):
+    """Match a literal to the column: numbers for numeric columns, text otherwise."""
+    raw, number = literal
+    if isinstance(raw, _Date):
+        return raw.value
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        if number is None:
+            raise FilterError(f"{raw!r} is not a number")
+        return number
+    return raw if isinstance(raw, str) else str(raw)
+
+
+def _compare(name, op, literal):
+    as_date = isinstance(literal[0], _Date)
+
+    def predicate(df, cache):
+        series = _as_numbers(df, name, _column(df, name, cache, as_date), cache, [literal], op in _ORDERINGS)
+        value = _operand(series, literal)
+        if op in ('==', '='):
+            result = series == value
+        elif op == '!=':
+            result = series != value
+        elif op == '>':
+            result = series > value
+        elif op == '<':
+            result = series < value
+        elif op == '>=':
+            result = series >= value
+        else:
+            result = series <= value
+        return result.to_numpy(dtype=bool, na_value=False)
+    return predicate
+
+
+def _isin(name, literals, negate):
+    as_date = any(isinstance(lit[0], _Date) for lit in literals)
+
+    def predicate(df, cache):
+        series = _as_numbers(df, name, _column(df, name, cache, as_date), cache, literals, False)
+        result = series.isin([_operand(series, lit) for lit in literals]).to_numpy(dtype=bool)
+        return ~result if negate else result
+    return predicate
+
+
+def _between(name, low, high):
+    as_date = isinstance(low[0], _Date) or isinstance(high[0], _Date)
+
+    def predicate(df, cache):
+        series = _as_numbers(df, name, _column(df, name, cache, as_date), cache, [low, high], True)
+        result = series.between(_operand(series, low), _operand(series, high))
+        return result.to_numpy(dtype=bool, na_value=False)
+    return predicate
+
+
+def _is_null(name, negate):
+    def predicate(df, cache):
+        result = _column(df, name, cache).isna().to_numpy()
+        return ~result if negate else result
+    return predicate
+
+
+def _contains(name, pattern, regex):
+    if regex:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise FilterError(f"Invalid regular expression {pattern!r}: {e}")
+
+    def predicate(df, cache):
+        series = _column(df, name, cache)
+        if not (pd.api.types.is_string_dtype(series) or series.dtype == object):
+            series = series.astype(str)
+        result = series.str.contains(pattern, regex=regex, na=False)
+        return result.to_numpy(dtype=bool, na_value=False)
+    return predicate
+
+
+# -----------------
+# Parser
+# -----------------
+class _Parser:
+    def __init__(self, text, resolve=None):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.resolve = resolve or (lambda name: name)
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        tok = self.peek()
+        if tok[0] is None or (kind and tok[0] != kind) or (value is not None and tok[1] != value):
+            expected = value or kind or 'more input'
+            found = tok[1] if tok[0] is not None else 'end of expression'
+            raise FilterError(f"Expected {expected!r}, found {found!r}")
+        self.pos += 1
+        return tok[1]
+
+    def accept(self, kind, value):
+        if self.peek() == (kind, value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        node = self.expr()
+        if self.peek()[0] is not None:
+            raise FilterError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def expr(self):
+        parts = [self.term()]
+        while self.accept('kw', 'or'):
+            parts.append(self.term())
+        return parts[0] if len(parts) == 1 else _any(parts)
+
+    def term(self):
+        parts = [self.factor()]
+        while self.accept('kw', 'and'):
+            parts.append(self.factor())
+        return parts[0] if len(parts) == 1 else _all(parts)
+
+    def factor(self):
+        if self.accept('kw', 'not'):
+            return _negate(self.factor())
+        if self.accept('op', '('):
+            node = self.expr()
+            self.take('op', ')')
+            return node
+        return self.predicate()
+
+    def literal(self):
+        kind, value = self.peek()
+        if kind == 'kw' and value == 'date':
+            self.pos += 1
+            return (_Date(self.take('string')), None)
+        if kind in ('number', 'string'):
+            self.pos += 1
+            return _coerce_literal(value)
+        raise FilterError(f"Expected a value, found {value if kind else 'end of expression'!r}")
+
+    def predicate(self):
+        name = self.resolve(self.take('name'))
+        kind, op = self.peek()
+        if kind == 'op' and op in _COMPARISONS:
+            self.pos += 1
+            return _compare(name, op, self.literal())
+        negate = self.accept('kw', 'not')
+        if self.accept('kw', 'in'):
+            self.take('op', '(')
+            literals = [self.literal()]
+            while self.accept('op', ','):
+                literals.append(self.literal())
+            self.take('op', ')')
+            return _isin(name, literals, negate)
+        if negate:
+            raise FilterError(f"Expected 'in' after 'not' for column {name!r}")
+        if self.accept('kw', 'between'):
+            low = self.literal()
+            self.take('kw', 'and')
+            return _between(name, low, self.literal())
+        if self.accept('kw', 'is_null'):
+            return _is_null(name, False)
+        if self.accept('kw', 'not_null'):
+            return _is_null(name, True)
+        if self.accept('kw', 'is'):
+            negate = self.accept('kw', 'not')
+            self.take('kw', 'null')
+            return _is_null(name, negate)
+        if self.accept('kw', 'contains'):
+            return _contains(name, self.take('string'), regex=False)
+        if self.accept('kw', 'matches'):
+            return _contains(name, self.take('string'), regex=True)
+        raise FilterError(f"Expected an operator after column {name!r}, found {op!r}")
+
+
+def _all(parts):
+    def predicate(df, cache):
+        mask = parts[0](df, cache)
+        for part in parts[1:]:
+            mask = mask & part(df, cache)
+        return mask
+    return predicate
+
+
+def _any(parts):
+    def predicate(df, cache):
+        mask = parts[0](df, cache)
+        for part in parts[1:]:
+            mask = mask | part(df, cache)
+        return mask
+    return predicate
+
+
+def _negate(part):
+    return lambda df, cache: ~part(df, cache)
+
+
+# -----------------
+# Public API
+# -----------------
+def parse_expression(text, resolve=None):
+    """
+    Parse a filter expression into a predicate; raises FilterError.
+
+    `resolve(name)` maps each column name in the expression to the column the
+    predicate reads, e.g. back to its pre-rename name.
+    """
+    return _Parser(text, resolve).parse()
+
+
+def _rule_predicate(rule, resolve=None):
+    """Compile one {column, operator, value} rule dict from the filter dialog."""
+    column, op, value = rule.get('column', ''), rule.get('operator', '=='), str(rule.get('value', ''))
+    if resolve:
+        column = resolve(column)
+    if op in _COMPARISONS:
+        return _compare(column, op, _coerce_literal(value))
+    if op in ('in', 'not in'):
+        literals = [_coerce_literal(v.strip()) for v in value.split(',') if v.strip()]
+        return _isin(column, literals, op == 'not in')
+    if op == 'between':
+        bounds = [v.strip() for v in value.split(',')]
+        if len(bounds) != 2:
+            raise FilterError("'between' expects two values separated by a comma")
+        return _between(column, _coerce_literal(bounds[0]), _coerce_literal(bounds[1]))
+    if op in ('is_null', 'not_null'):
+        return _is_null(column, op == 'not_null')
+    if op == 'contains':
+        return _contains(column, value, regex=False)
+    if op == 'matches':
+        return _contains(column, value, regex=True)
+    raise FilterError(f"Unknown operator {op!r}")
+
+
+def describe_filter(rule):
+    """One-line text for a filter in the UI."""
+    if 'expression' in rule:
+        return rule['expression']
+    return f"{rule['column']} {rule['operator']} {rule.get('value', '')}".rstrip()
+
+
+class CompiledFilters:
+    """
+    Filters compiled once; call apply() on each chunk.
+
+    `rename` maps column names used by the filters to the names in the frames
+    being filtered. `columns` lists the names the filters refer to.
+    """
+
+    def __init__(self, filters, rename=None):
+        self.columns = set()
+        self.predicates = []
+
+        def resolve(name):
+            self.columns.add(name)
+            return rename.get(name, name) if rename else name
+
+        for rule in filters or []:
+            if 'expression' in rule:
+                predicate = parse_expression(rule['expression'], resolve)
+            else:
+                predicate = _rule_predicate(rule, resolve)
+            self.predicates.append((describe_filter(rule), predicate))
+
+    @property
+    def skipped(self):
+        """
+        {filter text: error} for rules that could not be evaluated.
+
+        Compiled filters are shared through the cache, but the record is kept
+        per thread: a merge (and each batch job) runs on its own thread and
+        clears it when it starts, so concurrent merges never see each other's.
+        """
+        if not hasattr(_skipped, 'rules'):
+            _skipped.rules = {}
+        return _skipped.rules
+
+    def mask(self, df):
+        """Boolean mask of the rows that pass every filter."""
+        mask = np.ones(len(df), dtype=bool)
+        cache = {}
+        for text, predicate in self.predicates:
+            try:
+                mask &= predicate(df, cache)
+            except Exception as e:
+                # Like the rule-by-rule filters before, a failing rule is skipped
+                self.skipped.setdefault(text, str(e))
+        return mask
+
+    def apply(self, df):
+        if not self.predicates:
+            return df
+        mask = self.mask(df)
+        return df if mask.all() else df[mask]
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+_skipped = threading.local()
+
+
+def compile_filters(filters, rename=None):
+    """
+    Compile a filter list, reusing the result for an identical list.
+
+    The cache means a merge parses and coerces its filters once per process
+    even though the pipeline calls this for every file and chunk.
+    """
+    key = json.dumps([filters or [], rename or {}], sort_keys=True, default=str)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is None:
+            if len(_compiled) > 32:
+                _compiled.clear()
+            compiled = _compiled[key] = CompiledFilters(filters, rename)
+    return compiled
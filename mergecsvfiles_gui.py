@@ -1,9 +1,11 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
-import pandas as pd
 import threading
 
+# The merge engine and file helpers load pandas, so they are imported on first
+# use rather than before the window is shown.
+
 
 class CSVMergerApp:
     def __init__(self, root):
@@ -351,30 +353,32 @@ class CSVMergerApp:
             self.sort_column.set('')
             return
         
-        try:
-            # Read the first file to get column names
-            df = pd.read_csv(self.selected_files[0])
-            columns = list(df.columns)
-            self.column_combo['values'] = columns
-            
-            if columns and not self.sort_column.get():
-                self.sort_column.set(columns[0])
-        except Exception as e:
-            self.log_message(f"⚠ Could not read columns: {e}\n")
+        first_file = self.selected_files[0]
+        
+        def worker():
+            # Read only the header of the first file, off the Tk thread
+            try:
+                from mergecsvfiles_io import scan_schema
+                columns = scan_schema(first_file)['columns']
+            except Exception as e:
+                message = f"⚠ Could not read columns: {e}\n"
+                self.root.after(0, lambda: self.log_message(message))
+                return
+            self.root.after(0, lambda: self._apply_column_options(first_file, columns))
+        
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
     
-    def log_message(self, message):
-        """Add message to text output"""
-        self.text_output.config(state='normal')
-        self.text_output.insert(tk.END, message)
-        self.text_output.see(tk.END)
-        self.text_output.config(state='disabled')
-        self.root.update()
+    def _apply_column_options(self, first_file, columns):
+        """Show scanned columns unless the file list changed meanwhile"""
+        if not self.selected_files or self.selected_files[0] != first_file:
+            return
+        self.column_combo['values'] = columns
+        
+        if columns and not self.sort_column.get():
+            self.sort_column.set(columns[0])
     
-    def clear_output(self):
-        """Clear the text output"""
-        self.text_output.config(state='normal')
-        self.text_output.delete('1.0', tk.END)
-        self.text_output.config(state='disabled')
     
     def merge_files(self):
         """Merge selected CSV files in a separate thread"""
@@ -393,7 +397,7 @@ class CSVMergerApp:
     
     def _perform_merge(self, selected_files):
         """Perform the actual merge operation"""
-        self.progress.start()
+        self.root.after(0, self.progress.start)
         self.log_message("=" * 100 + "\n")
         self.log_message("Starting merge operation...\n\n")
         
@@ -410,114 +414,51 @@ class CSVMergerApp:
                 self.log_message(f"📌 Sort column: {custom_column} ({sort_order})\n")
             self.log_message("\n")
             
-            # Read all selected CSV files
-            dataframes = []
-            date_columns = set()
-            
-            for idx, csv_file in enumerate(selected_files, 1):
-                try:
-                    df = pd.read_csv(csv_file)
-                    
-                    # Detect date columns
-                    for col in df.columns:
-                        if 'date' in col.lower() or 'time' in col.lower():
-                            date_columns.add(col)
-                    
-                    dataframes.append(df)
-                    self.log_message(f"  {idx}. ✓ {csv_file.name} ({len(df)} rows, {len(df.columns)} cols)\n")
-                except Exception as e:
-                    self.log_message(f"  {idx}. ✗ {csv_file.name} - Error: {e}\n")
-                    continue
-            
-            if not dataframes:
-                self.log_message("\n❌ No CSV files could be loaded successfully.\n")
-                self.progress.stop()
-                messagebox.showerror("Error", "Failed to load CSV files.")
+            # Loading, merging, sorting and export all happen in the shared engine
+            from mergecsvfiles_engine import MergeConfig, MergeError, run_merge
+            config = MergeConfig(files=selected_files, output_dir=str(selected_files[0].parent),
+                                 output_filename=output_filename, sort_option=sort_type,
+                                 sort_column=custom_column, sort_order=sort_order, load_workers=1)
+            try:
+                result = run_merge(config, log=lambda text: self.log_message(f"  {text}"))
+            except MergeError as e:
+                self.log_message(f"\n❌ {e}\n")
+                self.root.after(0, self.progress.stop)
+                self.root.after(0, lambda: messagebox.showerror("Error", "Failed to load CSV files."))
                 return
-            
-            self.log_message("\n")
-            
-            # Handle duplicate columns
-            all_columns = {}
-            for df in dataframes:
-                for col in df.columns:
-                    all_columns[col] = all_columns.get(col, 0) + 1
-            
-            duplicate_cols = {col: count for col, count in all_columns.items() if count > 1}
-            
-            # Rename duplicates
-            for i, df in enumerate(dataframes):
-                col_counter = {}
-                for col in df.columns:
-                    if col in duplicate_cols:
-                        col_counter[col] = col_counter.get(col, 0) + 1
-                        if col_counter[col] > 1:
-                            new_col_name = f"{col}_{i}"
-                            df.rename(columns={col: new_col_name}, inplace=True)
-            
-            if duplicate_cols:
-                self.log_message(f"⚠ Duplicate columns renamed: {', '.join(duplicate_cols.keys())}\n\n")
-            
-            # Merge dataframes
-            self.log_message("🔄 Merging data...\n")
-            merged_df = pd.concat(dataframes, ignore_index=True, sort=False)
-            
-            # Apply sorting based on user selection
-            if sort_type == 'date' and date_columns:
-                for date_col in list(date_columns)[:1]:
-                    if date_col in merged_df.columns:
-                        try:
-                            merged_df[date_col] = pd.to_datetime(merged_df[date_col])
-                            merged_df = merged_df.sort_values(by=date_col).reset_index(drop=True)
-                            self.log_message(f"📅 Sorted by date column: {date_col}\n")
-                        except Exception as e:
-                            self.log_message(f"⚠ Could not sort by {date_col}: {e}\n")
-            elif sort_type == 'date' and not date_columns:
-                self.log_message(f"⚠ No date columns found, keeping original order\n")
-            elif sort_type == 'custom' and custom_column:
-                if custom_column in merged_df.columns:
-                    try:
-                        ascending = (sort_order == 'ascending')
-                        merged_df = merged_df.sort_values(by=custom_column, ascending=ascending).reset_index(drop=True)
-                        self.log_message(f"📌 Sorted by column '{custom_column}' ({sort_order})\n")
-                    except Exception as e:
-                        self.log_message(f"⚠ Could not sort by {custom_column}: {e}\n")
-            else:
-                self.log_message(f"⏭ Keeping original order (no sorting applied)\n")
-            
-            # Save merged file
-            # Use the directory of the first file as output location
-            output_path = selected_files[0].parent / output_filename
-            merged_df.to_csv(output_path, index=False)
+            output_path = result.output_path
             
             self.log_message(f"\n✅ Successfully merged {len(selected_files)} CSV files\n")
             self.log_message(f"📍 Output file: {output_path}\n")
-            self.log_message(f"   • Total rows: {len(merged_df):,}\n")
-            self.log_message(f"   • Total columns: {len(merged_df.columns)}\n")
+            self.log_message(f"   • Total rows: {result.rows:,}\n")
+            self.log_message(f"   • Total columns: {result.columns}\n")
             self.log_message("\n" + "=" * 100 + "\n")
             self.log_message("✅ Merge completed successfully!\n")
             
-            self.progress.stop()
-            messagebox.showinfo(
+            self.root.after(0, self.progress.stop)
+            self.root.after(0, lambda: messagebox.showinfo(
                 "Success",
                 f"✅ Merge completed successfully!\n\n"
-                f"Rows: {len(merged_df):,}\n"
-                f"Columns: {len(merged_df.columns)}\n\n"
+                f"Rows: {result.rows:,}\n"
+                f"Columns: {result.columns}\n\n"
                 f"Output file:\n{output_path}"
-            )
+            ))
             
         except Exception as e:
             self.log_message(f"\n❌ Error: {e}\n")
-            self.progress.stop()
-            messagebox.showerror("Error", f"An error occurred:\n{e}")
+            self.root.after(0, self.progress.stop)
+            message = f"An error occurred:\n{e}"
+            self.root.after(0, lambda: messagebox.showerror("Error", message))
     
     def log_message(self, message):
-        """Add message to text output"""
+        """Add message to text output; the merge thread hands it to the Tk thread"""
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, lambda: self.log_message(message))
+            return
         self.text_output.config(state='normal')
         self.text_output.insert(tk.END, message)
         self.text_output.see(tk.END)
         self.text_output.config(state='disabled')
-        self.root.update()
     
     def clear_output(self):
         """Clear the text output"""
@@ -0,0 +1,370 @@
+"""Append-aware merges for inputs that only grow (logs, exports, feeds).
+
+A merge with incremental=True keeps a checkpoint next to its output, in
+<output>.checkpoint. For each input it records the byte offset the merge
+read up to, a hash of the header line and hashes of the first block and of
+the last line before the offset. On the next run an input counts as appended
+to when all of these are unchanged and it has grown (or kept its size and
+modification time). Then only the bytes after
+the offset are parsed, and the new rows are added to the end of the existing
+output, input by input. Anything else falls back to a full merge that writes a
+new checkpoint. That covers a rewritten or truncated input, changed settings,
+an edited output, or appended rows that bring new columns.
+
+Every read stops at the size an input had when the run started. Rows written
+to an input while the merge runs are picked up by the next run.
+
+Appending gives the same rows as a full merge but a different order: rows
+added to an earlier input come after all rows of the later inputs. It is used
+for plain concatenations whose steps work row by row and whose output can be
+appended to: no sorting, no duplicate-row removal, no ffill/bfill, and csv,
+tsv or ndjson output. Other merges run in full every time.
+
+    run_merge(MergeConfig(files=[...], incremental=True))
+
+or from a shell:
+
+    python -m mergecsvfiles_engine logs/ --format ndjson --incremental
+"""
+import hashlib
+import io
+import json
+import os
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import pandas as pd
+
+from mergecsvfiles_engine import MergeResult, expected_output_path, run_merge
+from mergecsvfiles_io import scan_schema
+from mergecsvfiles_pipeline import transform_frame
+from mergecsvfiles_plan import plan_scan, read_planned
+from mergecsvfiles_writers import write_batches
+
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+APPEND_FORMATS = ('csv', 'tsv', 'ndjson')
+# Bytes hashed at the start of a file; lines longer than this are hashed by their last TAIL_BYTES only
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 64 * 1024
+HEADER_MAX_BYTES = 1024 * 1024
+# Encodings whose newline is more than one byte cannot be cut at a byte offset
+_WIDE_ENCODINGS = ('utf-16', 'utf-32')
+
+
+class NotAppendable(Exception):
+    """The existing output cannot be extended; the message says why."""
+
+
+def unsupported_reason(config):
+    """Why `config` cannot be merged incrementally, or None when it can."""
+    if config.merge_type != 'concatenate':
+        return f'{config.merge_type} merges combine rows across files'
+    if config.sort_option != 'none':
+        return 'the output is sorted'
+    if config.remove_duplicate_rows:
+        return 'duplicate rows are removed'
+    if config.missing_data_strategy in ('ffill', 'bfill'):
+        return f'{config.missing_data_strategy} fills from neighbouring rows'
+    if config.export_format not in APPEND_FORMATS:
+        return f'{config.export_format} output cannot be appended to'
+    return None
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def input_state(path, offset=None):
+    """
+    Checkpoint entry for the first `offset` bytes of a file (default: all of
+    it): the offset, the file's modification time, and hashes of the header
+    line, the first block and the last line. `complete_end` is the offset
+    just after the last complete line. Raises OSError when it cannot be read.
+    """
+    path = Path(path)
+    stat = path.stat()
+    offset = stat.st_size if offset is None else offset
+    with open(path, 'rb') as fh:
+        head = fh.read(min(offset, HEADER_MAX_BYTES))
+        newline = head.find(b'\n')
+        header_end = newline + 1 if newline >= 0 else (offset if offset <= HEADER_MAX_BYTES else None)
+        tail_start = max(0, offset - TAIL_BYTES)
+        fh.seek(tail_start)
+        tail = fh.read(offset - tail_start)
+    last = tail.rfind(b'\n', 0, len(tail) - 1)
+    last_line_start = tail_start + last + 1 if last >= 0 else tail_start
+    ends_with_newline = tail.endswith(b'\n')
+    if ends_with_newline:
+        complete_end = offset
+    else:
+        complete_end = last_line_start if last >= 0 or tail_start == 0 else None
+    return {
+        'path': str(path.resolve()),
+        'offset': offset,
+        'mtime_ns': stat.st_mtime_ns,
+        'header_end': header_end,
+        'header': _digest(head[:header_end]) if header_end is not None else None,
+        'head_end': min(offset, HEAD_BYTES),
+        'head': _digest(head[:HEAD_BYTES]),
+        'last_line_start': last_line_start,
+        'last_line': _digest(tail[last_line_start - tail_start:]),
+        'ends_with_newline': ends_with_newline,
+        'complete_end': complete_end,
+    }
+
+
+def _range_digest(path, start, end):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        return _digest(fh.read(end - start))
+
+
+def append_blocker(old, state):
+    """Why the bytes after `old`'s offset are not just rows added to the file, or None."""
+    if old['path'] != state['path']:
+        return 'the input list changed'
+    if old['header'] is None or old['header'] != state['header']:
+        return 'its header changed'
+    if state['offset'] < old['offset']:
+        return 'it shrank'
+    if state['offset'] == old['offset'] and state['mtime_ns'] != old['mtime_ns']:
+        return 'it was modified'
+    path = state['path']
+    if (_range_digest(path, 0, old['head_end']) != old['head']
+            or _range_digest(path, old['last_line_start'], old['offset']) != old['last_line']):
+        return 'it was rewritten'
+    if state['offset'] > old['offset'] and not old['ends_with_newline']:
+        return 'its last line was incomplete'
+    return None
+
+
+# -----------------
+# Checkpoint files
+# -----------------
+def checkpoint_path(out_path):
+    out_path = Path(out_path)
+    return out_path.with_name(out_path.name + CHECKPOINT_SUFFIX)
+
+
+def read_checkpoint(out_path):
+    """The checkpoint stored with an output, or None when either is missing or the output changed."""
+    try:
+        with open(checkpoint_path(out_path), 'r', encoding='utf-8') as fh:
+            checkpoint = json.load(fh)
+        if os.path.getsize(out_path) != checkpoint.get('output_bytes'):
+            return None
+    except (OSError, ValueError):
+        return None
+    return checkpoint
+
+
+def write_checkpoint(out_path, settings, inputs, columns, dtypes, rows):
+    """Record what an output holds; written atomically so a crash never leaves half a checkpoint."""
+    checkpoint = {'settings': settings, 'inputs': inputs, 'columns': columns, 'dtypes': dtypes,
+                  'rows': rows, 'output_bytes': os.path.getsize(out_path)}
+    path = checkpoint_path(out_path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(checkpoint, fh, default=str)
+    os.replace(tmp, path)
+
+
+def remove_checkpoint(out_path):
+    try:
+        os.remove(checkpoint_path(out_path))
+    except FileNotFoundError:
+        pass
+
+
+# -----------------
+# Reading byte ranges
+# -----------------
+class ByteRange(io.RawIOBase):
+    """Read-only stream of `prefix` followed by bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end, prefix=b''):
+        super().__init__()
+        self._fh = open(path, 'rb')
+        self._fh.seek(start)
+        self._left = end - start
+        self._prefix = prefix
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._fh.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+def load_range(file_path, options, start, end, header=b''):
+    """
+    Read bytes [start, end) of a CSV file, with the `header` line put in
+    front, through the per-file pipeline (like pipeline.load_file).
+    """
+    enc = scan_schema(file_path)['encoding']
+    if start and str(enc).lower().startswith(_WIDE_ENCODINGS):
+        raise NotAppendable(f'{enc} text cannot be read from a byte offset')
+    plan = plan_scan(file_path, options)
+    with io.BufferedReader(ByteRange(file_path, start, end, prefix=header)) as stream:
+        frames = list(read_planned(stream, plan, options, enc))
+    df = frames[0] if len(frames) == 1 else pd.concat(frames)
+    return transform_frame(df, file_path, options, filtered=plan['pushdown'])
+
+
+class SnapshotLoads:
+    """
+    Loads every input only up to its size in `states`, for run_merge(shared_loads=...),
+    and keeps a row of each frame to work out the merged columns and dtypes.
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self.samples = []
+
+    def load_all(self, files, options, skip=()):
+        loaded = {}
+        for i, (f, state) in enumerate(zip(files, self.states), 1):
+            if i in skip:
+                continue
+            try:
+                df = load_range(f, options, 0, state['offset'])
+            except Exception as e:
+                loaded[i] = (None, str(e))
+                continue
+            self.samples.append(df.head(1))
+            loaded[i] = (df, None)
+        return loaded
+
+    def schema(self):
+        """(columns, {column: dtype name}) of the concatenated frames."""
+        merged = pd.concat(self.samples, ignore_index=True, sort=False)
+        return [str(c) for c in merged.columns], {str(c): str(t) for c, t in merged.dtypes.items()}
+
+
+def _conform(df, columns, dtypes):
+    """`df` with the output's columns in order, cast to the output's dtypes where possible."""
+    extra = [c for c in df.columns if str(c) not in columns]
+    if extra:
+        raise NotAppendable(f"new columns {', '.join(map(str, extra))}")
+    df = df.reindex(columns=columns)
+    for col in columns:
+        if str(df[col].dtype) != dtypes.get(col):
+            try:
+                df[col] = df[col].astype(dtypes[col])
+            except (TypeError, ValueError, KeyError):
+                pass
+    return df
+
+
+# -----------------
+# Running
+# -----------------
+def _rebuild(config, files, states, out_path, settings, log, progress):
+    remove_checkpoint(out_path)
+    loads = SnapshotLoads(states)
+    result = run_merge(replace(config, incremental=False), log=log, progress=progress, shared_loads=loads)
+    if result.files_failed:
+        log('No checkpoint written: some inputs could not be read, the next run merges everything again\n')
+        return result
+    columns, dtypes = loads.schema()
+    write_checkpoint(result.output_path, settings, states, columns, dtypes, result.rows)
+    return result
+
+
+def _append(config, files, states, checkpoint, out_path, settings, log, progress):
+    result = MergeResult(output_path=out_path, columns=len(checkpoint['columns']))
+    started = time.perf_counter()
+    options = config.pipeline_options()
+    columns, dtypes = checkpoint['columns'], checkpoint['dtypes']
+    frames = []
+    inputs = []
+    for i, (f, state, old) in enumerate(zip(files, states, checkpoint['inputs']), 1):
+        # A line still being written is left for the next run
+        end = state['complete_end']
+        if end is None or end <= old['offset']:
+            log(f'{i}. {f.name}: no new rows\n')
+            inputs.append(old if state['offset'] > old['offset'] else state)
+            continue
+        with open(f, 'rb') as fh:
+            header = fh.read(old['header_end'])
+        try:
+            df = load_range(f, options, old['offset'], end, header)
+            inputs.append(state if end == state['offset'] else input_state(f, end))
+        except Exception as e:
+            raise NotAppendable(f'new rows of {f.name} could not be read: {e}')
+        frames.append(_conform(df, columns, dtypes))
+        result.files_loaded.append(f)
+        result.rows_read += len(df)
+        log(f'{i}. Read new rows of {f.name}: rows={len(df)} (bytes {old["offset"]:,} to {end:,})\n')
+
+    result.timings['load'] = time.perf_counter() - started
+
+    # Nothing is written before every input has been read, so a failure leaves the output as it was
+    remove_checkpoint(out_path)
+    writer_options = {'encoder': config.json_encoder} if config.export_format == 'ndjson' else {}
+    total = sum(len(df) for df in frames)
+    appended = write_batches(config.export_format, out_path, frames, append=True,
+                             progress=(lambda rows, size: progress(rows, total, size)) if progress else None,
+                             **writer_options)
+    result.rows = checkpoint['rows'] + appended
+    result.timings['export'] = time.perf_counter() - started - result.timings['load']
+    write_checkpoint(out_path, settings, inputs, columns, dtypes, result.rows)
+    log(f'Appended {appended:,} rows to: {out_path}\n')
+    log(f'Total rows: {result.rows:,}, Total columns: {result.columns}\n')
+    return result
+
+
+def run_incremental(config, log=None, progress=None):
+    """
+    Merge `config` (a MergeConfig) by appending the rows added to its inputs
+    since the last run when possible, else in full. Returns a MergeResult.
+    """
+    log = log or (lambda text: None)
+    reason = unsupported_reason(config)
+    if reason:
+        log(f'Incremental merge not possible ({reason}), running a full merge\n')
+        return run_merge(replace(config, incremental=False), log=log, progress=progress)
+    files = [Path(f) for f in config.files]
+    out_path = expected_output_path(config)
+    try:
+        states = [input_state(f) for f in files]
+    except OSError as e:
+        log(f'Incremental merge not possible ({e}), running a full merge\n')
+        return run_merge(replace(config, incremental=False), log=log, progress=progress)
+    # Stored as JSON, so compare it the way it reads back
+    settings = json.loads(json.dumps(config.output_settings(), default=str))
+
+    checkpoint = read_checkpoint(out_path)
+    if checkpoint is None:
+        reason = 'no checkpoint for the existing output'
+    elif checkpoint.get('settings') != settings:
+        reason = 'the settings changed'
+    elif len(checkpoint.get('inputs', [])) != len(states):
+        reason = 'the input list changed'
+    else:
+        for f, old, state in zip(files, checkpoint['inputs'], states):
+            blocker = append_blocker(old, state)
+            if blocker:
+                reason = f'{f.name}: {blocker}'
+                break
+    if reason is None:
+        try:
+            return _append(config, files, states, checkpoint, out_path, settings, log, progress)
+        except NotAppendable as e:
+            reason = str(e)
+    log(f'Full merge ({reason})\n')
+    return _rebuild(config, files, states, out_path, settings, log, progress)
@@ -0,0 +1,154 @@
+"""File reading helpers shared by the CSV Merger front-ends.
+
+Nothing in here touches Tkinter, so the helpers can be imported from worker
+processes and command-line tools as well as from the GUIs.
+"""
+import codecs
+import csv
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+
+# Byte-order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+SAMPLE_SIZE = 64 * 1024
+FEED_SIZE = 4 * 1024
+SCHEMA_SAMPLE_ROWS = 100
+
+DIALECT_SAMPLE_BYTES = 8 * 1024
+
+# {file fingerprint: schema dict}; fingerprints change when a file is rewritten
+_schema_cache = {}
+_schema_lock = threading.Lock()
+# Optional persistent store behind the in-memory cache (see use_catalog)
+_catalog = None
+
+
+def detect_bom(path):
+    """Return the encoding implied by a byte-order mark, or None."""
+    with open(path, 'rb') as fh:
+        head = fh.read(4)
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def sample_offsets(size, sample_size=SAMPLE_SIZE):
+    """Offsets of the head, middle and tail samples for a file of `size` bytes."""
+    if size <= sample_size * 3:
+        return [0]
+    return [0, (size - sample_size) // 2, size - sample_size]
+
+
+def detect_encoding(path, sample_size=SAMPLE_SIZE):
+    """
+    Detect the text encoding of a file without reading all of it.
+
+    A byte-order mark wins outright. Otherwise chardet's incremental detector
+    is fed bounded samples from the head, middle and tail of the file and
+    stops as soon as it is confident, so detection time does not grow with
+    file size.
+
+    Returns a dict shaped like chardet.detect(): {'encoding', 'confidence'}.
+    """
+    path = Path(path)
+    bom_encoding = detect_bom(path)
+    if bom_encoding:
+        return {'encoding': bom_encoding, 'confidence': 1.0}
+
+    # chardet is only needed for files the schema cache and catalog don't know
+    from chardet import UniversalDetector
+
+    size = os.path.getsize(path)
+    detector = UniversalDetector()
+    with open(path, 'rb') as fh:
+        for offset in sample_offsets(size, sample_size):
+            fh.seek(offset)
+            sample = fh.read(sample_size)
+            for start in range(0, len(sample), FEED_SIZE):
+                detector.feed(sample[start:start + FEED_SIZE])
+                if detector.done:
+                    break
+            if detector.done:
+                break
+    result = detector.close() or {}
+
+    encoding = result.get('encoding')
+    # Plain ASCII samples say nothing about the unsampled bytes; UTF-8 is a
+    # superset that reads the same data and tolerates non-ASCII elsewhere.
+    if encoding is None or encoding.lower() == 'ascii':
+        encoding = 'utf-8'
+    return {'encoding': encoding, 'confidence': result.get('confidence') or 0.0}
+
+
+def file_fingerprint(path):
+    """Identify a file's current contents by (resolved path, size, mtime)."""
+    stat = os.stat(path)
+    return (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+def use_catalog(catalog):
+    """Back scan_schema() with a persistent FileCatalog (None to turn it off)."""
+    global _catalog
+    _catalog = catalog
+
+
+def catalog_entry(path):
+    """Everything the persistent catalog knows about the file's current contents."""
+    return (_catalog.lookup(path) if _catalog is not None else None) or {}
+
+
+def sniff_delimiter(path, encoding):
+    """Best guess at the file's field delimiter from its first lines."""
+    with open(path, 'r', encoding=encoding, errors='replace', newline='') as fh:
+        sample = fh.read(DIALECT_SAMPLE_BYTES)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+
+def scan_schema(path, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Read a file's header plus a small row sample to learn its schema.
+
+    Returns {'columns': [...], 'dtypes': {column: dtype name}, 'encoding': str,
+    'confidence': float, 'delimiter': str}. Results are memoized per file
+    fingerprint (and kept in the persistent catalog when one is in use), so
+    repeated scans of an unchanged file cost one stat() call.
+    """
+    key = file_fingerprint(path)
+    with _schema_lock:
+        cached = _schema_cache.get(key)
+    if cached is not None:
+        return cached
+
+    entry = catalog_entry(path)
+    if 'columns' in entry and 'encoding' in entry:
+        schema = {k: entry.get(k) for k in ('columns', 'dtypes', 'encoding', 'confidence', 'delimiter')}
+    else:
+        detected = detect_encoding(path)
+        sample = pd.read_csv(path, encoding=detected['encoding'], nrows=sample_rows)
+        schema = {
+            'columns': list(sample.columns),
+            'dtypes': {col: str(dtype) for col, dtype in sample.dtypes.items()},
+            'encoding': detected['encoding'],
+            'confidence': detected['confidence'],
+            'delimiter': sniff_delimiter(path, detected['encoding']),
+        }
+        if _catalog is not None:
+            _catalog.store(path, **schema)
+    with _schema_lock:
+        _schema_cache[key] = schema
+    return schema
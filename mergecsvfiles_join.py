@@ -0,0 +1,506 @@
+"""Joins for the "Join on column" merge type.
+
+hash_join() is a partitioned (Grace) hash join: both inputs are hashed on
+their join keys into N partitions spilled to temporary files, and each pair of
+partitions is joined on its own with pd.merge. Equal keys always share a
+partition, so the union of the partition joins is the full join, and only one
+partition pair has to fit in memory at a time. The joined partitions are then
+merged back into the row order pd.merge would have produced.
+"""
+import math
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from mergecsvfiles_dedup import partitions_for, row_hashes
+from mergecsvfiles_options import ASOF_DIRECTIONS, JOIN_TYPES  # noqa: F401
+from mergecsvfiles_sort import BLOCK_ROWS, estimate_frame_bytes, iter_chunks, merge_sorted_runs
+
+
+JOIN_MEMORY_LIMIT_MB = 1024
+
+_LEFT = '__csvmerger_left_row__'
+_RIGHT = '__csvmerger_right_row__'
+_KEY = '__csvmerger_join_key_{}__'
+
+
+def join_keys(left_columns, right_columns, left_on=None, right_on=None):
+    """
+    Resolve the join keys for one join step, as pd.merge would.
+
+    A single configured column is used for both sides; with none, the
+    columns the two inputs share are used. Returns (left_keys, right_keys).
+    """
+    left_on = left_on or right_on
+    right_on = right_on or left_on
+    if left_on:
+        return [left_on], [right_on]
+    common = [c for c in left_columns if c in set(right_columns)]
+    if not common:
+        raise ValueError('No join column set and the files share no columns')
+    return common, common
+
+
+def _scatter(frames, keys, count, work_dir, side, tag):
+    """Hash rows to partition files, tagging each with its input position."""
+    handles = [open(os.path.join(work_dir, f'{side}_{i:04d}.pkl'), 'wb') for i in range(count)]
+    schema = None
+    row = 0
+    try:
+        for df in frames:
+            if schema is None:
+                schema = df.iloc[:0]
+            if not len(df):
+                continue
+            tagged = df.assign(**{tag: range(row, row + len(df))})
+            row += len(df)
+            parts = row_hashes(df, keys) % count
+            for p, part in tagged.groupby(parts, sort=False):
+                pickle.dump(part, handles[p], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for fh in handles:
+            fh.close()
+    return schema
+
+
+def _load_partition(path, schema):
+    blocks = []
+    with open(path, 'rb') as fh:
+        while True:
+            try:
+                blocks.append(pickle.load(fh))
+            except EOFError:
+                break
+    os.remove(path)
+    return pd.concat(blocks, sort=False) if blocks else schema
+
+
+def _order_columns(how, left_keys, right_keys):
+    if how in ('inner', 'left'):
+        return [_LEFT, _RIGHT]
+    if how == 'right':
+        return [_RIGHT, _LEFT]
+    # Outer joins come out sorted on the (coalesced) keys, like pd.merge
+    return [_KEY.format(i) for i in range(len(left_keys))] + [_LEFT, _RIGHT]
+
+
+def hash_join(left, right, left_keys, right_keys, how='outer', memory_budget_mb=JOIN_MEMORY_LIMIT_MB,
+              total_bytes=None, tmp_dir=None, suffixes=('_x', '_y')):
+    """
+    Join two inputs (a frame or an iterable of frames each) out of core.
+
+    Matches pd.merge(left, right, how=how, left_on=left_keys,
+    right_on=right_keys, suffixes=suffixes) row for row and in the same
+    order. `total_bytes` (when known) sizes the partition count against
+    `memory_budget_mb`. Yields frames; temporary files are removed when the
+    generator finishes or is closed.
+    """
+    if isinstance(left, pd.DataFrame):
+        left = iter_chunks(left, BLOCK_ROWS) if len(left) else [left]
+    if isinstance(right, pd.DataFrame):
+        right = iter_chunks(right, BLOCK_ROWS) if len(right) else [right]
+    count = partitions_for(total_bytes, memory_budget_mb)
+    order = _order_columns(how, left_keys, right_keys)
+    work_dir = tempfile.mkdtemp(prefix='csvmerger_join_', dir=tmp_dir)
+    try:
+        left_schema = _scatter(left, left_keys, count, work_dir, 'left', _LEFT)
+        right_schema = _scatter(right, right_keys, count, work_dir, 'right', _RIGHT)
+        left_schema = left_schema.assign(**{_LEFT: pd.Series(dtype='int64')})
+        right_schema = right_schema.assign(**{_RIGHT: pd.Series(dtype='int64')})
+
+        runs = []
+        for i in range(count):
+            lp = _load_partition(os.path.join(work_dir, f'left_{i:04d}.pkl'), left_schema)
+            rp = _load_partition(os.path.join(work_dir, f'right_{i:04d}.pkl'), right_schema)
+            if not len(lp) and not len(rp):
+                continue
+            joined = lp.merge(rp, how=how, left_on=left_keys, right_on=right_keys, suffixes=suffixes)
+            if not len(joined):
+                continue
+            if how == 'outer':
+                for n, (lk, rk) in enumerate(zip(left_keys, right_keys)):
+                    lcol = lk if lk in joined.columns else lk + suffixes[0]
+                    rcol = rk if rk in joined.columns else rk + suffixes[1]
+                    joined[_KEY.format(n)] = joined[lcol].where(joined[lcol].notna(), joined[rcol])
+            run_path = os.path.join(work_dir, f'run_{i:04d}.pkl')
+            with open(run_path, 'wb') as fh:
+                ordered = joined.sort_values(order, kind='mergesort')
+                for block in iter_chunks(ordered, BLOCK_ROWS):
+                    pickle.dump(block, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            runs.append(run_path)
+
+        emitted = False
+        for block in merge_sorted_runs(runs, order, [True] * len(order)):
+            emitted = True
+            yield block.drop(columns=order).reset_index(drop=True)
+        if not emitted:
+            empty = left_schema.merge(right_schema, how=how, left_on=left_keys, right_on=right_keys,
+                                      suffixes=suffixes)
+            yield empty.drop(columns=[_LEFT, _RIGHT])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# -----------------
+# Join planning
+# -----------------
+STATS_SAMPLE_ROWS = 100_000
+BROADCAST_MAX_ROWS = 1_000_000
+
+_POS = '__csvmerger_pos_{}__'
+
+
+def file_stats(df, key, name='', sample_rows=STATS_SAMPLE_ROWS):
+    """
+    Cheap statistics for join planning: row count plus the key's estimated
+    distinct count and uniqueness, both taken from a sample of the rows.
+    """
+    rows = len(df)
+    sample = df[key].iloc[:sample_rows] if key in df.columns else pd.Series(dtype=object)
+    counts = sample.value_counts(dropna=False)
+    unique = bool(len(sample)) and len(counts) == len(sample)
+    if unique:
+        distinct = rows
+    else:
+        # GEE estimator: values seen once in the sample stand for the unseen ones
+        once = int((counts == 1).sum())
+        distinct = round(math.sqrt(rows / max(len(sample), 1)) * once + len(counts) - once)
+    return {'name': name, 'rows': rows, 'distinct': min(distinct, rows) or 1, 'unique': unique,
+            'bytes': estimate_frame_bytes(df)}
+
+
+def _estimate(current, other, how):
+    """Estimated (rows, distinct keys) of joining `other` onto `current`."""
+    rows = current['rows'] * other['rows'] / max(current['distinct'], other['distinct'], 1)
+    if how == 'inner':
+        return rows, min(current['distinct'], other['distinct'])
+    if how == 'left':
+        return max(rows, current['rows']), current['distinct']
+    return max(rows, current['rows'], other['rows']), max(current['distinct'], other['distinct'])
+
+
+def _strategy(current_bytes, other, how, limit_bytes):
+    if current_bytes + other['bytes'] > limit_bytes:
+        return 'partitioned'
+    if other['unique'] and how in ('inner', 'left'):
+        return 'indexed'
+    return 'broadcast'
+
+
+def plan_joins(stats, how, reorderable, limit_mb=JOIN_MEMORY_LIMIT_MB):
+    """
+    Choose the join order and a strategy per step.
+
+    The first input is always the base. When `reorderable`, the remaining
+    inputs are added greedily, smallest estimated intermediate result
+    first; otherwise they keep file order. Strategies: 'indexed' (lookup on
+    a unique key), 'broadcast' (in-memory hash join) or 'partitioned'
+    (hash_join() through disk, for steps over `limit_mb`).
+
+    Returns a list of steps: {'index', 'strategy', 'est_rows'}.
+    """
+    limit_bytes = limit_mb * 1024 * 1024
+    current = dict(stats[0])
+    remaining = list(range(1, len(stats)))
+    steps = []
+    while remaining:
+        if reorderable:
+            nxt = min(remaining, key=lambda i: (_estimate(current, stats[i], how)[0], i))
+        else:
+            nxt = remaining[0]
+        remaining.remove(nxt)
+        rows, distinct = _estimate(current, stats[nxt], how)
+        steps.append({'index': nxt, 'strategy': _strategy(current['bytes'], stats[nxt], how, limit_bytes),
+                      'est_rows': int(rows)})
+        # Assume the output is about as wide as both inputs together
+        width = current['bytes'] / max(current['rows'], 1) + stats[nxt]['bytes'] / max(stats[nxt]['rows'], 1)
+        current = {'rows': rows, 'distinct': max(1, distinct), 'bytes': rows * width}
+    return steps
+
+
+def explain_join_plan(stats, steps, how, key):
+    """Human-readable join plan for the merge log."""
+    lines = [f"Join plan ({how} on {key}): start with {stats[0]['name']} ({stats[0]['rows']:,} rows)"]
+    for n, step in enumerate(steps, 1):
+        s = stats[step['index']]
+        uniq = 'unique key' if s['unique'] else f"~{s['distinct']:,} keys"
+        lines.append(f"  {n}. {step['strategy']} join {s['name']} ({s['rows']:,} rows, {uniq})"
+                     f" -> est. {step['est_rows']:,} rows")
+    return '\n'.join(lines)
+
+
+def _reorderable(frames, key, how):
+    # Reordering preserves the result only when every file joins on the same
+    # key column and no other column names collide (no _x/_y suffixes)
+    if how not in ('inner', 'left', 'outer') or len(frames) < 3:
+        return False
+    seen = set()
+    for df in frames:
+        if key not in df.columns:
+            return False
+        cols = set(df.columns) - {key}
+        if cols & seen:
+            return False
+        seen |= cols
+    return True
+
+
+def _join_step(left, right, left_keys, right_keys, how, strategy, limit_mb):
+    if strategy == 'partitioned':
+        joined = hash_join(left, right, left_keys, right_keys, how, limit_mb,
+                           total_bytes=estimate_frame_bytes([left, right]))
+        return pd.concat(list(joined), ignore_index=True, sort=False)
+    if strategy == 'indexed' and left_keys == right_keys and right[right_keys[0]].is_unique:
+        # Unique keys: each left row finds at most one match by index lookup
+        # Same _x/_y suffixes as merge() for non-key columns both sides have
+        return left.join(right.set_index(right_keys[0]), on=left_keys[0], how=how,
+                         lsuffix='_x', rsuffix='_y').reset_index(drop=True)
+    return left.merge(right, left_on=left_keys, right_on=right_keys, how=how)
+
+
+def join_frames(frames, names, left_on=None, right_on=None, how='outer',
+                limit_mb=JOIN_MEMORY_LIMIT_MB, log=None):
+    """
+    Join loaded files onto the first one, planning order and strategy.
+
+    The result is the same as merging the files one by one in list order.
+    Inputs that can be reordered without changing the result are joined in
+    the cheapest estimated order, then restored to file-order columns and
+    rows. `log(text)` receives the plan and any failed steps.
+    """
+    log = log or (lambda text: None)
+    left_keys, right_keys = join_keys(frames[0].columns, frames[1].columns, left_on, right_on) \
+        if len(frames) > 1 else ([], [])
+    key = left_keys[0] if len(left_keys) == 1 and left_keys == right_keys else None
+    reorder = key is not None and _reorderable(frames, key, how)
+    stats = [file_stats(df, key if key is not None else (left_keys[0] if i == 0 else right_keys[0]), name)
+             for i, (df, name) in enumerate(zip(frames, names))] if left_keys else []
+    steps = plan_joins(stats, how, reorder, limit_mb) if stats else []
+    if steps:
+        log(explain_join_plan(stats, steps, how, ', '.join(left_keys)) + '\n')
+
+    if reorder:
+        frames = [df.assign(**{_POS.format(i): range(len(df))}) for i, df in enumerate(frames)]
+    merged = frames[0]
+    for step in steps:
+        other = frames[step['index']]
+        try:
+            lk, rk = join_keys(merged.columns, other.columns, left_on, right_on)
+            merged = _join_step(merged, other, lk, rk, how, step['strategy'], limit_mb)
+        except Exception as e:
+            log(f"Join failed between frames: {e}\n")
+
+    if reorder:
+        # Rows and columns as the file-order join would have produced them
+        positions = [_POS.format(i) for i in range(len(frames)) if _POS.format(i) in merged.columns]
+        order = ([key] if how == 'outer' else []) + positions
+        merged = merged.sort_values(order, kind='mergesort').reset_index(drop=True)
+        columns = [c for df in frames for c in df.columns if c not in positions
+                   and (c != key or df is frames[0])]
+        merged = merged[[c for c in columns if c in merged.columns]]
+    return merged
+
+
+# -----------------
+# Semi-join pre-filter
+# -----------------
+SEMIJOIN_EXACT_KEYS = 2_000_000
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+
+class KeyFilter:
+    """
+    Membership test for the join keys of one input.
+
+    Keys are reduced to 64-bit row hashes (ints and floats hash alike, as in
+    dedup). Up to `exact_limit` distinct keys are kept as a sorted hash
+    array; above that a Bloom filter is built instead. Either way a key that
+    is in the set always passes, so dropping rows that fail the test never
+    changes a join result; the rare false positive is removed by the join.
+    """
+
+    def __init__(self, keys, exact_limit=SEMIJOIN_EXACT_KEYS, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        hashes = np.unique(row_hashes(keys, None))
+        self.numeric = [pd.api.types.is_numeric_dtype(keys[c]) for c in keys.columns]
+        self.count = len(hashes)
+        self.hashes = None
+        self.bits = None
+        if self.count <= exact_limit:
+            self.hashes = hashes
+            return
+        size = math.ceil(-self.count * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.size = np.uint64(size)
+        self.probes = max(1, round(size / self.count * math.log(2)))
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+        for pos in self._positions(hashes):
+            np.bitwise_or.at(self.bits, pos >> 3, np.left_shift(1, pos & 7).astype(np.uint8))
+
+    @property
+    def kind(self):
+        return 'key set' if self.bits is None else 'Bloom filter'
+
+    def _positions(self, hashes):
+        # Double hashing: probe i is h1 + i*h2 (mod size)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        for i in range(self.probes):
+            yield (h1 + np.uint64(i) * h2) % self.size
+
+    def mask(self, keys):
+        """Boolean array: True for rows of `keys` (same column order) that may match."""
+        if [pd.api.types.is_numeric_dtype(keys[c]) for c in keys.columns] != self.numeric:
+            # e.g. text keys against numbers: leave the rows to the join
+            return np.ones(len(keys), dtype=bool)
+        hashes = row_hashes(keys, None)
+        if self.bits is None:
+            return np.isin(hashes, self.hashes, assume_unique=False)
+        result = np.ones(len(keys), dtype=bool)
+        for pos in self._positions(hashes):
+            result &= (self.bits[pos >> 3] >> (pos & 7).astype(np.uint8)) & 1 == 1
+        return result
+
+
+def plan_semijoin(headers, sizes, how='outer', left_on=None, right_on=None):
+    """
+    Decide which input's keys can pre-filter the others while they are read.
+
+    `headers` are the inputs' output columns and `sizes` their byte sizes.
+    Only inner and left joins qualify: rows of a joined file whose keys are
+    absent from the base can never reach the result. For inner joins the
+    smallest input is the source when every file joins on the same key;
+    for left joins it is always the base. Returns (source_index,
+    {file_index: (source_keys, file_keys)}) or None.
+    """
+    if how not in ('inner', 'left') or len(headers) < 2:
+        return None
+    left_on, right_on = left_on or right_on, right_on or left_on
+    source = 0
+    if how == 'inner' and left_on == right_on:
+        source = min(range(len(headers)), key=lambda i: (sizes[i], i))
+    keys = {}
+    for i, columns in enumerate(headers):
+        if i == source:
+            continue
+        if left_on:
+            # The base's key column keeps its values through inner/left joins
+            # (and left_on == right_on whenever the source is another file)
+            pair = ([left_on], [right_on])
+        else:
+            # Shared columns are always join keys, so they are equal in every output row
+            common = [c for c in headers[source] if c in set(columns)]
+            pair = (common, common)
+        if pair[0] and set(pair[0]) <= set(headers[source]) and set(pair[1]) <= set(columns):
+            keys[i] = pair
+    return (source, keys) if keys else None
+
+
+# -----------------
+# As-of joins
+# -----------------
+def parse_tolerance(text, key_dtype):
+    """Turn the tolerance box text into a value merge_asof accepts (None = no limit)."""
+    text = str(text or '').strip()
+    if not text:
+        return None
+    if pd.api.types.is_datetime64_any_dtype(key_dtype):
+        return pd.Timedelta(text)
+    value = float(text)
+    return int(value) if pd.api.types.is_integer_dtype(key_dtype) and value.is_integer() else value
+
+
+def asof_key(series):
+    """The as-of key as a sortable dtype: numbers stay numeric, anything else is parsed as dates."""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _last_per_group(df, on, by):
+    if by:
+        return df.drop_duplicates(subset=by, keep='last')
+    return df.iloc[-1:]
+
+
+def stream_asof(left_chunks, right_chunks, on, by=None, tolerance=None, direction='backward',
+                suffixes=('_x', '_y')):
+    """
+    merge_asof over two inputs that are each sorted on `on`, chunk by chunk.
+
+    Holds one left chunk plus a window of the right input: everything from
+    the current left key range onward, and the last earlier row (per `by`
+    group) that a backward or nearest match can still need. Yields joined
+    chunks in left order; the result equals one pd.merge_asof call.
+    """
+    right_iter = iter(right_chunks)
+    window = None
+    exhausted = False
+    # How far past a left chunk's last key the right side must be read; a
+    # forward match within a `by` group can be arbitrarily far without a tolerance
+    unbounded = direction != 'backward' and tolerance is None and bool(by)
+    lookahead = tolerance if direction != 'backward' and tolerance is not None else None
+
+    for chunk in left_chunks:
+        if not len(chunk):
+            continue
+        hi = chunk[on].iloc[-1]
+        reach = hi if lookahead is None else hi + lookahead
+        while not exhausted and (window is None or not len(window) or unbounded
+                                 or window[on].iloc[-1] <= reach):
+            nxt = next(right_iter, None)
+            if nxt is None:
+                exhausted = True
+            else:
+                window = nxt if window is None else pd.concat([window, nxt], ignore_index=True)
+        if window is None:
+            raise ValueError('As-of join input is empty')
+        yield pd.merge_asof(chunk, window, on=on, by=by, tolerance=tolerance,
+                            direction=direction, suffixes=suffixes)
+        # Keep rows at/after `hi` plus the last earlier row per group
+        before = window[window[on] < hi]
+        window = pd.concat([_last_per_group(before, on, by), window[window[on] >= hi]], ignore_index=True)
+
+
+def asof_join(frames, on, by=None, tolerance=None, direction='backward', block_rows=BLOCK_ROWS, log=None):
+    """
+    Join every later frame onto the first one with merge_asof semantics.
+
+    Inputs already sorted on `on` are streamed as they are; others are sorted
+    first. Each file is a stage in a chunk pipeline, so only a window of
+    every input is joined at a time. Base rows whose time key is missing
+    are kept at the end with no match. Returns the joined frame.
+    """
+    log = log or (lambda text: None)
+    by = [by] if isinstance(by, str) and by else (by or None)
+    for name in [on] + (by or []):
+        if any(name not in df.columns for df in frames):
+            raise ValueError(f"Column '{name}' is not in every file")
+    prepared = []
+    for df in frames:
+        df = df.assign(**{on: asof_key(df[on])})
+        if not df[on].is_monotonic_increasing:
+            df = df.sort_values(on, kind='mergesort', na_position='last')
+        prepared.append(df)
+    if len({str(df[on].dtype) for df in prepared}) > 1 and all(
+            pd.api.types.is_numeric_dtype(df[on]) for df in prepared):
+        # merge_asof needs one key dtype; mixed int/float keys compare as floats
+        prepared = [df.assign(**{on: df[on].astype('float64')}) for df in prepared]
+    tol = parse_tolerance(tolerance, prepared[0][on].dtype) if not isinstance(tolerance, (int, float, pd.Timedelta)) \
+        else tolerance
+    log(f"As-of join on {on} ({direction}" + (f", tolerance {tol}" if tol is not None else '')
+        + (f", by {', '.join(by)}" if by else '') + ")\n")
+
+    base = prepared[0]
+    missing = base[base[on].isna()]
+    chunks = iter_chunks(base[base[on].notna()], block_rows)
+    for other in prepared[1:]:
+        other = other[other[on].notna()]
+        chunks = stream_asof(chunks, iter_chunks(other, block_rows), on, by, tol, direction)
+    parts = list(chunks)
+    merged = pd.concat(parts, ignore_index=True, sort=False) if parts else base.iloc[:0]
+    if len(missing):
+        merged = pd.concat([merged, missing], ignore_index=True, sort=False)
+    return merged
@@ -0,0 +1,14 @@
+"""Option vocabularies shared by the GUIs, the engine and its helpers.
+
+This module must stay free of heavy imports (pandas, numpy, pyarrow): the
+GUIs read these lists while building their first window, before any data
+code is loaded.
+"""
+
+PARQUET_CODECS = ['snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none']
+DEFAULT_PARQUET_CODEC = 'snappy'
+JSON_ENCODERS = ['pandas', 'orjson']
+JOIN_TYPES = ['inner', 'left', 'right', 'outer']
+ASOF_DIRECTIONS = ['backward', 'forward', 'nearest']
+DEFAULT_BATCH_WORKERS = 2
+DEFAULT_BATCH_MEMORY_BUDGET_MB = 4096
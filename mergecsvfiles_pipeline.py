@@ -0,0 +1,341 @@
+"""Per-file load pipeline for the advanced merge.
+
+Every input goes through the same steps: detect encoding -> read_csv ->
+column selection & mapping -> filters -> missing-data handling. The read is
+planned first (see mergecsvfiles_plan) so only needed columns are parsed and
+filters run on each chunk as it is read when possible. The steps are
+plain functions over a picklable options dict so they can run in worker
+processes as well as on the calling thread.
+
+Options keys:
+    selected_columns       {file_path: [columns]}
+    column_mapping         {original_name: new_name}
+    filters                [{column, operator, value} | {expression}]
+    missing_data_strategy  'keep' | 'drop' | 'zero' | 'na' | 'ffill' | 'bfill'
+    semijoin               {file_path: (key_columns, KeyFilter)} (optional)
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from mergecsvfiles_filters import compile_filters
+from mergecsvfiles_io import catalog_entry, scan_schema
+from mergecsvfiles_plan import plan_scan, read_planned
+
+
+def apply_column_selection_and_mapping(df, file_path, selected_columns=None, column_mapping=None):
+    # If selected_columns configured, use them (selection stored per-file)
+    sel = []
+    if selected_columns:
+        sel = selected_columns.get(str(file_path), [])
+    if sel:
+        cols = [c for c in sel if c in df.columns]
+        df = df.loc[:, cols]
+
+    # Apply mapping
+    if column_mapping:
+        rename_map = {k: v for k, v in column_mapping.items() if k in df.columns}
+        if rename_map:
+            df = df.rename(columns=rename_map)
+    return df
+
+
+def apply_filters(df, filters):
+    # Compiled once per filter list; every rule contributes to a single mask
+    if not filters:
+        return df
+    return compile_filters(filters).apply(df)
+
+
+def handle_missing_data(df, strategy):
+    if strategy == 'drop':
+        return df.dropna()
+    if strategy == 'zero':
+        return df.fillna(0)
+    if strategy == 'na':
+        return df.fillna('N/A')
+    if strategy == 'ffill':
+        return df.ffill()
+    if strategy == 'bfill':
+        return df.bfill()
+    return df
+
+
+def transform_frame(df, file_path, options, filtered=False):
+    """
+    Run the selection/mapping, filter and missing-data steps on one frame.
+
+    filtered=True skips the filters for frames already filtered while reading.
+    """
+    df = apply_column_selection_and_mapping(
+        df, file_path, options.get('selected_columns'), options.get('column_mapping'))
+    if not filtered:
+        df = apply_filters(df, options.get('filters'))
+    return handle_missing_data(df, options.get('missing_data_strategy', 'keep'))
+
+
+def semijoin_filter(df, semijoin):
+    """Drop rows whose join keys cannot match (semijoin = (key_columns, KeyFilter))."""
+    keys, key_filter = semijoin
+    if not len(df) or not set(keys) <= set(df.columns):
+        return df
+    return df[key_filter.mask(df[keys])]
+
+
+def load_file(file_path, options, plan=None):
+    """Read one CSV file and run it through the full per-file pipeline."""
+    enc = scan_schema(file_path)['encoding']
+    plan = plan or plan_scan(file_path, options)
+    semijoin = (options.get('semijoin') or {}).get(str(file_path))
+    if semijoin and options.get('missing_data_strategy') not in ('ffill', 'bfill'):
+        # Every remaining step is row by row, so rows that cannot join are
+        # dropped from each chunk before the next one is read
+        frames = [semijoin_filter(transform_frame(chunk, file_path, options, filtered=plan['pushdown']), semijoin)
+                  for chunk in read_planned(file_path, plan, options, enc, chunked=True)]
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+    frames = list(read_planned(file_path, plan, options, enc))
+    df = frames[0] if len(frames) == 1 else pd.concat(frames)
+    df = transform_frame(df, file_path, options, filtered=plan['pushdown'])
+    return semijoin_filter(df, semijoin) if semijoin else df
+
+
+def _load_file_safely(file_path, options):
+    # Errors come back as strings so the caller can log them in order
+    try:
+        return load_file(file_path, options), None
+    except Exception as e:
+        return None, str(e)
+
+
+def resolve_workers(workers, file_count):
+    """Clamp a configured worker count (0 = one per CPU) to the number of files."""
+    if not workers or workers < 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, file_count))
+
+
+def iter_loaded_files(files, options, workers=1, max_in_flight=0, preloaded=None):
+    """
+    Load `files` through the per-file pipeline, yielding results in input order.
+
+    Yields (index, path, df, error) tuples with 1-based indexes; exactly one
+    of df/error is None. With more than one worker the files are loaded in a
+    ProcessPoolExecutor; at most `max_in_flight` results (default: twice the
+    worker count) are pending at once, which bounds memory held by finished
+    frames that are waiting for an earlier, slower file. `preloaded` maps
+    1-based indexes to (df, error) results that were already loaded.
+    """
+    files = list(files)
+    preloaded = preloaded or {}
+    workers = resolve_workers(workers, len(files) - len(preloaded))
+    if workers == 1:
+        for i, f in enumerate(files, 1):
+            df, error = preloaded[i] if i in preloaded else _load_file_safely(f, options)
+            yield i, f, df, error
+        return
+
+    max_in_flight = max_in_flight if max_in_flight and max_in_flight > 0 else workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for i, f in enumerate(files, 1):
+            if i in preloaded:
+                pending.append((i, f, preloaded[i]))
+                continue
+            pending.append((i, f, pool.submit(_load_file_safely, f, options)))
+            if len(pending) >= max_in_flight:
+                idx, path, result = pending.popleft()
+                yield (idx, path) + (result if isinstance(result, tuple) else result.result())
+        while pending:
+            idx, path, result = pending.popleft()
+            yield (idx, path) + (result if isinstance(result, tuple) else result.result())
+
+
+# -----------------
+# Preview
+# -----------------
+PREVIEW_ROWS = 20
+PREVIEW_ROWS_PER_FILE = 1000
+PREVIEW_CHUNKSIZE = 100_000
+
+
+def is_date_column(name):
+    lowered = str(name).lower()
+    return 'date' in lowered or 'time' in lowered
+
+
+def output_columns(file_path, options):
+    """Columns a file contributes after selection & mapping, from its header alone."""
+    header = pd.DataFrame(columns=scan_schema(file_path)['columns'])
+    return list(apply_column_selection_and_mapping(
+        header, file_path, options.get('selected_columns'), options.get('column_mapping')).columns)
+
+
+def top_k(df, column, k, ascending=True):
+    """The k first rows of df sorted on column (nulls last) without a full sort."""
+    if pd.api.types.is_numeric_dtype(df[column]) or pd.api.types.is_datetime64_any_dtype(df[column]):
+        pick = df.nsmallest if ascending else df.nlargest
+        top = pick(k, column)
+        if len(top) < k:
+            top = pd.concat([top, df[df[column].isna()].head(k - len(top))])
+        return top
+    return df.sort_values(by=column, ascending=ascending, kind='stable').head(k)
+
+
+def _sample_byte_span(file_path, rows):
+    """Bytes taken by the header plus `rows` lines, and whether EOF was reached."""
+    with open(file_path, 'rb') as fh:
+        for _ in range(rows + 1):
+            if not fh.readline():
+                return fh.tell(), True
+        consumed = fh.tell()
+        return consumed, not fh.read(1)
+
+
+def build_preview(files, options, sort_option='none', sort_column='', ascending=True,
+                  limit=PREVIEW_ROWS, rows_per_file=PREVIEW_ROWS_PER_FILE, exact=False,
+                  on_error=None):
+    """
+    Build a merged preview without materialising the merged dataset.
+
+    By default at most `rows_per_file` rows of each file are read and the
+    total row count is extrapolated from file sizes, or taken from the file
+    catalog when it already knows a file's row count. With exact=True, or
+    when a sort key applies (the first rows of the merge can come from
+    anywhere in a file), every file is streamed in chunks and the count is
+    exact; memory stays bounded because sorted previews keep only a running
+    top-k.
+
+    Returns {'frame', 'total_rows', 'total_columns', 'estimated', 'sort_column'}.
+    `on_error(path, error)` is called for files that cannot be read.
+    """
+    files = list(files)
+    columns = []
+    readable = []
+    for f in files:
+        try:
+            for col in output_columns(f, options):
+                if col not in columns:
+                    columns.append(col)
+            readable.append(f)
+        except Exception as e:
+            if on_error:
+                on_error(f, e)
+
+    key = None
+    if sort_option == 'date':
+        key = next((c for c in columns if is_date_column(c)), None)
+    elif sort_option == 'custom' and sort_column in columns:
+        key = sort_column
+
+    best = None
+    total_rows = 0
+    estimated = False
+    # Without filters or dropped rows a catalogued row count is exact
+    row_preserving = not options.get('filters') and options.get('missing_data_strategy') != 'drop'
+
+    def take(frame):
+        nonlocal best
+        frame = frame.reindex(columns=columns)
+        if key is not None:
+            if sort_option == 'date':
+                frame[key] = pd.to_datetime(frame[key], errors='coerce')
+            frame = top_k(frame, key, limit, ascending)
+            candidates = frame if best is None else pd.concat([best, frame])
+            best = top_k(candidates, key, limit, ascending)
+        elif best is None or len(best) < limit:
+            needed = limit - (0 if best is None else len(best))
+            head = frame.head(needed)
+            best = head if best is None else pd.concat([best, head])
+
+    for f in readable:
+        try:
+            encoding = scan_schema(f)['encoding']
+            plan = plan_scan(f, options)
+            if exact or key is not None:
+                for chunk in pd.read_csv(f, encoding=encoding, usecols=plan['usecols'],
+                                         chunksize=PREVIEW_CHUNKSIZE):
+                    chunk = transform_frame(chunk, f, options)
+                    total_rows += len(chunk)
+                    take(chunk)
+            else:
+                consumed, complete = _sample_byte_span(f, rows_per_file)
+                sample = pd.read_csv(f, encoding=encoding, usecols=plan['usecols'], nrows=rows_per_file)
+                sample = transform_frame(sample, f, options)
+                known = catalog_entry(f).get('row_count') if row_preserving else None
+                if complete:
+                    total_rows += len(sample)
+                elif known is not None:
+                    total_rows += known
+                else:
+                    estimated = True
+                    total_rows += round(len(sample) * os.path.getsize(f) / max(consumed, 1))
+                take(sample)
+        except Exception as e:
+            if on_error:
+                on_error(f, e)
+
+    if best is None:
+        best = pd.DataFrame(columns=columns)
+    return {
+        'frame': best.reset_index(drop=True),
+        'total_rows': total_rows,
+        'total_columns': len(columns),
+        'estimated': estimated,
+        'sort_column': key,
+    }
+
+
+# -----------------
+# Merged frame helpers
+# -----------------
+def _as_text(series):
+    """str(v) of each value, None where null; str() runs once per distinct value."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    labels = np.array([str(u) for u in uniques] + [None], dtype=object)
+    mask = codes >= 0
+    return labels[codes], mask
+
+
+def _common_numbers(columns):
+    """Numeric columns cast to one dtype, as a row holding all of them would be."""
+    dtypes = [c.dtype for c in columns]
+    if all(isinstance(d, np.dtype) and d.kind in 'iuf' for d in dtypes):
+        common = np.result_type(*dtypes)
+        return [c.astype(common) for c in columns]
+    return columns
+
+
+def merge_duplicate_columns(df, name):
+    """
+    Collapse every column called `name` into one, column-wise.
+
+    Each row gets the unique non-null values (as strings, first-seen order)
+    joined with ' | ', or NA when all are null. The merged column takes the
+    place of the first occurrence. When every duplicate is numeric they are
+    first cast to a common dtype, so int 1 and float 1.0 both read '1.0'.
+    """
+    positions = [i for i, c in enumerate(df.columns) if c == name]
+    texts = [_as_text(c) for c in _common_numbers([df.iloc[:, p] for p in positions])]
+
+    out, filled = texts[0][0].copy(), texts[0][1].copy()
+    for j in range(1, len(texts)):
+        text, mask = texts[j]
+        new = mask.copy()
+        for prev_text, prev_mask in texts[:j]:
+            new &= ~(prev_mask & (prev_text == text))
+        append = new & filled
+        out[append] = out[append] + ' | ' + text[append]
+        start = new & ~filled
+        out[start] = text[start]
+        filled |= new
+    out[~filled] = pd.NA
+    values = out
+
+    keep = [i for i in range(df.shape[1]) if i not in positions[1:]]
+    result = df.iloc[:, keep].copy()
+    first = keep.index(positions[0])
+    result.isetitem(first, values)
+    return result
@@ -0,0 +1,90 @@
+"""Scan planning for the per-file pipeline.
+
+Before a file is read, its header and the merge options are turned into a
+scan plan: which columns to parse (projection pushdown into read_csv's
+usecols) and whether the row filters can run on the raw chunks as they are
+parsed (predicate pushdown), with filter columns resolved back through
+column_mapping to the names in the file. Filters pushed down this way are
+evaluated chunk by chunk, so rows that fail them never reach the later steps
+or stay in memory.
+
+The plan never changes results: anything that cannot be resolved
+unambiguously is left to the normal select -> rename -> filter order.
+"""
+import pandas as pd
+
+from mergecsvfiles_filters import compile_filters
+from mergecsvfiles_io import scan_schema
+
+
+SCAN_CHUNKSIZE = 200_000
+
+
+def plan_scan(file_path, options, columns=None):
+    """
+    Plan how to read one file for the pipeline.
+
+    `columns` is the file's header (looked up with scan_schema() when None).
+    Returns {'usecols', 'columns', 'rename', 'pushdown', 'read_columns'}:
+    usecols is None when every column is needed; rename maps each output
+    column name to the column it comes from in the file; pushdown says
+    whether the filters are applied while reading.
+    """
+    header = list(columns) if columns is not None else scan_schema(file_path)['columns']
+    selection = (options.get('selected_columns') or {}).get(str(file_path), [])
+    kept = [c for c in header if c in selection] if selection else header
+    # Columns that survive selection are all that any later step can see.
+    # read_csv renames repeated headers to "name.1"; usecols cannot name those.
+    mangled = any(c.rpartition('.')[0] in header and c.rpartition('.')[2].isdigit()
+                  for c in map(str, header))
+    usecols = kept if selection and len(kept) < len(header) and not mangled else None
+
+    mapping = options.get('column_mapping') or {}
+    rename = {}
+    ambiguous = False
+    for col in kept:
+        name = mapping.get(col, col)
+        ambiguous |= name in rename
+        rename[name] = col
+
+    pushdown = False
+    filters = options.get('filters')
+    if filters and not ambiguous:
+        # Only when every filter column exists in the output; otherwise the
+        # rule must fail (and be skipped) exactly as it would after renaming
+        pushdown = compile_filters(filters).columns <= set(rename)
+    return {
+        'usecols': usecols,
+        'columns': kept,
+        'rename': {k: v for k, v in rename.items() if k != v},
+        'pushdown': pushdown,
+        'read_columns': len(kept),
+    }
+
+
+def read_planned(file_path, plan, options, encoding, nrows=None, chunksize=SCAN_CHUNKSIZE, chunked=False):
+    """
+    Yield a file's raw frames (original column names) according to `plan`.
+
+    Only plan['usecols'] are parsed. With pushdown (or chunked=True) the file
+    is read in chunks; pushed-down filters run on each chunk as soon as it
+    is parsed.
+    """
+    read_kwargs = {'encoding': encoding, 'usecols': plan['usecols'], 'nrows': nrows}
+    if not plan['pushdown'] and not chunked:
+        yield pd.read_csv(file_path, **read_kwargs)
+        return
+    compiled = compile_filters(options.get('filters'), plan['rename']) if plan['pushdown'] else None
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, **read_kwargs):
+        yield compiled.apply(chunk) if compiled else chunk
+
+
+def explain_plan(file_path, plan, total_columns=None):
+    """One-line description of a scan plan for the log."""
+    name = getattr(file_path, 'name', file_path)
+    if plan['usecols'] is None:
+        cols = 'all columns'
+    else:
+        cols = f"{len(plan['usecols'])}" + (f"/{total_columns}" if total_columns else '') + ' columns'
+    filters = 'filters pushed into read' if plan['pushdown'] else 'filters after read'
+    return f"{name}: read {cols}, {filters}"
@@ -0,0 +1,447 @@
+"""Sorting for merges that may not fit in memory.
+
+external_sort() sorts runs sized from a memory limit, spills each run to a
+temporary file as a sequence of pickled blocks and k-way merges the runs back,
+holding roughly one block per run in memory at a time.
+
+kway_merge_sorted() merges inputs that are each already sorted (daily
+exports in timestamp order) while they are read chunk by chunk: a heap-based
+streaming merge with no global sort at all. merge_presorted() handles the
+same case for frames already in memory.
+"""
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+SORT_MEMORY_LIMIT_MB = 1024
+RUN_ROWS = 1_000_000
+BLOCK_ROWS = 50_000
+# Runs merged at once; more are merged in several passes
+MERGE_FAN_IN = 64
+
+
+def parse_sort_keys(text):
+    """
+    Parse extra sort keys written as "col, col2:desc, col3:asc".
+
+    Returns a list of (column, ascending) tuples; keys without an order sort
+    ascending.
+    """
+    keys = []
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        column, _, order = part.rpartition(':')
+        if not column or order.strip().lower() not in ('asc', 'desc', 'ascending', 'descending'):
+            column, order = part, 'asc'
+        keys.append((column.strip(), not order.strip().lower().startswith('desc')))
+    return keys
+
+
+def estimate_frame_bytes(frames):
+    """In-memory size of one frame or a list of frames, including object data."""
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    return int(sum(df.memory_usage(deep=True).sum() for df in frames))
+
+
+def needs_external_sort(frames, limit_mb=SORT_MEMORY_LIMIT_MB):
+    return estimate_frame_bytes(frames) > limit_mb * 1024 * 1024
+
+
+def sort_frame(df, keys, ascending):
+    # mergesort keeps equal keys in input order, which the run merge relies on
+    return df.sort_values(by=keys, ascending=ascending, kind='mergesort')
+
+
+def iter_chunks(df, rows):
+    """Split a frame into consecutive slices of at most `rows` rows."""
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+class _RunReader:
+    """Reads a spilled run back one block at a time, one block ahead."""
+
+    def __init__(self, path):
+        self.fh = open(path, 'rb')
+        self.ahead = self._read()
+
+    def _read(self):
+        try:
+            return pickle.load(self.fh)
+        except EOFError:
+            self.fh.close()
+            return None
+
+    def has_more(self):
+        return self.ahead is not None
+
+    def next_block(self):
+        block, self.ahead = self.ahead, (self._read() if self.ahead is not None else None)
+        return block
+
+    def close(self):
+        if not self.fh.closed:
+            self.fh.close()
+
+
+def run_bytes_for(limit_mb):
+    """Size of one sorted run: sorting a run takes about twice its size."""
+    return max(1, int(limit_mb * 1024 * 1024) // 2)
+
+
+def spill_sorted_runs(frames, keys, ascending, tmp_dir, run_bytes=None,
+                      block_rows=BLOCK_ROWS, converters=None):
+    """Cut `frames` into sorted runs of about `run_bytes` bytes in memory and spill them to disk."""
+    run_bytes = run_bytes or run_bytes_for(SORT_MEMORY_LIMIT_MB)
+    paths = []
+    pending = []
+    pending_bytes = 0
+
+    def spill():
+        run = sort_frame(pd.concat(pending, ignore_index=True, sort=False), keys, ascending)
+        path = os.path.join(tmp_dir, f'run_{len(paths):05d}.pkl')
+        with open(path, 'wb') as fh:
+            for block in iter_chunks(run, block_rows):
+                pickle.dump(block, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        paths.append(path)
+
+    for df in frames:
+        for col, convert in (converters or {}).items():
+            if col in df.columns:
+                df = df.assign(**{col: convert(df[col])})
+        pending.append(df)
+        pending_bytes += estimate_frame_bytes(df)
+        if pending_bytes >= run_bytes:
+            spill()
+            pending, pending_bytes = [], 0
+    if pending:
+        spill()
+    return paths
+
+
+def _rows_before(df, bound, keys, ascending, inclusive=True):
+    """How many leading rows of sorted `df` sort before (or at) the row `bound`, nulls last."""
+    before = np.zeros(len(df), dtype=bool)
+    tied = np.ones(len(df), dtype=bool)
+    for key, asc in zip(keys, ascending):
+        values = df[key]
+        nulls = values.isna().to_numpy()
+        limit = bound[key]
+        if pd.isna(limit):
+            less, equal = ~nulls, nulls
+        else:
+            less = ((values < limit) if asc else (values > limit)).to_numpy(dtype=bool, na_value=False) & ~nulls
+            equal = (values == limit).to_numpy(dtype=bool, na_value=False) & ~nulls
+        before |= tied & less
+        tied &= equal
+    return int((before | tied).sum() if inclusive else before.sum())
+
+
+def _merge_runs(paths, keys, ascending):
+    readers = [_RunReader(p) for p in paths]
+
+    def next_block(run):
+        while readers[run].has_more():
+            block = readers[run].next_block()
+            if len(block):
+                return block
+        return None
+
+    try:
+        held = {}
+        for run in range(len(readers)):
+            block = next_block(run)
+            if block is not None:
+                held[run] = block
+        while held:
+            runs = list(held)
+            # Only runs with blocks still on disk limit what can be emitted
+            open_runs = [run for run in runs if readers[run].has_more()]
+            if not open_runs:
+                yield sort_frame(pd.concat([held[run] for run in runs], ignore_index=True, sort=False),
+                                 keys, ascending).reset_index(drop=True)
+                break
+            lasts = pd.concat([held[run].iloc[[-1]] for run in open_runs], ignore_index=True, sort=False)
+            first = sort_frame(lasts, keys, ascending).index[0]
+            bound, bound_run = lasts.iloc[first], open_runs[first]
+            parts = []
+            for run in runs:
+                block = held[run]
+                # Rows equal to the bound in later runs wait until the bound run has none left
+                n = _rows_before(block, bound, keys, ascending, inclusive=run <= bound_run)
+                if not n:
+                    continue
+                parts.append(block.iloc[:n])
+                if n < len(block):
+                    held[run] = block.iloc[n:]
+                else:
+                    block = next_block(run)
+                    if block is None:
+                        del held[run]
+                    else:
+                        held[run] = block
+            # Parts are in run order, so the stable sort keeps equal keys in run order
+            yield sort_frame(pd.concat(parts, ignore_index=True, sort=False), keys, ascending).reset_index(drop=True)
+    finally:
+        for r in readers:
+            r.close()
+
+
+def merge_sorted_runs(paths, keys, ascending, block_rows=BLOCK_ROWS):
+    """
+    K-way merge spilled runs, yielding sorted frames.
+
+    One block per run is held in memory. Each round takes the smallest last
+    row among the held blocks of runs with more blocks on disk as a bound
+    (from the first such run): no unread row can sort before it. Held rows
+    before the bound, plus rows equal to it from that run and earlier ones,
+    are cut off their blocks with a vectorised comparison. Only those rows
+    are sorted and emitted, so at least one whole block leaves per round and
+    rows left behind are never sorted again. Once no run has blocks on disk
+    the remaining rows are sorted and emitted together. Equal keys keep run
+    order.
+
+    More than MERGE_FAN_IN runs are first merged in groups of consecutive
+    runs into longer runs next to the inputs, so a round never has to look
+    at more than MERGE_FAN_IN blocks.
+    """
+    paths = list(paths)
+    created = []
+    try:
+        while len(paths) > MERGE_FAN_IN:
+            merged = []
+            for start in range(0, len(paths), MERGE_FAN_IN):
+                group = paths[start:start + MERGE_FAN_IN]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                fd, path = tempfile.mkstemp(suffix='.pkl', prefix='merged_', dir=os.path.dirname(group[0]))
+                created.append(path)
+                with os.fdopen(fd, 'wb') as fh:
+                    for frame in _merge_runs(group, keys, ascending):
+                        for block in iter_chunks(frame, block_rows):
+                            pickle.dump(block, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                merged.append(path)
+            paths = merged
+        yield from _merge_runs(paths, keys, ascending)
+    finally:
+        for path in created:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def external_sort(frames, keys, ascending, memory_limit_mb=SORT_MEMORY_LIMIT_MB, block_rows=BLOCK_ROWS,
+                  tmp_dir=None, converters=None):
+    """
+    Sort an iterable of frames on `keys` without holding all of them in memory.
+
+    `ascending` is one bool per key. Runs are sized so sorting one fits in
+    `memory_limit_mb`. `converters` maps column -> callable applied to each
+    incoming frame before sorting (e.g. pd.to_datetime), so conversions
+    happen one chunk at a time. Yields sorted frames; temporary files are
+    removed once the generator finishes or is closed.
+    """
+    if isinstance(keys, str):
+        keys = [keys]
+    if isinstance(ascending, bool):
+        ascending = [ascending] * len(keys)
+    work_dir = tempfile.mkdtemp(prefix='csvmerger_sort_', dir=tmp_dir)
+    try:
+        paths = spill_sorted_runs(frames, list(keys), list(ascending), work_dir,
+                                  run_bytes_for(memory_limit_mb), block_rows, converters)
+        yield from merge_sorted_runs(paths, list(keys), list(ascending))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# -----------------
+# Pre-sorted inputs
+# -----------------
+class _Desc:
+    """Inverts comparisons for descending keys that cannot be negated."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _column_keys(series, ascending):
+    # (is_null, value) so nulls sort last in either direction, as sort_values does
+    nulls = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy().astype('datetime64[ns]').astype('int64')
+    else:
+        values = series.to_numpy()
+    if not ascending:
+        if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(values.dtype):
+            values = [_Desc(v) for v in values]
+        else:
+            values = -values
+    return [(True, 0) if null else (False, v) for null, v in zip(nulls, values)]
+
+
+def row_keys(df, keys, ascending):
+    """Comparable per-row key tuples matching sort_values(keys, ascending) order."""
+    return list(zip(*[_column_keys(df[k], asc) for k, asc in zip(keys, ascending)]))
+
+
+def _frame_is_sorted(df, keys, ascending):
+    if len(keys) == 1:
+        s = df[keys[0]]
+        nulls = s.isna()
+        if nulls.any():
+            first_null = int(nulls.to_numpy().argmax())
+            if not nulls.iloc[first_null:].all():
+                return False
+            s = s.iloc[:first_null]
+        return s.is_monotonic_increasing if ascending[0] else s.is_monotonic_decreasing
+    tuples = row_keys(df, keys, ascending)
+    return all(not b < a for a, b in zip(tuples, tuples[1:]))
+
+
+def scan_sorted_run(frames, keys, ascending):
+    """
+    Check that consecutive frames form one run sorted on `keys`.
+
+    Only the key columns are inspected, chunk by chunk, plus one comparison at
+    every chunk boundary. Returns (is_sorted, first_key, last_key); the keys
+    are row_keys() tuples, or None for an empty run.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    first = last = None
+    for df in frames:
+        if not len(df):
+            continue
+        if not _frame_is_sorted(df, keys, ascending):
+            return False, None, None
+        head, tail = row_keys(df.iloc[[0, -1]], keys, ascending)
+        if last is not None and head < last:
+            return False, None, None
+        if first is None:
+            first = head
+        last = tail
+    return True, first, last
+
+
+def order_disjoint_runs(bounds):
+    """
+    Order sorted runs whose key ranges do not overlap.
+
+    `bounds` holds one (first_key, last_key) pair per run. Returns run indexes
+    in output order when the ranges are disjoint (so the runs can simply be
+    concatenated), otherwise None.
+    """
+    present = sorted((b[0], i) for i, b in enumerate(bounds) if b[0] is not None)
+    for (_, prev), (head, _) in zip(present, present[1:]):
+        if head < bounds[prev][1]:
+            return None
+    return [i for _, i in present]
+
+
+def kway_merge_sorted(sources, keys, ascending, columns=None, block_rows=BLOCK_ROWS):
+    """
+    Heap-based k-way merge of inputs that are each already sorted on `keys`.
+
+    `sources` holds one frame or iterable of frames per input. Keys are streamed
+    through heapq.merge one row at a time (O(N log k)) while the row data is
+    sliced out of the per-input buffers a block at a time, so memory stays at
+    about one chunk per input. Equal keys keep input order. Yields frames of
+    up to `block_rows` rows aligned to `columns`.
+    """
+    buffers = [[] for _ in sources]  # per input: [frame, rows already taken]
+
+    def key_stream(r, frames):
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        for df in frames:
+            if len(df):
+                buffers[r].append([df, 0])
+                for key in row_keys(df, keys, ascending):
+                    yield key, r
+
+    def take(r, count):
+        parts = []
+        while count:
+            entry = buffers[r][0]
+            df, start = entry
+            n = min(count, len(df) - start)
+            parts.append(df.iloc[start:start + n])
+            entry[1] += n
+            count -= n
+            if entry[1] == len(df):
+                buffers[r].pop(0)
+        return parts
+
+    def assemble(run_ids):
+        run_ids = np.asarray(run_ids)
+        parts = []
+        for r in np.unique(run_ids):
+            parts.extend(take(int(r), int((run_ids == r).sum())))
+        block = pd.concat(parts, ignore_index=True, sort=False)
+        # Parts are grouped by input; restore the merged interleaving
+        block = block.iloc[np.argsort(np.argsort(run_ids, kind='stable'), kind='stable')]
+        block = block.reset_index(drop=True)
+        return block.reindex(columns=columns) if columns is not None else block
+
+    merged = heapq.merge(*[key_stream(r, frames) for r, frames in enumerate(sources)])
+    pending = []
+    for _, r in merged:
+        pending.append(r)
+        if len(pending) >= block_rows:
+            yield assemble(pending)
+            pending = []
+    if pending:
+        yield assemble(pending)
+
+
+def merge_presorted(frames, keys, ascending, columns=None, converters=None, block_rows=BLOCK_ROWS):
+    """
+    Merge in-memory frames without a global sort if each is already sorted.
+
+    Applies `converters` to each frame, checks every frame with a monotonicity
+    scan and returns a generator of merged frames, or None when any input is
+    out of order. Inputs with disjoint key ranges are just concatenated in key
+    order. Overlapping ones are concatenated and stable-sorted: the sort finds
+    the presorted runs and is far faster than kway_merge_sorted()'s per-row
+    heap once the data is in memory anyway. Equal keys keep input order.
+    """
+    prepared = []
+    for df in frames:
+        for col, convert in (converters or {}).items():
+            if col in df.columns:
+                df = df.assign(**{col: convert(df[col])})
+        prepared.append(df)
+
+    bounds = []
+    for df in prepared:
+        if any(k not in df.columns for k in keys):
+            return None
+        is_sorted, first, last = scan_sorted_run(df, keys, ascending)
+        if not is_sorted:
+            return None
+        bounds.append((first, last))
+
+    order = order_disjoint_runs(bounds)
+    if order is None:
+        merged = pd.concat(prepared, ignore_index=True, sort=False)
+        prepared, order = [sort_frame(merged, keys, ascending).reset_index(drop=True)], [0]
+    return (chunk.reindex(columns=columns) if columns is not None else chunk
+            for i in order for chunk in iter_chunks(prepared[i], block_rows))
@@ -0,0 +1,414 @@
+"""Incremental output writers for the merge export.
+
+Each writer takes the merged data one batch (DataFrame) at a time, so output
+is written while later batches are still being produced and no format needs
+the whole result in memory:
+
+    writer = open_writer('parquet', path, compression='zstd')
+    for batch in batches:
+        writer.write(batch)
+    writer.close()
+
+Every writer counts `rows` and `bytes_written` so callers can show
+determinate progress. Columnar formats need pyarrow, which is optional;
+open_writer() raises ImportError with an install hint when it is missing.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from mergecsvfiles_options import DEFAULT_PARQUET_CODEC, JSON_ENCODERS, PARQUET_CODECS  # noqa: F401
+
+
+WRITE_BATCH_ROWS = 100_000
+WRITE_BUFFER_BYTES = 1024 * 1024
+EXCEL_MAX_ROWS = 1_048_576  # per sheet, header row included
+
+EXTENSIONS = {
+    'csv': '.csv',
+    'tsv': '.tsv',
+    'json': '.json',
+    'ndjson': '.ndjson',
+    'excel': '.xlsx',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'feather': '.feather',
+}
+
+
+def output_path(out_dir, filename, fmt):
+    """Output file path with the format's extension appended when missing."""
+    ext = EXTENSIONS.get(fmt, '.' + fmt)
+    return out_dir / (filename if filename.endswith(ext) else filename + ext)
+
+
+class DelimitedWriter:
+    """
+    CSV/TSV writer: header once, then each batch appended through one large
+    buffered handle. Output matches DataFrame.to_csv(path, index=False, sep=sep).
+    append=True adds rows to an existing file without writing the header again.
+    """
+
+    def __init__(self, path, sep=',', buffer_size=WRITE_BUFFER_BYTES, append=False):
+        self.path = path
+        self.sep = sep
+        self.rows = 0
+        self.columns = None
+        self.append = append
+        self.fh = open(path, 'a' if append else 'w', encoding='utf-8', newline='', buffering=buffer_size)
+
+    def write(self, df):
+        if self.columns is None and not self.append:
+            self.columns = list(df.columns)
+            df.to_csv(self.fh, index=False, sep=self.sep, lineterminator=os.linesep)
+        elif len(df):
+            df.to_csv(self.fh, index=False, sep=self.sep, header=False, lineterminator=os.linesep)
+        self.rows += len(df)
+
+    @property
+    def bytes_written(self):
+        # Position in the output, including data still waiting in the buffer
+        return self.fh.tell() if not self.fh.closed else os.path.getsize(self.path)
+
+    def close(self):
+        self.fh.close()
+
+
+class TsvWriter(DelimitedWriter):
+    def __init__(self, path, buffer_size=WRITE_BUFFER_BYTES, append=False):
+        super().__init__(path, sep='\t', buffer_size=buffer_size, append=append)
+
+
+def _orjson_records(df):
+    """Encode each row as a JSON object with orjson, formatted like to_json(date_format='iso')."""
+    columns = [str(c) for c in df.columns]
+    values = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series) and series.dt.tz is None:
+            text = np.datetime_as_string(series.to_numpy(), unit='ms').astype(object)
+            text[series.isna().to_numpy()] = None
+            values.append(text.tolist())
+        else:
+            values.append(series.astype(object).where(series.notna(), None).tolist())
+    dumps = orjson.dumps
+    return [dumps(dict(zip(columns, row)), default=str) for row in zip(*values)]
+
+
+class JsonLinesWriter:
+    """
+    NDJSON (JSON Lines) writer: one object per line, encoded and written a
+    batch at a time. encoder='orjson' uses orjson when it is installed, which
+    also keeps full float precision (pandas rounds to 10 digits).
+    append=True adds lines to an existing file.
+    """
+
+    def __init__(self, path, encoder='pandas', buffer_size=WRITE_BUFFER_BYTES, append=False):
+        self.path = path
+        self.rows = 0
+        self.use_orjson = encoder == 'orjson' and orjson is not None
+        self.fh = open(path, 'ab' if append else 'wb', buffering=buffer_size)
+
+    def encode(self, df):
+        if self.use_orjson:
+            return b'\n'.join(_orjson_records(df)) + b'\n'
+        return df.to_json(orient='records', lines=True, date_format='iso').encode('utf-8')
+
+    def write(self, df):
+        if len(df):
+            self.fh.write(self.encode(df))
+        self.rows += len(df)
+
+    @property
+    def bytes_written(self):
+        return self.fh.tell() if not self.fh.closed else os.path.getsize(self.path)
+
+    def close(self):
+        self.fh.close()
+
+
+class JsonArrayWriter(JsonLinesWriter):
+    """
+    Array-style JSON ([{...},{...}]) written batch by batch; with the pandas
+    encoder the output matches DataFrame.to_json(orient='records', date_format='iso').
+    """
+
+    def __init__(self, path, encoder='pandas', buffer_size=WRITE_BUFFER_BYTES):
+        super().__init__(path, encoder, buffer_size)
+        self.fh.write(b'[')
+
+    def encode(self, df):
+        if self.use_orjson:
+            body = b','.join(_orjson_records(df))
+        else:
+            body = df.to_json(orient='records', date_format='iso')[1:-1].encode('utf-8')
+        return body if not self.rows else b',' + body
+
+    def close(self):
+        if not self.fh.closed:
+            self.fh.write(b']')
+        super().close()
+
+
+def _python_columns(df):
+    """Column values as Python lists with None for missing values."""
+    values = []
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            # Excel has no time zones; keep the local wall-clock time
+            series = series.dt.tz_localize(None)
+        values.append(series.astype(object).where(series.notna(), None).tolist())
+    return values
+
+
+class ExcelWriter:
+    """
+    Constant-memory .xlsx writer.
+
+    Rows are streamed to disk with xlsxwriter's constant_memory mode (or
+    openpyxl's write-only mode when xlsxwriter is missing). When a sheet
+    reaches Excel's row limit the writer rolls over to Sheet2, Sheet3, ...,
+    repeating the header on each sheet.
+    """
+
+    def __init__(self, path, max_rows=EXCEL_MAX_ROWS):
+        self.path = path
+        self.rows = 0
+        self.columns = None
+        self.max_rows = max_rows
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheets = 0
+        try:
+            import xlsxwriter
+            self.book = xlsxwriter.Workbook(str(path), {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                'nan_inf_to_errors': True,
+                # Cell text is data: never turn it into formulas or hyperlinks
+                'strings_to_formulas': False,
+                'strings_to_urls': False,
+            })
+            self.header_format = self.book.add_format({'bold': True})
+            self.engine = 'xlsxwriter'
+        except ImportError:
+            try:
+                import openpyxl
+            except ImportError:
+                raise ImportError("Excel export needs xlsxwriter or openpyxl (pip install xlsxwriter)")
+            self.book = openpyxl.Workbook(write_only=True)
+            self.engine = 'openpyxl'
+
+    def _new_sheet(self):
+        self.sheets += 1
+        name = f'Sheet{self.sheets}'
+        if self.engine == 'xlsxwriter':
+            self.sheet = self.book.add_worksheet(name)
+        else:
+            self.sheet = self.book.create_sheet(name)
+        self.sheet_rows = 0
+        self._append(self.columns, header=True)
+
+    def _append(self, row, header=False):
+        if self.engine == 'xlsxwriter':
+            self.sheet.write_row(self.sheet_rows, 0, row, self.header_format if header else None)
+        else:
+            self.sheet.append(row)
+        self.sheet_rows += 1
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = [str(c) for c in df.columns]
+            self._new_sheet()
+        for row in zip(*_python_columns(df)):
+            if self.sheet_rows >= self.max_rows:
+                self._new_sheet()
+            self._append(row)
+        self.rows += len(df)
+
+    @property
+    def bytes_written(self):
+        # The workbook file is only assembled (zipped) on close()
+        return 0
+
+    def close(self):
+        if self.sheet is None:
+            self.columns = self.columns or []
+            self._new_sheet()
+        if self.engine == 'xlsxwriter':
+            self.book.close()
+        else:
+            self.book.save(str(self.path))
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow export need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _is_mixed(kind):
+    return (kind.startswith('mixed') and kind != 'mixed-integer-float') or kind == 'unknown-array'
+
+
+def _arrow_ready(df, text_columns=()):
+    """Stringify object columns that mix value types, which Arrow cannot store, and `text_columns`."""
+    for col in df.columns[df.dtypes == object]:
+        if col in text_columns or _is_mixed(pd.api.types.infer_dtype(df[col], skipna=True)):
+            df = df.assign(**{col: df[col].map(lambda v: v if pd.isna(v) else str(v))})
+    return df
+
+
+# Arrow types for object columns by pandas' inferred kind; other kinds are left to the batch
+_OBJECT_TYPES = {
+    'string': 'string',
+    'empty': 'string',
+    'integer': 'int64',
+    'floating': 'float64',
+    'mixed-integer-float': 'float64',
+    'boolean': 'bool_',
+    'bytes': 'binary',
+}
+
+
+def arrow_column_types(df):
+    """
+    Arrow type names for the object columns of a whole result.
+
+    A batch only sees its own rows: codes that are ints in the first batch
+    and text later, or a column that only gets values after the first batch,
+    would otherwise be typed from the first batch alone. Columns that mix
+    value types are written as text.
+    """
+    types = {}
+    for col in df.columns[df.dtypes == object]:
+        kind = pd.api.types.infer_dtype(df[col], skipna=True)
+        if _is_mixed(kind):
+            types[col] = 'string'
+        elif kind in _OBJECT_TYPES:
+            types[col] = _OBJECT_TYPES[kind]
+    return types
+
+
+class ArrowBatchWriter:
+    """
+    Base for pyarrow writers: the schema comes from the first batch and every
+    later batch is converted to it, so each batch becomes one row group /
+    record batch on disk. `column_types` (see arrow_column_types()) fixes the
+    types of object columns up front.
+    """
+
+    def __init__(self, path, column_types=None):
+        self.pa = _require_pyarrow()
+        self.path = path
+        self.column_types = column_types or {}
+        self.text_columns = {col for col, name in self.column_types.items() if name == 'string'}
+        self.schema = None
+        self.rows = 0
+        self._sink = None
+
+    def _schema_for(self, df):
+        fields = []
+        for f in self.pa.Schema.from_pandas(df, preserve_index=False):
+            if f.name in self.column_types and df[f.name].dtype == object:
+                f = f.with_type(getattr(self.pa, self.column_types[f.name])())
+            elif self.pa.types.is_null(f.type):
+                # Columns that are all-null in the first batch would otherwise be typed null
+                f = f.with_type(self.pa.string())
+            fields.append(f)
+        return self.pa.schema(fields)
+
+    def _open(self, schema):
+        raise NotImplementedError
+
+    def _write_table(self, table):
+        raise NotImplementedError
+
+    def write(self, df):
+        df = _arrow_ready(df, self.text_columns)
+        if self.schema is None:
+            self.schema = self._schema_for(df)
+            self._sink = self._open(self.schema)
+        self._write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        self.rows += len(df)
+
+    @property
+    def bytes_written(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def close(self):
+        if self._sink is None:
+            # Nothing was written; still produce a valid (empty) file
+            self.schema = self.pa.schema([])
+            self._sink = self._open(self.schema)
+        self._sink.close()
+
+
+class ParquetWriter(ArrowBatchWriter):
+    def __init__(self, path, compression=DEFAULT_PARQUET_CODEC, column_types=None):
+        super().__init__(path, column_types)
+        self.compression = None if compression in (None, '', 'none') else compression
+
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(str(self.path), schema, compression=self.compression or 'none')
+
+    def _write_table(self, table):
+        self._sink.write_table(table)
+
+
+class ArrowIPCWriter(ArrowBatchWriter):
+    """Arrow IPC file format, which is also Feather v2."""
+
+    def _open(self, schema):
+        import pyarrow.ipc as ipc
+        return ipc.new_file(str(self.path), schema)
+
+    def _write_table(self, table):
+        self._sink.write_table(table)
+
+
+WRITERS = {
+    'csv': DelimitedWriter,
+    'tsv': TsvWriter,
+    'json': JsonArrayWriter,
+    'ndjson': JsonLinesWriter,
+    'excel': ExcelWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowIPCWriter,
+    'feather': ArrowIPCWriter,
+}
+
+
+def open_writer(fmt, path, **options):
+    """Create the incremental writer for `fmt`; options go to the writer class."""
+    return WRITERS[fmt](path, **options)
+
+
+def write_batches(fmt, path, batches, progress=None, **options):
+    """
+    Write an iterable of frames with the writer for `fmt`; returns the row count.
+
+    `progress(rows, bytes_written)` is called after every batch.
+    """
+    writer = open_writer(fmt, path, **options)
+    try:
+        for batch in batches:
+            writer.write(batch)
+            if progress:
+                progress(writer.rows, writer.bytes_written)
+    finally:
+        writer.close()
+    return writer.rows
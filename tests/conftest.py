@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import mergecsvfiles_batch
+from mergecsvfiles_batch import SharedLoads, plan_jobs, run_batch
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    paths = []
+    for i, rows in enumerate(['1,a,10\n2,b,20\n', '3,c,30\n', '4,d,40\n']):
+        path = tmp_path / f'in{i}.csv'
+        path.write_text('id,name,amount\n' + rows)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    load = mergecsvfiles_batch._load
+
+    def counting(file_path, options):
+        calls.append(file_path)
+        return load(file_path, options)
+
+    monkeypatch.setattr(mergecsvfiles_batch, '_load', counting)
+    return calls
+
+
+def entries(inputs):
+    return [{'output': 'ab', 'files': [str(inputs[0]), str(inputs[1])]},
+            {'output': 'ac', 'files': [str(inputs[0]), str(inputs[2])]},
+            {'output': 'a_filtered', 'files': [str(inputs[0])], 'filters': [{'expression': 'amount > 10'}]}]
+
+
+def test_jobs_match_their_own_merges(inputs, tmp_path, loads):
+    jobs = run_batch(plan_jobs(entries(inputs), base={'output_dir': str(tmp_path / 'out')}),
+                     workers=2, load_workers=1)
+    assert [job.status for job in jobs] == ['done', 'done', 'done']
+    assert [job.rows for job in jobs] == [3, 3, 1]
+    frames = [pd.read_csv(p) for p in inputs]
+    pd.testing.assert_frame_equal(pd.read_csv(jobs[0].output_path),
+                                  pd.concat(frames[:2], ignore_index=True))
+    assert pd.read_csv(jobs[2].output_path)['id'].tolist() == [2]
+    # in0.csv is parsed once for the two jobs that read it unfiltered, once more with the filter
+    assert sorted(Path(p).name for p in loads) == ['in0.csv', 'in0.csv', 'in1.csv', 'in2.csv']
+
+
+def test_shared_parse_is_dropped_after_its_last_job(inputs, tmp_path, loads):
+    jobs = plan_jobs(entries(inputs)[:2], base={'output_dir': str(tmp_path / 'out')})
+    shared = SharedLoads()
+    for job in jobs:
+        shared.expect(job.config)
+    options = jobs[0].config.pipeline_options()
+    first = shared.load_all(jobs[0].config.files, options)
+    shared.release(jobs[0].config)
+    second = shared.load_all(jobs[1].config.files, options)
+    assert len(loads) == 3
+    # Each job gets its own shallow copy of the shared frame
+    assert first[1][0] is not second[1][0]
+    pd.testing.assert_frame_equal(first[1][0], second[1][0])
+    shared.release(jobs[1].config)
+    assert not shared._futures
+
+
+def test_failed_job_does_not_stop_the_others(inputs, tmp_path):
+    batch = entries(inputs)[:1] + [{'output': 'missing', 'files': [str(tmp_path / 'nope.csv')]}]
+    jobs = run_batch(plan_jobs(batch, base={'output_dir': str(tmp_path / 'out')}), load_workers=1)
+    assert [job.status for job in jobs] == ['done', 'failed']
+    assert jobs[1].error
+
+
+def test_spill_limits_are_capped_at_the_job_share(inputs, tmp_path):
+    jobs = run_batch(plan_jobs(entries(inputs)[:2], base={'output_dir': str(tmp_path / 'out')}),
+                     workers=2, memory_budget_mb=64, load_workers=1)
+    for job in jobs:
+        assert job.config.sort_memory_limit_mb == 32
+        assert job.config.join_memory_limit_mb == 32
+
+
+def rerun(inputs, tmp_path, batch=None, **kwargs):
+    jobs = run_batch(plan_jobs(batch or entries(inputs)[:2], base={'output_dir': str(tmp_path / 'out')}),
+                     load_workers=1, **kwargs)
+    return [job.status for job in jobs], jobs
+
+
+def test_unchanged_jobs_are_skipped_and_force_rebuilds_them(inputs, tmp_path, loads):
+    assert rerun(inputs, tmp_path)[0] == ['done', 'done']
+    loads.clear()
+    statuses, jobs = rerun(inputs, tmp_path)
+    assert statuses == ['skipped', 'skipped']
+    assert [job.rows for job in jobs] == [3, 3]
+    assert not loads
+    assert rerun(inputs, tmp_path, force=True)[0] == ['done', 'done']
+
+
+def test_changed_input_settings_or_output_rebuild_only_their_job(inputs, tmp_path):
+    rerun(inputs, tmp_path)
+    with open(inputs[1], 'a') as fh:
+        fh.write('5,e,50\n')
+    statuses, jobs = rerun(inputs, tmp_path)
+    assert statuses == ['done', 'skipped']
+    assert jobs[0].rows == 4
+
+    batch = entries(inputs)[:2]
+    batch[1]['filters'] = [{'expression': 'amount > 10'}]
+    assert rerun(inputs, tmp_path, batch)[0] == ['skipped', 'done']
+
+    # An output edited by hand no longer matches its stamp
+    with open(jobs[0].output_path, 'a') as fh:
+        fh.write('9,z,90\n')
+    assert rerun(inputs, tmp_path, batch)[0] == ['done', 'skipped']
+
+
+@pytest.mark.parametrize('verify_content, statuses', [(False, ['done', 'skipped']), (True, ['skipped', 'skipped'])])
+def test_touched_input_rebuilds_unless_content_is_checked(inputs, tmp_path, verify_content, statuses):
+    rerun(inputs, tmp_path, verify_content=verify_content)
+    # Same bytes, new mtime
+    stat = os.stat(inputs[1])
+    os.utime(inputs[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert rerun(inputs, tmp_path, verify_content=verify_content)[0] == statuses
@@ -0,0 +1,81 @@
+import os
+
+import pandas as pd
+import pytest
+
+import mergecsvfiles_catalog
+import mergecsvfiles_io
+from mergecsvfiles_catalog import FileCatalog, profile_file
+from mergecsvfiles_io import scan_schema, use_catalog
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text('id,name,amount\n1,a,10\n2,,20\n3,c,\n')
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return FileCatalog(tmp_path / 'catalog.sqlite')
+
+
+def rewrite_keeping_size_and_mtime(path, text):
+    stat = os.stat(path)
+    path.write_text(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_stored_facts_are_returned_and_merged(csv_file, catalog):
+    assert catalog.lookup(csv_file) is None
+    catalog.store(csv_file, encoding='utf-8', columns=['id', 'name', 'amount'])
+    catalog.store(csv_file, row_count=3, delimiter=None)
+    assert catalog.lookup(csv_file) == {'encoding': 'utf-8', 'columns': ['id', 'name', 'amount'], 'row_count': 3}
+
+
+def test_changed_file_misses(csv_file, catalog):
+    catalog.store(csv_file, row_count=3)
+    with open(csv_file, 'a') as fh:
+        fh.write('4,d,40\n')
+    assert catalog.lookup(csv_file) is None
+    # Facts stored for the old contents are not carried over
+    catalog.store(csv_file, encoding='utf-8')
+    assert catalog.lookup(csv_file) == {'encoding': 'utf-8'}
+
+
+def test_content_hash_catches_rewrites_with_the_same_size_and_mtime(csv_file, tmp_path):
+    plain = FileCatalog(tmp_path / 'plain.sqlite')
+    verified = FileCatalog(tmp_path / 'verified.sqlite', verify_content=True)
+    for catalog in (plain, verified):
+        catalog.store(csv_file, row_count=3)
+    rewrite_keeping_size_and_mtime(csv_file, 'id,name,amount\n9,z,90\n8,,80\n7,y,\n')
+    assert plain.lookup(csv_file) == {'row_count': 3}
+    assert verified.lookup(csv_file) is None
+
+
+def test_profile_matches_pandas_and_is_answered_from_the_catalog(csv_file, catalog, monkeypatch):
+    entry = profile_file(csv_file, catalog, chunksize=2)
+    df = pd.read_csv(csv_file)
+    assert entry['row_count'] == 3
+    # Chunk dtypes combine to what one read of the whole file gives
+    assert entry['dtypes'] == {col: str(dtype) for col, dtype in df.dtypes.items()}
+    assert entry['column_stats']['id'] == {'missing': 0, 'min': 1, 'max': 3}
+    assert entry['column_stats']['name'] == {'missing': 1, 'min': 'a', 'max': 'c'}
+    assert entry['column_stats']['amount'] == {'missing': 1, 'min': 10, 'max': 20}
+
+    monkeypatch.setattr(mergecsvfiles_catalog.pd, 'read_csv', None)
+    assert profile_file(csv_file, catalog) == entry
+
+
+def test_scan_schema_is_answered_from_the_catalog(csv_file, catalog, monkeypatch):
+    use_catalog(catalog)
+    try:
+        schema = scan_schema(csv_file)
+        assert catalog.lookup(csv_file)['columns'] == ['id', 'name', 'amount']
+        # A new process has an empty in-memory cache but the same catalog
+        monkeypatch.setattr(mergecsvfiles_io, '_schema_cache', {})
+        monkeypatch.setattr(mergecsvfiles_io, 'detect_encoding', None)
+        assert scan_schema(csv_file) == schema
+    finally:
+        use_catalog(None)
@@ -0,0 +1,142 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+import mergecsvfiles_engine
+from mergecsvfiles_engine import MergeConfig, run_merge
+from mergecsvfiles_sort import iter_chunks
+from mergecsvfiles_writers import arrow_column_types, write_batches
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    paths = []
+    for i, rows in enumerate(['1,a,10\n2,b,20\n', '3,c,30\n']):
+        path = tmp_path / f'in{i}.csv'
+        path.write_text('id,name,amount\n' + rows)
+        paths.append(path)
+    return paths
+
+
+def merge(inputs, tmp_path, fmt, **settings):
+    config = MergeConfig(files=inputs, output_dir=str(tmp_path / 'out'), output_filename='merged',
+                         export_format=fmt, load_workers=1, **settings)
+    return run_merge(config)
+
+
+def test_csv_export_matches_to_csv(inputs, tmp_path):
+    result = merge(inputs, tmp_path, 'csv')
+    expected = pd.concat([pd.read_csv(p) for p in inputs], ignore_index=True)
+    assert result.rows == 3
+    pd.testing.assert_frame_equal(pd.read_csv(result.output_path), expected)
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'tsv', 'excel', 'parquet', 'feather'])
+def test_empty_result_keeps_the_columns(inputs, tmp_path, fmt):
+    if fmt in ('parquet', 'feather'):
+        pytest.importorskip('pyarrow')
+    if fmt == 'excel':
+        pytest.importorskip('openpyxl')
+    result = merge(inputs, tmp_path, fmt, filters=[{'expression': 'amount > 1000'}])
+    read = {'csv': pd.read_csv, 'tsv': lambda p: pd.read_csv(p, sep='\t'), 'excel': pd.read_excel,
+            'parquet': pd.read_parquet, 'feather': pd.read_feather}[fmt]
+    written = read(result.output_path)
+    assert result.rows == 0
+    assert len(written) == 0
+    assert list(written.columns) == ['id', 'name', 'amount']
+
+
+def test_empty_result_as_json_is_an_empty_array(inputs, tmp_path):
+    result = merge(inputs, tmp_path, 'json', filters=[{'expression': 'amount > 1000'}])
+    assert json.loads(result.output_path.read_text()) == []
+
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+def test_duplicate_rows_over_the_dedup_budget_match_drop_duplicates(tmp_path, monkeypatch, keep):
+    monkeypatch.setattr(mergecsvfiles_engine, 'fits_in_memory', lambda frames, budget_mb: False)
+    rows = ''.join(f'{i % 50},n{i % 7},{i}\n' for i in range(2000))
+    path = tmp_path / 'dups.csv'
+    path.write_text('id,name,amount\n' + rows)
+    logs = []
+    config = MergeConfig(files=[path], output_dir=str(tmp_path / 'out'), output_filename='merged',
+                         load_workers=1, remove_duplicate_rows=True, duplicate_row_keep=keep,
+                         duplicate_key_columns='id,name')
+    result = run_merge(config, log=logs.append)
+    expected = pd.read_csv(path).drop_duplicates(['id', 'name'], keep=keep).reset_index(drop=True)
+    assert any('exceeds' in text for text in logs)
+    pd.testing.assert_frame_equal(pd.read_csv(result.output_path), expected)
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'feather'])
+def test_columnar_types_come_from_the_whole_result(tmp_path, monkeypatch, fmt):
+    pytest.importorskip('pyarrow')
+    # Every input file becomes its own batch
+    monkeypatch.setattr(mergecsvfiles_engine, 'WRITE_BATCH_ROWS', 2)
+    frames = [pd.DataFrame({'code': [1, 2]}), pd.DataFrame({'code': ['x', 'y']})]
+    paths = []
+    for i, df in enumerate(frames):
+        paths.append(tmp_path / f'in{i}.csv')
+        df.to_csv(paths[-1], index=False)
+    result = merge(paths, tmp_path, fmt)
+    read = pd.read_parquet if fmt == 'parquet' else pd.read_feather
+    written = read(result.output_path)
+    assert written['code'].tolist() == ['1', '2', 'x', 'y']
+
+
+def test_object_column_empty_in_the_first_batch_keeps_its_type(tmp_path):
+    pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'ratio': pd.Series([None, None, 1.5, 2.5], dtype=object)})
+    path = tmp_path / 'out.parquet'
+    write_batches('parquet', path, iter_chunks(df, 2), column_types=arrow_column_types(df))
+    written = pd.read_parquet(path)
+    assert pd.api.types.is_float_dtype(written['ratio'])
+    assert written['ratio'].tolist()[2:] == [1.5, 2.5]
+
+
+@pytest.fixture
+def mixed():
+    when = pd.to_datetime(['2024-01-01 00:00', None, '2024-03-01 12:30', '2024-04-01 00:00', '2024-05-01 00:00'])
+    return pd.DataFrame({'id': [1, 2, 3, 4, 5], 'name': ['a', None, 'c"q', 'd\\e', 'ü'],
+                         'amount': [1.5, None, 3.0, 0.1, -2.25], 'when': when})
+
+
+@pytest.mark.parametrize('encoder', ['pandas', 'orjson'])
+def test_ndjson_batches_match_to_json_lines(tmp_path, mixed, encoder):
+    if encoder == 'orjson':
+        pytest.importorskip('orjson')
+    path = tmp_path / 'out.ndjson'
+    assert write_batches('ndjson', path, iter_chunks(mixed, 2), encoder=encoder) == 5
+    lines = path.read_text(encoding='utf-8').splitlines()
+    expected = mixed.to_json(orient='records', lines=True, date_format='iso').splitlines()
+    assert len(lines) == 5
+    assert [json.loads(line) for line in lines] == [json.loads(line) for line in expected]
+
+
+@pytest.mark.parametrize('encoder', ['pandas', 'orjson'])
+def test_json_array_batches_match_to_json(tmp_path, mixed, encoder):
+    if encoder == 'orjson':
+        pytest.importorskip('orjson')
+    path = tmp_path / 'out.json'
+    write_batches('json', path, iter_chunks(mixed, 2), encoder=encoder)
+    assert json.loads(path.read_text(encoding='utf-8')) == json.loads(
+        mixed.to_json(orient='records', date_format='iso'))
+
+
+@pytest.mark.parametrize('engine', ['xlsxwriter', 'openpyxl'])
+def test_excel_rolls_over_to_new_sheets_with_the_header(tmp_path, monkeypatch, engine):
+    pytest.importorskip('openpyxl')
+    if engine == 'xlsxwriter':
+        pytest.importorskip('xlsxwriter')
+    else:
+        # Hide xlsxwriter so the writer falls back to openpyxl
+        monkeypatch.setitem(sys.modules, 'xlsxwriter', None)
+    df = pd.DataFrame({'id': range(10), 'name': [f'n{i}' for i in range(10)]})
+    path = tmp_path / 'out.xlsx'
+    # Four rows per sheet: the header plus three data rows
+    assert write_batches('excel', path, iter_chunks(df, 4), max_rows=4) == 10
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['Sheet1', 'Sheet2', 'Sheet3', 'Sheet4']
+    assert [len(sheet) for sheet in sheets.values()] == [3, 3, 3, 1]
+    pd.testing.assert_frame_equal(pd.concat(sheets.values(), ignore_index=True), df)
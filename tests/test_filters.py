@@ -0,0 +1,58 @@
+import threading
+
+import pandas as pd
+
+from mergecsvfiles_filters import CompiledFilters, compile_filters
+
+# Read from a CSV with a stray text cell, so the column stays text
+TEXT_AMOUNTS = pd.DataFrame({'amount': pd.Series(['9', '10', '100', 'n/a', None], dtype='str'),
+                             'code': pd.Series(['007', '7', '70', '7', None], dtype='str')})
+
+
+def passing(filters, df=TEXT_AMOUNTS):
+    return CompiledFilters(filters).mask(df).tolist()
+
+
+def test_number_against_text_column_compares_as_numbers():
+    # Alphabetically '9' > '10' and '100' < '9'
+    assert passing([{'expression': 'amount > 9'}]) == [False, True, True, False, False]
+    assert passing([{'column': 'amount', 'operator': '<', 'value': '10'}]) == [True, False, False, False, False]
+    assert passing([{'expression': 'amount between 10 and 99'}]) == [False, True, False, False, False]
+
+
+def test_unquoted_number_matches_numerically_and_quoted_text_literally():
+    assert passing([{'expression': 'code == 7'}]) == [True, True, False, True, False]
+    assert passing([{'expression': "code == '007'"}]) == [True, False, False, False, False]
+    assert passing([{'expression': 'code in (7, 70)'}]) == [True, True, True, True, False]
+
+
+def test_numeric_columns_are_unchanged():
+    df = pd.DataFrame({'amount': [9, 10, 100]})
+    assert passing([{'expression': 'amount > 9'}], df) == [False, True, True]
+
+
+def test_text_cells_never_match_a_number_in_any_chunk():
+    df = pd.DataFrame({'amount': pd.Series(['n/a', 'x'], dtype='str')})
+    compiled = CompiledFilters([{'expression': 'amount > 9'}])
+    # A chunk without a single number behaves like one that has some
+    assert compiled.mask(df).tolist() == [False, False]
+    assert compiled.mask(TEXT_AMOUNTS).tolist() == [False, True, True, False, False]
+    assert not compiled.skipped
+
+
+def test_skipped_rules_are_recorded_per_thread():
+    compiled = compile_filters([{'expression': 'missing > 1'}])
+    compiled.skipped.clear()
+    other = {}
+
+    def run():
+        # Another merge starting on its own thread sees, and clears, only its own record
+        other.update(compiled.skipped)
+        compiled.skipped.clear()
+
+    compiled.mask(TEXT_AMOUNTS)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert other == {}
+    assert 'missing > 1' in compiled.skipped
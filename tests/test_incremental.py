@@ -0,0 +1,76 @@
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from mergecsvfiles_engine import MergeConfig, run_merge
+from mergecsvfiles_incremental import checkpoint_path
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    paths = []
+    for i, rows in enumerate(['1,a,10\n2,b,20\n', '3,c,30\n']):
+        path = tmp_path / f'in{i}.csv'
+        path.write_text('id,name,amount\n' + rows)
+        paths.append(path)
+    return paths
+
+
+def merge(inputs, tmp_path, incremental=True, name='merged'):
+    logs = []
+    config = MergeConfig(files=inputs, output_dir=str(tmp_path / 'out'), output_filename=name,
+                         load_workers=1, incremental=incremental)
+    result = run_merge(config, log=logs.append)
+    return result, ''.join(logs)
+
+
+def full_merge(inputs, tmp_path):
+    result, _ = merge(inputs, tmp_path, incremental=False, name='full')
+    return pd.read_csv(result.output_path)
+
+
+def test_first_run_matches_a_full_merge(inputs, tmp_path):
+    result, logs = merge(inputs, tmp_path)
+    assert 'Full merge (no checkpoint' in logs
+    assert checkpoint_path(result.output_path).exists()
+    pdt.assert_frame_equal(pd.read_csv(result.output_path), full_merge(inputs, tmp_path))
+
+
+def test_appended_rows_are_appended(inputs, tmp_path):
+    first, _ = merge(inputs, tmp_path)
+    before = pd.read_csv(first.output_path)
+    with open(inputs[0], 'a') as fh:
+        fh.write('4,d,40\n5,e,50\n')
+
+    result, logs = merge(inputs, tmp_path)
+    assert 'Read new rows of in0.csv: rows=2' in logs
+    assert 'in1.csv: no new rows' in logs
+    assert 'Full merge' not in logs
+    assert result.rows == 5
+    expected = pd.concat([before, pd.DataFrame({'id': [4, 5], 'name': ['d', 'e'], 'amount': [40, 50]})],
+                         ignore_index=True)
+    pdt.assert_frame_equal(pd.read_csv(result.output_path), expected)
+
+
+def test_rewritten_input_rebuilds_the_output(inputs, tmp_path):
+    merge(inputs, tmp_path)
+    inputs[0].write_text('id,name,amount\n7,x,70\n2,b,20\n9,z,90\n')
+
+    result, logs = merge(inputs, tmp_path)
+    assert 'Full merge (in0.csv: it was rewritten)' in logs
+    pdt.assert_frame_equal(pd.read_csv(result.output_path), full_merge(inputs, tmp_path))
+
+
+def test_incomplete_last_line_waits_for_the_next_run(inputs, tmp_path):
+    merge(inputs, tmp_path)
+    with open(inputs[1], 'a') as fh:
+        fh.write('4,d')
+    result, logs = merge(inputs, tmp_path)
+    assert 'in1.csv: no new rows' in logs
+    assert result.rows == 3
+
+    with open(inputs[1], 'a') as fh:
+        fh.write(',40\n')
+    result, logs = merge(inputs, tmp_path)
+    assert 'Read new rows of in1.csv: rows=1' in logs
+    assert pd.read_csv(result.output_path).iloc[-1].tolist() == [4, 'd', 40]
@@ -0,0 +1,147 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+import mergecsvfiles_engine
+from mergecsvfiles_engine import MergeConfig, run_merge
+from mergecsvfiles_join import KeyFilter, asof_join, hash_join, join_frames, stream_asof
+from mergecsvfiles_sort import iter_chunks
+
+
+@pytest.mark.parametrize('how', ['inner', 'left'])
+def test_unique_key_join_with_shared_column_matches_merge(how):
+    # A unique right key picks the indexed strategy; 'v' exists on both sides
+    left = pd.DataFrame({'id': [3, 1, 2, 5], 'v': [1, 2, 3, 4], 'a': ['p', 'q', 'r', 's']})
+    right = pd.DataFrame({'id': [1, 2, 3], 'v': [10, 20, 30], 'b': [7, 8, 9]})
+    logs = []
+    joined = join_frames([left, right], ['left.csv', 'right.csv'], how=how, log=logs.append)
+
+    assert 'indexed join right.csv' in logs[0]
+    assert not any('failed' in text for text in logs)
+    pdt.assert_frame_equal(joined, left.merge(right, on='id', how=how))
+
+
+def test_outer_join_of_three_files_keeps_file_order():
+    frames = [pd.DataFrame({'id': [1, 2], 'a': [1, 2]}),
+              pd.DataFrame({'id': [2, 3], 'b': [5, 6]}),
+              pd.DataFrame({'id': [1, 3], 'c': [7, 8]})]
+    joined = join_frames(frames, ['a.csv', 'b.csv', 'c.csv'], how='outer')
+    expected = frames[0].merge(frames[1], on='id', how='outer').merge(frames[2], on='id', how='outer')
+    pdt.assert_frame_equal(joined, expected)
+
+
+@pytest.fixture
+def sides():
+    rng = np.random.default_rng(7)
+    left = pd.DataFrame({'k': rng.integers(0, 400, 3000).astype(float), 'g': rng.integers(0, 3, 3000),
+                         'v': rng.random(3000)})
+    right = pd.DataFrame({'k': rng.integers(200, 600, 1000).astype(float), 'g': rng.integers(0, 3, 1000),
+                          'v': rng.random(1000), 'w': rng.integers(0, 9, 1000)})
+    left.loc[::97, 'k'] = np.nan
+    right.loc[::89, 'k'] = np.nan
+    return left, right
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'right', 'outer'])
+@pytest.mark.parametrize('keys', [['k'], ['k', 'g']])
+def test_hash_join_matches_merge(sides, how, keys):
+    left, right = sides
+    # A large claimed size spreads the rows over many partitions
+    chunks = hash_join(iter_chunks(left, 700), iter_chunks(right, 300), keys, keys, how,
+                       memory_budget_mb=1, total_bytes=4 * 1024 * 1024)
+    joined = pd.concat(list(chunks), ignore_index=True)
+    pdt.assert_frame_equal(joined, left.merge(right, how=how, on=keys))
+
+
+def test_hash_join_with_no_matches_keeps_the_merge_columns(sides):
+    left, right = sides
+    joined = pd.concat(list(hash_join(left, right.assign(k=-1.0), ['k'], ['k'], 'inner')), ignore_index=True)
+    expected = left.merge(right.assign(k=-1.0), how='inner', on='k')
+    assert list(joined.columns) == list(expected.columns)
+    assert not len(joined)
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'outer'])
+def test_join_step_over_the_memory_limit_is_partitioned(sides, how):
+    left, right = sides
+    logs = []
+    joined = join_frames([left, right], ['left.csv', 'right.csv'], left_on='k', right_on='k', how=how,
+                         limit_mb=0.001, log=logs.append)
+    assert 'partitioned join right.csv' in logs[0]
+    pdt.assert_frame_equal(joined, left.merge(right, on='k', how=how))
+
+
+@pytest.fixture
+def ticks():
+    rng = np.random.default_rng(3)
+    # Repeated times and gaps in both inputs; the right side starts later and ends earlier
+    left = pd.DataFrame({'t': np.sort(rng.integers(0, 5000, 2000)), 'g': rng.integers(0, 4, 2000),
+                         'v': rng.random(2000)})
+    right = pd.DataFrame({'t': np.sort(rng.integers(300, 4500, 600)), 'g': rng.integers(0, 4, 600),
+                          'v': rng.random(600)})
+    return left, right
+
+
+@pytest.mark.parametrize('direction', ['backward', 'forward', 'nearest'])
+@pytest.mark.parametrize('by, tolerance', [(None, None), ('g', None), (None, 15), ('g', 40)])
+def test_stream_asof_matches_merge_asof(ticks, direction, by, tolerance):
+    left, right = ticks
+    chunks = stream_asof(iter_chunks(left, 97), iter_chunks(right, 41), 't', by, tolerance, direction)
+    result = pd.concat(list(chunks), ignore_index=True)
+    expected = pd.merge_asof(left, right, on='t', by=by, tolerance=tolerance, direction=direction)
+    pdt.assert_frame_equal(result, expected)
+
+
+def test_asof_join_sorts_its_inputs_and_keeps_rows_without_a_time_last():
+    left = pd.DataFrame({'t': ['2024-01-03', None, '2024-01-01', '2024-01-05'], 'a': [3, 0, 1, 5]})
+    right = pd.DataFrame({'t': ['2024-01-04', '2024-01-02', 'bad'], 'b': [4, 2, 9]})
+    joined = asof_join([left, right], 't', tolerance='1 day', block_rows=1)
+    assert joined['a'].tolist() == [1, 3, 5, 0]
+    assert joined['b'].isna().tolist() == [True, False, False, True]
+    assert joined['b'].iloc[1:3].tolist() == [2, 4]
+
+
+@pytest.mark.parametrize('exact_limit, kind', [(10_000, 'key set'), (10, 'Bloom filter')])
+def test_key_filter_passes_every_present_key(exact_limit, kind):
+    keys = pd.DataFrame({'id': np.arange(0, 20_000, 2), 'g': np.arange(10_000) % 7})
+    key_filter = KeyFilter(keys, exact_limit=exact_limit)
+    assert key_filter.kind == kind
+    assert key_filter.mask(keys).all()
+    # Float keys read from another file hash like the ints they equal
+    assert key_filter.mask(keys.astype({'id': 'float64'})).all()
+    absent = pd.DataFrame({'id': np.arange(1, 20_000, 2), 'g': np.arange(10_000) % 7})
+    assert key_filter.mask(absent).mean() < (0 if kind == 'key set' else 0.03) + 1e-9
+
+
+def test_key_filter_leaves_text_keys_against_numbers_to_the_join():
+    key_filter = KeyFilter(pd.DataFrame({'id': [1, 2]}))
+    assert key_filter.mask(pd.DataFrame({'id': pd.Series(['1', 'x'], dtype='str')})).all()
+
+
+@pytest.mark.parametrize('how', ['inner', 'left'])
+@pytest.mark.parametrize('exact_limit', [None, 10])
+def test_semijoin_does_not_change_the_join(tmp_path, monkeypatch, how, exact_limit):
+    if exact_limit:
+        monkeypatch.setattr(mergecsvfiles_engine, 'KeyFilter', functools.partial(KeyFilter, exact_limit=exact_limit))
+    rng = np.random.default_rng(5)
+    base = pd.DataFrame({'id': rng.integers(0, 300, 200), 'a': rng.random(200)})
+    other = pd.DataFrame({'id': rng.integers(100, 2000, 3000), 'b': rng.random(3000)})
+    files = [tmp_path / 'base.csv', tmp_path / 'other.csv']
+    base.to_csv(files[0], index=False)
+    other.to_csv(files[1], index=False)
+
+    outputs = []
+    for semijoin in (True, False):
+        logs = []
+        config = MergeConfig(files=files, output_dir=str(tmp_path), output_filename=f'out_{semijoin}',
+                             merge_type='join', join_type=how, semijoin=semijoin, load_workers=1)
+        result = run_merge(config, log=logs.append)
+        filtered = [text for text in logs if 'Semi-join pre-filter' in text]
+        assert bool(filtered) == semijoin
+        if semijoin:
+            assert ('Bloom filter' if exact_limit else 'key set') in filtered[0]
+        outputs.append(pd.read_csv(result.output_path))
+    pdt.assert_frame_equal(outputs[0], outputs[1])
@@ -0,0 +1,70 @@
+import pandas as pd
+import pandas.testing as pdt
+
+from mergecsvfiles import build_header_schema, merge_csv_files, stream_csv_files
+
+
+def write(path, text):
+    path.write_text(text)
+    return path
+
+
+def test_header_schema_matches_concat_order(tmp_path):
+    a = write(tmp_path / 'a.csv', 'id,name\n1,x\n')
+    b = write(tmp_path / 'b.csv', 'name,id,extra\ny,2,e\n')
+    readable, schema = build_header_schema([a, b])
+    assert readable == [a, b]
+    assert schema == list(pd.concat([pd.read_csv(a), pd.read_csv(b)], sort=False).columns)
+
+
+def test_streamed_files_are_aligned_to_one_schema(tmp_path):
+    a = write(tmp_path / 'a.csv', 'id,name\n1,x\n2,y\n3,z\n')
+    b = write(tmp_path / 'b.csv', 'name,id,extra\nv,4,e\nw,5,f\n')
+    out = tmp_path / 'out.csv'
+    assert stream_csv_files([a, b], out, chunksize=2)
+    expected = pd.concat([pd.read_csv(a), pd.read_csv(b)], ignore_index=True, sort=False)
+    pdt.assert_frame_equal(pd.read_csv(out), expected)
+
+
+def test_output_in_the_input_folder_is_not_read_back(tmp_path):
+    write(tmp_path / 'a.csv', 'id,name\n1,x\n2,y\n')
+    write(tmp_path / 'b.csv', 'id,name\n3,z\n')
+    assert merge_csv_files(tmp_path, 'merged_data.csv', chunksize=1)
+    # The second run finds the first run's output next to the inputs
+    assert merge_csv_files(tmp_path, 'merged_data.csv', chunksize=1)
+    assert sorted(pd.read_csv(tmp_path / 'merged_data.csv')['id']) == [1, 2, 3]
+
+
+def test_presorted_files_with_disjoint_dates_are_written_in_date_order(tmp_path):
+    late = write(tmp_path / 'a.csv', 'date,v\n2024-02-01,3\n2024-02-02,4\n')
+    early = write(tmp_path / 'b.csv', 'date,v\n2024-01-01,1\n2024-01-02,2\n')
+    out = tmp_path / 'out.csv'
+    assert stream_csv_files([late, early], out, chunksize=1)
+    assert pd.read_csv(out)['v'].tolist() == [1, 2, 3, 4]
+
+
+def test_presorted_files_with_overlapping_dates_are_merged_in_date_order(tmp_path):
+    a = write(tmp_path / 'a.csv', 'date,v\n2024-01-01,1\n2024-01-03,3\n2024-01-05,5\n')
+    b = write(tmp_path / 'b.csv', 'date,v\n2024-01-02,2\n2024-01-03,33\n2024-01-04,4\n')
+    out = tmp_path / 'out.csv'
+    assert stream_csv_files([a, b], out, chunksize=2)
+    # Equal dates keep file order
+    assert pd.read_csv(out)['v'].tolist() == [1, 2, 3, 33, 4, 5]
+
+
+def test_unsorted_files_keep_file_order(tmp_path):
+    a = write(tmp_path / 'a.csv', 'date,v\n2024-01-05,1\n2024-01-01,2\n')
+    b = write(tmp_path / 'b.csv', 'date,v\n2024-01-03,3\n')
+    out = tmp_path / 'out.csv'
+    assert stream_csv_files([a, b], out, chunksize=1)
+    assert pd.read_csv(out)['v'].tolist() == [1, 2, 3]
+
+
+def test_file_failing_part_way_leaves_no_rows_behind(tmp_path):
+    a = write(tmp_path / 'a.csv', 'id,name\n1,x\n')
+    # The unclosed quote fails the read after the first chunk was written
+    bad = write(tmp_path / 'b.csv', 'id,name\n2,y\n3,z\n4,"w\n')
+    c = write(tmp_path / 'c.csv', 'id,name\n5,v\n')
+    out = tmp_path / 'out.csv'
+    assert stream_csv_files([a, bad, c], out, chunksize=2)
+    assert pd.read_csv(out)['id'].tolist() == [1, 5]
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from mergecsvfiles_engine import MergeConfig
+from mergecsvfiles_pipeline import build_preview, merge_duplicate_columns
+
+
+def test_sorted_preview_covers_whole_files(tmp_path):
+    amounts = np.random.default_rng(1).permutation(6000)
+    paths = []
+    for i in range(2):
+        paths.append(tmp_path / f'in{i}.csv')
+        pd.DataFrame({'id': range(i * 3000, (i + 1) * 3000),
+                      'amount': amounts[i * 3000:(i + 1) * 3000]}).to_csv(paths[-1], index=False)
+    options = MergeConfig(files=paths).pipeline_options()
+    preview = build_preview(paths, options, sort_option='custom', sort_column='amount', ascending=False,
+                            limit=5, rows_per_file=10)
+
+    # The largest amounts are far past the first rows_per_file rows of each file
+    assert preview['frame']['amount'].tolist() == [5999, 5998, 5997, 5996, 5995]
+    assert preview['sort_column'] == 'amount'
+    assert preview['total_rows'] == 6000
+    assert not preview['estimated']
+
+
+def test_unsorted_preview_reads_only_the_first_rows(tmp_path):
+    path = tmp_path / 'in.csv'
+    pd.DataFrame({'id': range(3000)}).to_csv(path, index=False)
+    options = MergeConfig(files=[path]).pipeline_options()
+    preview = build_preview([path], options, limit=5, rows_per_file=10)
+    assert preview['frame']['id'].tolist() == [0, 1, 2, 3, 4]
+    assert preview['estimated']
+
+
+def test_duplicate_columns_merge_like_the_row_wise_version():
+    df = pd.concat([pd.Series([1, 2, 3, 4]), pd.Series([1.0, np.nan, 4.5, np.nan]), pd.Series(list('xyzw'))],
+                   axis=1, keys=['a', 'a', 'b'])
+    merged = merge_duplicate_columns(df, 'a')
+    assert list(merged.columns) == ['a', 'b']
+    # An int and a float column compare as floats, as one row of both did
+    assert merged['a'].tolist() == ['1.0', '2.0', '3.0 | 4.5', '4.0']
+
+    text = pd.DataFrame([['1', 1.0], [None, None]], columns=['a', 'a'], dtype=object)
+    assert merge_duplicate_columns(text, 'a')['a'].fillna('<NA>').tolist() == ['1 | 1.0', '<NA>']
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+import mergecsvfiles_sort
+from mergecsvfiles_sort import external_sort, iter_chunks, sort_frame
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    df = pd.DataFrame({'a': rng.integers(0, 50, n).astype(float),
+                       'b': rng.choice(['x', 'y', 'z'], n),
+                       'row': np.arange(n)})
+    df.loc[rng.random(n) < 0.05, 'a'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('keys, ascending', [(['a'], [True]), (['a', 'b'], [False, True])])
+def test_external_sort_matches_stable_sort(frame, keys, ascending):
+    # A tiny memory limit gives dozens of runs, all full of ties and nulls
+    chunks = external_sort(iter_chunks(frame, 500), keys, ascending, memory_limit_mb=0.01, block_rows=200)
+    result = pd.concat(list(chunks), ignore_index=True)
+    pdt.assert_frame_equal(result, sort_frame(frame, keys, ascending).reset_index(drop=True))
+
+
+def test_external_sort_merges_in_several_passes(frame, monkeypatch):
+    monkeypatch.setattr(mergecsvfiles_sort, 'MERGE_FAN_IN', 4)
+    chunks = external_sort(iter_chunks(frame, 500), ['a'], [True], memory_limit_mb=0.01, block_rows=200)
+    result = pd.concat(list(chunks), ignore_index=True)
+    pdt.assert_frame_equal(result, sort_frame(frame, ['a'], [True]).reset_index(drop=True))
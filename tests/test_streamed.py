@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+import mergecsvfiles_engine
+from mergecsvfiles_engine import MergeConfig, MergeError, run_merge
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(3):
+        n = 2000
+        df = pd.DataFrame({'id': rng.integers(0, 300, n), 'name': rng.choice(['a', 'b', 'c'], n),
+                           'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 10**6, n), unit='s')})
+        if i == 1:
+            # A column only one file has: ints become floats, as with pd.concat
+            df['extra'] = rng.integers(0, 5, n)
+        paths.append(tmp_path / f'in{i}.csv')
+        df.to_csv(paths[-1], index=False)
+    return paths
+
+
+def merge(inputs, tmp_path, streamed, **settings):
+    # A tiny limit makes every input "larger than memory"
+    limit = 0.01 if streamed else 1024
+    logs = []
+    config = MergeConfig(files=inputs, output_dir=str(tmp_path / ('streamed' if streamed else 'loaded')),
+                         load_workers=1, sort_memory_limit_mb=limit, dedup_memory_budget_mb=limit, **settings)
+    result = run_merge(config, log=logs.append)
+    assert any('reading them in chunks' in text for text in logs) == streamed
+    return result, pd.read_csv(result.output_path)
+
+
+@pytest.mark.parametrize('settings', [
+    {'sort_option': 'date'},
+    {'sort_option': 'custom', 'sort_column': 'id', 'sort_order': 'descending', 'extra_sort_keys': 'name, date'},
+])
+def test_streamed_sort_matches_the_loaded_sort(inputs, tmp_path, settings):
+    result, streamed = merge(inputs, tmp_path, True, **settings)
+    _, loaded = merge(inputs, tmp_path, False, **settings)
+    assert result.rows == len(loaded) == 6000
+    assert list(streamed.columns) == list(loaded.columns)
+    keys = ['date'] if settings['sort_option'] == 'date' else ['id', 'name', 'date']
+    pdt.assert_frame_equal(streamed[keys], loaded[keys])
+    # Rows that tie on the keys may come out in another order
+    pdt.assert_frame_equal(streamed.sort_values(list(streamed.columns)).reset_index(drop=True),
+                           loaded.sort_values(list(loaded.columns)).reset_index(drop=True))
+
+
+def test_streamed_merge_skips_unreadable_files(inputs, tmp_path):
+    missing = tmp_path / 'missing.csv'
+    result, streamed = merge(inputs + [missing], tmp_path, True, sort_option='date')
+    assert [f for f, _ in result.files_failed] == [missing]
+    assert len(streamed) == 6000
+
+
+def test_file_failing_part_way_aborts_the_streamed_merge(inputs, tmp_path, monkeypatch):
+    read_planned = mergecsvfiles_engine.read_planned
+    monkeypatch.setattr(mergecsvfiles_engine, 'read_planned',
+                        lambda *args, **kwargs: read_planned(*args, chunksize=500, **kwargs))
+    transform_frame = mergecsvfiles_engine.transform_frame
+    seen = []
+
+    def failing(df, file_path, options, filtered=False):
+        seen.append(file_path)
+        if file_path == inputs[2] and seen.count(file_path) == 2:
+            raise OSError('disk went away')
+        return transform_frame(df, file_path, options, filtered)
+
+    monkeypatch.setattr(mergecsvfiles_engine, 'transform_frame', failing)
+    with pytest.raises(MergeError, match='in2.csv failed after 500 rows: disk went away'):
+        merge(inputs, tmp_path, True, sort_option='date')
+
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+@pytest.mark.parametrize('key_columns', ['', 'id, name'])
+def test_streamed_dedup_matches_drop_duplicates(inputs, tmp_path, monkeypatch, keep, key_columns):
+    # Claim the inputs are huge so the dedup spreads them over many partitions
+    monkeypatch.setattr(mergecsvfiles_engine, 'input_bytes', lambda files: 20 * 1024 * 1024)
+    result, streamed = merge(inputs, tmp_path, True, remove_duplicate_rows=True,
+                             duplicate_row_keep=keep, duplicate_key_columns=key_columns)
+    _, loaded = merge(inputs, tmp_path, False, remove_duplicate_rows=True,
+                      duplicate_row_keep=keep, duplicate_key_columns=key_columns)
+    assert result.rows == len(loaded)
+    pdt.assert_frame_equal(streamed, loaded)
+
+
+def test_streamed_dedup_then_sort(inputs, tmp_path):
+    settings = {'remove_duplicate_rows': True, 'duplicate_key_columns': 'id', 'sort_option': 'custom',
+                'sort_column': 'id'}
+    _, streamed = merge(inputs, tmp_path, True, **settings)
+    _, loaded = merge(inputs, tmp_path, False, **settings)
+    # Unique ids, so the sorted order is fully determined
+    assert streamed['id'].is_unique
+    pdt.assert_frame_equal(streamed, loaded)